@@ -1,46 +1,32 @@
-import open3d as o3d
 import numpy as np
 import sys
 import os
+from lib.ply import load_ply
+from lib.utils import write_cloud
+from lib.ptscache import cache_path, write_cache
 
-def load_ply(file_name):
-    pcd = o3d.io.read_point_cloud(file_name)
-    return pcd
-
-def write_pts(file_name, points, normals):
-    with open(file_name, 'w') as f:
-        for point, normal in zip(points, normals):
-            f.write(' '.join(map(str, point)) + ' ' + ' '.join(map(str, normal)) + '\n')
+def write_pts(file_name, cloud):
+    write_cloud(file_name, cloud)
 
 def convert_ply_to_pts(ply_file, output_dir):
-    # 加载PLY文件
-    pcd = load_ply(ply_file)
+    # 加载PLY文件，直接读取顶点数组并估计法向量（参数见lib/ply.py中的NORMAL_NEIGHBORS和NORMAL_RADIUS）
+    # 注：icp_ply_pts.py和batch_registration.py也可以直接读取.ply文件，不需要先转换成.pts，得到的法线相同
+    cloud = load_ply(ply_file)
+    if (cloud is None):
+        return
 
     # 放大点坐标
     scale_factor = 1  # 根据需要调整缩放因子，保持1即可，如要放大，则对应的初始转移矩阵需要重新计算，要用.pts文件里的点坐标进行计算
-    points = np.asarray(pcd.points)
-    points *= scale_factor  # 放大点坐标
-
-    # 将points转换为Vector3dVector对象
-    pcd.points = o3d.utility.Vector3dVector(points)
-
-    # 计算法向量
-    pcd.estimate_normals(search_param=o3d.geometry.KDTreeSearchParamHybrid(radius=0.1 * scale_factor, max_nn=30))
-
-    # 获取点和法向量
-    points = np.asarray(pcd.points)
-    normals = np.asarray(pcd.normals)
-
-    # 将points转换为Vector3dVector对象
-    pcd.points = o3d.utility.Vector3dVector(points)
+    cloud.positions *= scale_factor  # 放大点坐标
 
     # 构造输出目录和PTS文件名
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     pts_file = os.path.join(output_dir, os.path.splitext(os.path.basename(ply_file))[0] + '.pts')
 
-    # 写入PTS文件
-    write_pts(pts_file, points, normals)
+    # 写入PTS文件，同时写入二进制缓存，之后加载时不需要再解析文本
+    write_pts(pts_file, cloud)
+    write_cache(cache_path(pts_file), cloud, pts_file)
     print(f"转换完成：{pts_file}")
 
 if __name__ == "__main__":
@@ -0,0 +1,319 @@
+# 文件：batch_registration.py
+# 简介：批量配准整个扫描集合（bun.conf或扫描列表）
+#       每个扫描只加载和预处理一次（KdTree、FPFH特征），然后按依赖顺序对配准关系图中的
+#       每一对执行快速全局配准（可选）和点到平面ICP，并写出每个扫描的.xf文件。
+#       使用--workers时，互不依赖的配准对在进程池中并行执行，结果与串行执行相同。
+
+import os
+import zlib
+import argparse
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from lib.utils import *
+from lib.xfstore import TransformStore, write_transforms
+from lib.ptscache import load_cached
+from lib.stream import load_streaming
+from lib.scanset import *
+from lib.icp import ICPOptions, ICPRegistration
+from lib.convergence import PLATEAU_TOLERANCE
+from lib.target import PreparedTarget
+from lib.spatialindex import INDEX_TYPES
+from lib.robust import KERNELS
+from lib.se3 import SOLVERS, OBJECTIVES
+from lib.sampling import SAMPLERS
+from lib.featurecache import FeatureCache
+from lib.metrics import write_metrics
+
+# 返回扫描对应的点云文件：.pts直接使用，其他格式（如bun.conf中的.ply）到pts_dir中查找同名.pts，
+# 找不到时直接读取.ply（估计法线，不需要先用PLY_PTS.py转换）
+def pts_path(scan, pts_dir):
+    if (scan.path.lower().endswith('.pts')):
+        return scan.path
+    path = os.path.join(pts_dir, scan.name + '.pts')
+    if (not os.path.isfile(path) and scan.path.lower().endswith('.ply') and os.path.isfile(scan.path)):
+        return scan.path
+    return path
+
+# 扫描仓库：在一个进程内按需加载点云、构建ICP配准引擎和计算FPFH特征，每个扫描只做一次
+class ScanStore:
+    def __init__(self, scans, pts_dir='PLY_PTS', voxel_size=None, sample_size=2000,
+                 outlier_factor=0.75, max_iterations=50, pyramid=(), feature_cache='.fpfh_cache',
+                 feature_cache_limit=512 * 1024 * 1024, metrics=False, target_dir=None, stream_voxel_size=None,
+                 index="kdtree", max_distance=None, convergence=None, kernel=None, kernel_parameter=None,
+                 solver="gauss_newton", objective="point_to_plane", overlap_margin=None, max_normal_angle=None,
+                 sampling="uniform"):
+        self.scans = dict((scan.name, scan) for scan in scans)
+        self.pts_dir = pts_dir
+        self.voxel_size = voxel_size
+        self.sample_size = sample_size
+        self.outlier_factor = outlier_factor
+        self.max_iterations = max_iterations
+        self.pyramid = list(pyramid)
+        self.feature_cache = FeatureCache(feature_cache, feature_cache_limit)
+        self.metrics = metrics
+        self.target_dir = target_dir
+        self.stream_voxel_size = stream_voxel_size
+        self.index = index
+        self.max_distance = max_distance
+        self.convergence = {} if (convergence is None) else dict(convergence)
+        self.kernel = kernel
+        self.kernel_parameter = kernel_parameter
+        self.solver = solver
+        self.objective = objective
+        self.overlap_margin = overlap_margin
+        self.max_normal_angle = max_normal_angle
+        self.sampling = sampling
+        self.clouds = {}
+        self.engines = {}
+        self.features = {}
+
+    def cloud(self, name):
+        if (name not in self.clouds):
+            path = pts_path(self.scans[name], self.pts_dir)
+            print("正在加载 {}...".format(path))
+            if (self.stream_voxel_size is not None):
+                self.clouds[name] = load_streaming(path, voxel_size=self.stream_voxel_size)
+            else:
+                self.clouds[name] = load_cached(path)
+        return self.clouds[name]
+
+    def pose(self, name):
+        return initial_pose(self.scans[name], pts_path(self.scans[name], self.pts_dir))
+
+    # 返回以该扫描为目标的ICP配准引擎（KdTree只构建一次）
+    # 设置了target_dir时，准备好的目标保存在target_dir/<name>.npz中，在多次运行和并行的进程之间复用
+    def engine(self, name):
+        if (name not in self.engines):
+            self.engines[name] = ICPRegistration(self.prepared_target(name))
+        return self.engines[name]
+
+    def prepared_target(self, name):
+        file_name = self.target_file(name)
+        if (self.target_saved(name)):
+            print("正在加载准备好的目标 {}...".format(file_name))
+            return PreparedTarget.load(file_name)
+
+        print("正在从 {} 构建KdTree...".format(name))
+        target = PreparedTarget(self.cloud(name), name=name)
+        if (file_name is not None):
+            target.save(file_name)
+        return target
+
+    # 准备好的目标在target_dir中的文件名；没有设置target_dir时为None
+    def target_file(self, name):
+        if (self.target_dir is None):
+            return None
+        suffix = '' if (self.stream_voxel_size is None) else '.v{}'.format(self.stream_voxel_size)
+        return os.path.join(self.target_dir, name + suffix + '.npz')
+
+    # target_dir中是否已有比点云文件更新的准备好的目标
+    def target_saved(self, name):
+        file_name = self.target_file(name)
+        path = pts_path(self.scans[name], self.pts_dir)
+        return (file_name is not None and os.path.isfile(file_name) and
+                os.path.getmtime(file_name) >= os.path.getmtime(path))
+
+    # 构建目标并保存到target_dir中（已经保存时不做任何事），之后各个工作进程直接加载，不再各自构建KdTree
+    def save_target(self, name):
+        if (not self.target_saved(name)):
+            self.prepared_target(name)
+
+    # 返回用于快速全局配准的下采样点云和FPFH特征（通过磁盘缓存在多次运行之间复用）
+    def feature(self, name):
+        if (name not in self.features):
+            import open3d as o3d
+            from registration import preprocess_point_cloud_cached
+
+            def read_point_cloud(file_name):
+                pcd = o3d.geometry.PointCloud()
+                pcd.points = o3d.utility.Vector3dVector(np.asarray(self.cloud(name).positions))
+                return pcd
+
+            # 流式下采样的点云与完整的点云不同，与准备好的目标的.v{size}后缀一样，把体素大小加入缓存的键
+            path = pts_path(self.scans[name], self.pts_dir)
+            extra = () if (self.stream_voxel_size is None) else (self.stream_voxel_size,)
+            self.features[name] = preprocess_point_cloud_cached(path, self.voxel_size, self.feature_cache,
+                                                                read_point_cloud, extra)
+        return self.features[name]
+
+    # 配准一对扫描，返回(源的位姿, 采样的平均距离, 迭代次数, 指标)；未启用指标记录时指标为None
+    # 每一对使用由名称确定的随机种子，因此结果与执行顺序和所在进程无关
+    def register(self, source, target, target_pose):
+        M1 = self.pose(source)
+        if (self.voxel_size is not None):
+            M1 = self.global_registration(source, target, target_pose)
+        options = ICPOptions(self.sample_size, self.outlier_factor, self.max_iterations, pyramid=self.pyramid,
+                             seed=zlib.crc32("{} {}".format(source, target).encode()), record_metrics=self.metrics,
+                             index=self.index, max_distance=self.max_distance, kernel=self.kernel,
+                             kernel_parameter=self.kernel_parameter, solver=self.solver,
+                             objective=self.objective, overlap_margin=self.overlap_margin,
+                             max_normal_angle=self.max_normal_angle, sampling=self.sampling, **self.convergence)
+        result = self.engine(target).register(self.cloud(source), M1, target_pose, options,
+                                              "{} -> {}".format(source, target))
+        return result.transform, result.mean_distance, result.iterations, result.metrics
+
+    # 使用已计算的特征执行快速全局配准，返回源在世界坐标系中的位姿
+    # 特征在各自的局部坐标系中计算，因此结果需要左乘目标的位姿
+    def global_registration(self, source, target, target_pose):
+        from registration import execute_fast_global_registration
+
+        source_down, source_fpfh = self.feature(source)
+        target_down, target_fpfh = self.feature(target)
+        result = execute_fast_global_registration(source_down, target_down, source_fpfh, target_fpfh, self.voxel_size)
+        print(result)
+        return np.matrix(target_pose) * np.matrix(result.transformation)
+
+# 工作进程中的扫描仓库（每个进程一个，点云通过内存映射的缓存文件在进程间共享页面）
+worker_store = None
+
+def init_worker(scans, settings):
+    global worker_store
+    worker_store = ScanStore(scans, **settings)
+
+def register_in_worker(source, target, target_pose):
+    return worker_store.register(source, target, target_pose)
+
+# 批量配准：按依赖顺序配准每一对，返回(每个扫描的最终位姿, 每一对的指标列表)
+# workers大于1时，目标位姿已确定的配准对会被逐对提交到进程池，一对完成后它的位姿立即用于提交依赖它的配准对；
+# 每个目标的KdTree只在主进程中构建一次并保存到target_dir（没有设置时使用临时目录），工作进程直接加载
+def register_scan_set(scans, pairs, workers=1, **settings):
+    if (workers > 1 and settings.get("target_dir") is None):
+        with tempfile.TemporaryDirectory() as target_dir:
+            return register_scan_set(scans, pairs, workers, **dict(settings, target_dir=target_dir))
+
+    store = ScanStore(scans, **settings)
+    reference = scans[0].name
+    if (pairs is None):
+        pairs = [(scan.name, reference) for scan in scans[1:]]
+    for source, target in pairs:
+        for name in (source, target):
+            if (name not in store.scans):
+                print("错误：配准关系图中的扫描{}不在扫描列表中".format(name))
+                return None, None
+    order = registration_order(pairs, reference)
+    if (order is None):
+        return None, None
+
+    poses = {reference: store.pose(reference)}
+    metrics_list = []
+    if (workers <= 1):
+        for source, target in order:
+            print("正在配准 {} -> {}".format(source, target))
+            poses[source], mean, count, metrics = store.register(source, target, poses[target])
+            print("{} -> {}：经过 {} 次迭代成功终止，采样的平均距离为 {}".format(source, target, count, mean))
+            if (metrics is not None):
+                metrics_list.append(metrics)
+        return poses, metrics_list
+
+    # 并行调度：一对的目标位姿确定之后才提交该对
+    pending = list(order)
+    running = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(scans, settings)) as pool:
+        while (len(pending) > 0 or len(running) > 0):
+            for pair in [pair for pair in pending if pair[1] in poses]:
+                source, target = pair
+                store.save_target(target)
+                print("正在配准 {} -> {}".format(source, target))
+                running[pool.submit(register_in_worker, source, target, poses[target])] = pair
+                pending.remove(pair)
+
+            done, not_done = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+            for future in done:
+                source, target = running.pop(future)
+                poses[source], mean, count, metrics = future.result()
+                print("{} -> {}：经过 {} 次迭代成功终止，采样的平均距离为 {}".format(source, target, count, mean))
+                if (metrics is not None):
+                    metrics_list.append(metrics)
+    return poses, metrics_list
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量配准一个扫描集合")
+    parser.add_argument("scans", help="bun.conf格式的文件或扫描列表（每行一个文件）")
+    parser.add_argument("--pairs", help="配准关系图（每行\"源 目标\"）；默认全部配准到第一个扫描")
+    parser.add_argument("--pts-dir", default="PLY_PTS", help="查找带法线的.pts文件的目录")
+    parser.add_argument("--output", default="output01", help="输出.xf和.txt文件的目录")
+    parser.add_argument("--voxel-size", type=float, default=None,
+                        help="启用快速全局配准粗配准并使用此体素大小（需要Open3D）")
+    parser.add_argument("--sample-size", type=int, default=2000, help="每次ICP迭代采样的点数")
+    parser.add_argument("--outlier-factor", type=float, default=0.75, help="剔除异常值的中位数倍数")
+    parser.add_argument("--max-iterations", type=int, default=50, help="ICP的最大迭代次数")
+    parser.add_argument("--pyramid", default="",
+                        help="由粗到精的体素大小（逗号分隔，例如0.004,0.002），先在下采样的点云上收敛再细化")
+    parser.add_argument("--feature-cache", default=".fpfh_cache", help="FPFH特征缓存目录")
+    parser.add_argument("--feature-cache-limit", type=float, default=512, help="FPFH特征缓存的大小上限（MB）")
+    parser.add_argument("--metrics", help="每次迭代的耗时和残差统计的输出文件（.jsonl或.csv）")
+    parser.add_argument("--target-dir", help="保存和复用准备好的目标（点云、KdTree和法线）的目录")
+    parser.add_argument("--stream-voxel-size", type=float, default=None,
+                        help="分块读取每个扫描并边读取边体素下采样到此大小，用于无法放入内存的超大扫描")
+    parser.add_argument("--rotation-tolerance", type=float, default=None,
+                        help="增量旋转角度（弧度）小于此值时终止ICP，例如1e-4")
+    parser.add_argument("--translation-tolerance", type=float, default=None,
+                        help="增量平移长度小于此值时终止ICP，例如1e-5")
+    parser.add_argument("--plateau-window", type=int, default=None,
+                        help="最近这么多次迭代的平均距离总改进小于--plateau-tolerance时终止ICP")
+    parser.add_argument("--plateau-tolerance", type=float, default=PLATEAU_TOLERANCE, help="平台期内平均距离的最小总改进比例")
+    parser.add_argument("--min-sample-size", type=int, default=None,
+                        help="自适应采样：从这么多点开始，收敛后逐步增大到--sample-size")
+    parser.add_argument("--kernel", default=None, choices=KERNELS,
+                        help="鲁棒核函数：用每个对应点对的权重代替--outlier-factor的硬阈值（推荐tukey）")
+    parser.add_argument("--kernel-parameter", type=float, default=None,
+                        help="核函数的参数：trimmed为保留的比例，其余为残差尺度（MAD）的倍数；默认使用各个核函数的常用值")
+    parser.add_argument("--solver", default="gauss_newton", choices=SOLVERS,
+                        help="增量变换的求解方法：small_angle（原来的小角度近似）、gauss_newton（精确的指数映射）或levenberg_marquardt（加阻尼）")
+    parser.add_argument("--objective", default="point_to_plane", choices=OBJECTIVES,
+                        help="目标函数：point_to_plane或symmetric（对称点到平面，同时使用源和目标的法线）")
+    parser.add_argument("--sampling", default="uniform", choices=SAMPLERS,
+                        help="采样方法：uniform、normal_space（按法线方向分桶）或covariance（按对线性方程组的约束加权）")
+    parser.add_argument("--overlap-margin", type=float, default=None,
+                        help="只从与目标包围盒（向外扩大这么多）重叠的区域内采样，不再为目标范围之外的点查找对应点")
+    parser.add_argument("--max-normal-angle", type=float, default=None,
+                        help="剔除法线夹角（度）大于此值的对应点对，例如45")
+    parser.add_argument("--index", default="kdtree", choices=INDEX_TYPES,
+                        help="对应点搜索的空间索引：kdtree、grid（只查找--max-distance以内）或hybrid（网格优先，找不到时用KdTree）")
+    parser.add_argument("--max-distance", type=float, default=None, help="网格索引的最大查找距离；默认根据点间距估计")
+    parser.add_argument("--transform-store", help="同时将所有变换合并写入此.npz文件（按扫描名索引，原子地更新）")
+    parser.add_argument("--workers", type=int, default=1, help="并行执行互不依赖的配准对的进程数")
+    args = parser.parse_args()
+
+    scans = load_scan_list(args.scans)
+    if (len(scans) == 0):
+        print("错误：在{}中没有找到扫描".format(args.scans))
+        quit()
+    pairs = load_pairs(args.pairs) if (args.pairs is not None) else None
+
+    poses, metrics_list = register_scan_set(scans, pairs, args.workers, pts_dir=args.pts_dir,
+                                            voxel_size=args.voxel_size, sample_size=args.sample_size,
+                                            outlier_factor=args.outlier_factor,
+                                            max_iterations=args.max_iterations,
+                                            pyramid=[float(v) for v in args.pyramid.split(',') if len(v) > 0],
+                                            feature_cache=args.feature_cache,
+                                            feature_cache_limit=int(args.feature_cache_limit * 1024 * 1024),
+                                            metrics=(args.metrics is not None), target_dir=args.target_dir,
+                                            stream_voxel_size=args.stream_voxel_size, index=args.index,
+                                            max_distance=args.max_distance,
+                                            convergence=dict(rotation_tolerance=args.rotation_tolerance,
+                                                             translation_tolerance=args.translation_tolerance,
+                                                             plateau_window=args.plateau_window,
+                                                             plateau_tolerance=args.plateau_tolerance,
+                                                             min_sample_size=args.min_sample_size),
+                                            kernel=args.kernel, kernel_parameter=args.kernel_parameter,
+                                            solver=args.solver, objective=args.objective,
+                                            overlap_margin=args.overlap_margin,
+                                            max_normal_angle=args.max_normal_angle, sampling=args.sampling)
+    if (poses is None):
+        quit()
+
+    # 输出指标汇总，慢收敛的扫描对可以从收敛速度和迭代次数看出
+    if (args.metrics is not None):
+        for metrics in metrics_list:
+            print(metrics.format_summary())
+        write_metrics(args.metrics, metrics_list)
+        print("指标已写入 {}".format(args.metrics))
+
+    # 将结果写入文件
+    write_transforms(args.output, poses)
+    print("已将 {} 个变换写入 {}".format(len(poses), args.output))
+    if (args.transform_store is not None):
+        TransformStore(args.transform_store).update(poses)
+        print("已将 {} 个变换合并到 {}".format(len(poses), args.transform_store))
@@ -0,0 +1,210 @@
+# 文件：benchmark.py
+# 简介：配准流程的性能基准测试
+#       在自带的PLY_PTS、bunny/data扫描和规模递增的合成点云上分别计时各个阶段
+#       （加载、KdTree构建、最近邻查询、ICP迭代、FPFH预处理和快速全局配准），
+#       将结果写入JSON文件，并可以与保存的基准结果比较以发现性能回退。
+
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import platform
+import numpy as np
+from lib.utils import load_cloud, write_cloud
+from lib.pointcloud import PointCloud
+from lib.ptscache import load_cached
+from lib.kdtree import ArrayKdTree
+from lib.icp import icp_align
+from lib.scanset import Scan, initial_pose
+
+# 重复运行fn并返回每次运行的耗时（秒）
+def time_stage(fn, repeats):
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+# 生成合成点云：在半径为0.1的球面上随机采样n个点，法线沿径向
+def synthetic_cloud(n, seed=0):
+    rng = np.random.default_rng(seed)
+    normals = rng.normal(size=(n, 3))
+    normals /= np.linalg.norm(normals, axis=1)[:, None]
+    positions = 0.1 * normals + rng.normal(scale=1e-4, size=(n, 3))
+    return PointCloud(positions, normals)
+
+# 返回一个小的刚体扰动（绕z轴旋转angle弧度并平移）
+def perturbation(angle=0.05, shift=0.002):
+    c, s = np.cos(angle), np.sin(angle)
+    return np.matrix([[c, -s, 0.0, shift], [s, c, 0.0, shift], [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]])
+
+# 基准测试的运行器：记录每个(数据集, 阶段)的计时结果
+class Benchmark:
+    def __init__(self, repeats=3, queries=2000, iterations=5):
+        self.repeats = repeats
+        self.queries = queries
+        self.iterations = iterations
+        self.results = []
+
+    # n为该阶段处理的数量（点数或查询数），cloud_size为所在点云的点数（默认与n相同）；
+    # 最近邻查询的次数对所有规模的点云都一样，比较时必须同时按点云的点数区分
+    def record(self, dataset, stage, n, times, unit_count=1, cloud_size=None):
+        cloud_size = n if (cloud_size is None) else cloud_size
+        result = {"dataset": dataset, "stage": stage, "n": int(n), "cloud_size": int(cloud_size),
+                  "repeats": len(times), "min": min(times) / unit_count, "median": float(np.median(times)) / unit_count}
+        self.results.append(result)
+        print("{:<16} {:<16} n={:<9} size={:<9} min={:.6f}s median={:.6f}s".format(
+            dataset, stage, n, cloud_size, result["min"], result["median"]))
+
+    # KdTree构建、最近邻查询和ICP迭代；M1将源点云变换到目标点云的坐标系
+    def run_cloud_stages(self, dataset, source, target, M1):
+        times = time_stage(lambda: ArrayKdTree(target.positions), self.repeats)
+        self.record(dataset, "kdtree_build", len(target), times)
+
+        tree = ArrayKdTree(target.positions)
+        rng = np.random.default_rng(0)
+        queries = source.subset(rng.integers(0, len(source), self.queries)).transform(M1).positions
+        times = time_stage(lambda: tree.nearest_batch(queries), self.repeats)
+        self.record(dataset, "nn_query", self.queries, times, cloud_size=len(target))
+
+        # 强制执行固定的迭代次数，记录每次迭代的耗时
+        M = perturbation() * M1
+        times = time_stage(lambda: icp_align(source, target, tree, M, np.identity(4), max_iterations=self.iterations,
+                                             tolerance=-np.inf, verbose=False, rng=np.random.default_rng(0)),
+                           self.repeats)
+        self.record(dataset, "icp_iteration", len(source), times, self.iterations)
+
+    # 自带的.pts扫描：文本加载、缓存加载以及各个阶段
+    def run_pts(self, pts_dir, source_name, target_name):
+        source_file = os.path.join(pts_dir, source_name + '.pts')
+        target_file = os.path.join(pts_dir, target_name + '.pts')
+        if (not os.path.isfile(source_file) or not os.path.isfile(target_file)):
+            print("警告：找不到{}或{}，跳过".format(source_file, target_file))
+            return
+
+        times = time_stage(lambda: load_cloud(target_file), self.repeats)
+        n = len(load_cloud(target_file))
+        self.record(target_name, "load_text", n, times)
+        load_cached(target_file)
+        times = time_stage(lambda: load_cached(target_file), self.repeats)
+        self.record(target_name, "load_cached", n, times)
+
+        # 使用自带的.xf把源点云变换到目标点云的坐标系，使查询与实际配准时一致
+        source = load_cached(source_file)
+        M1 = initial_pose(Scan(source_name, source_file))
+        M2 = initial_pose(Scan(target_name, target_file))
+        self.run_cloud_stages(target_name, source, load_cached(target_file), M2.I * M1)
+
+    # 规模递增的合成点云
+    def run_synthetic(self, sizes):
+        for n in sizes:
+            dataset = "synthetic"
+            target = synthetic_cloud(n)
+            source = synthetic_cloud(n, seed=1)
+
+            # 加载：写入临时.pts文件，分别计时文本加载和缓存加载
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                file_name = os.path.join(tmp_dir, "synthetic.pts")
+                write_cloud(file_name, target)
+                times = time_stage(lambda: load_cloud(file_name), self.repeats)
+                self.record(dataset, "load_text", n, times)
+                load_cached(file_name)
+                times = time_stage(lambda: load_cached(file_name), self.repeats)
+                self.record(dataset, "load_cached", n, times)
+
+            self.run_cloud_stages(dataset, source, target, np.matrix(np.identity(4)))
+
+    # FPFH预处理和快速全局配准（需要Open3D）
+    def run_fgr(self, ply_dir, source_name, target_name, voxel_size):
+        try:
+            import open3d as o3d
+            from registration import preprocess_point_cloud, execute_fast_global_registration
+        except ImportError:
+            print("警告：没有安装Open3D，跳过FPFH和快速全局配准")
+            return
+
+        source_file = os.path.join(ply_dir, source_name + '.ply')
+        target_file = os.path.join(ply_dir, target_name + '.ply')
+        if (not os.path.isfile(source_file) or not os.path.isfile(target_file)):
+            print("警告：找不到{}或{}，跳过".format(source_file, target_file))
+            return
+        source = o3d.io.read_point_cloud(source_file)
+        target = o3d.io.read_point_cloud(target_file)
+
+        times = time_stage(lambda: preprocess_point_cloud(target, voxel_size), self.repeats)
+        self.record(target_name, "fpfh", len(target.points), times)
+
+        source_down, source_fpfh = preprocess_point_cloud(source, voxel_size)
+        target_down, target_fpfh = preprocess_point_cloud(target, voxel_size)
+        times = time_stage(lambda: execute_fast_global_registration(source_down, target_down, source_fpfh,
+                                                                    target_fpfh, voxel_size), self.repeats)
+        self.record(target_name, "fgr", len(source_down.points), times)
+
+    def report(self):
+        return {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"), "results": self.results}
+
+# 比较结果的条目键(数据集, 阶段, 点云的点数, n)；没有记录点云点数的旧结果按n作为点数
+def result_key(r):
+    return (r["dataset"], r["stage"], r.get("cloud_size", r["n"]), r["n"])
+
+# 与基准结果比较：最短耗时超过基准的threshold倍且多出min_delta秒以上视为回退（忽略微小耗时的抖动）
+# 条目按result_key对应；基准中没有对应结果的条目（例如旧格式的nn_query结果）逐条报告，而不是直接忽略
+# 返回回退的条目列表
+def compare(results, baseline, threshold, min_delta=0.001):
+    base = dict((result_key(r), r) for r in baseline["results"])
+    regressions = []
+    matched = set()
+    for r in results["results"]:
+        key = result_key(r)
+        if (key not in base):
+            continue
+        matched.add(key)
+        ratio = r["min"] / base[key]["min"] if (base[key]["min"] > 0) else 1.0
+        flag = ""
+        if (ratio > threshold and r["min"] - base[key]["min"] > min_delta):
+            flag = "  <-- 回退"
+            regressions.append((key, ratio))
+        print("{:<16} {:<16} n={:<9} size={:<9} {:.6f}s -> {:.6f}s ({:.2f}x){}".format(
+            key[0], key[1], key[3], key[2], base[key]["min"], r["min"], ratio, flag))
+    for key in base:
+        if (key not in matched):
+            print("警告：基准中的 {} {} n={} size={} 没有对应的结果，未比较".format(key[0], key[1], key[3], key[2]))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="配准流程的性能基准测试")
+    parser.add_argument("--output", default="benchmark_results.json", help="结果输出文件（JSON）")
+    parser.add_argument("--baseline", help="与之比较的基准结果文件（JSON）")
+    parser.add_argument("--threshold", type=float, default=1.25, help="判定为回退的耗时倍数")
+    parser.add_argument("--min-delta", type=float, default=0.001, help="判定为回退的最小耗时增加（秒）")
+    parser.add_argument("--repeats", type=int, default=3, help="每个阶段重复的次数")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="合成点云的点数（逗号分隔）")
+    parser.add_argument("--pts-dir", default="PLY_PTS", help="自带的.pts扫描所在目录")
+    parser.add_argument("--ply-dir", default="bunny/data", help="自带的.ply扫描所在目录")
+    parser.add_argument("--pair", default="bun045,bun000", help="用于测试的扫描对\"源,目标\"")
+    parser.add_argument("--voxel-size", type=float, default=0.003, help="FPFH和快速全局配准的体素大小")
+    args = parser.parse_args()
+
+    source_name, target_name = args.pair.split(',')
+    bench = Benchmark(args.repeats)
+    bench.run_pts(args.pts_dir, source_name, target_name)
+    bench.run_fgr(args.ply_dir, source_name, target_name, args.voxel_size)
+    bench.run_synthetic([int(v) for v in args.sizes.split(',') if len(v) > 0])
+
+    results = bench.report()
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print("结果已写入 {}".format(args.output))
+
+    if (args.baseline is not None):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        if (len(regressions) > 0):
+            print("发现 {} 个性能回退".format(len(regressions)))
+            sys.exit(1)
+        print("没有发现性能回退")
@@ -1,156 +1,140 @@
 # 文件：icp.py
 # 简介：实现了迭代最近点算法
 #       接受两个*.pts文件作为参数，尝试将第一个文件中的点与第二个文件中的点对齐。
+#       也可以直接使用*.ply文件（读取顶点并估计法线），不需要先用PLY_PTS.py转换。
 #       期望每个文件都有对应的*.xf文件。
+#       第二个参数也可以是prepare_target.py生成的准备好的目标（*.npz），此时不需要重新构建KdTree。
+#       算法本身在lib/icp.py的ICPRegistration中，这里只负责命令行、文件读写和日志。
 
 import os
+import sys
 import numpy as np
-from sys import argv
-from random import shuffle
-from math import *
 from lib.utils import *
-from lib.kdtree import KdTree
+from lib.ptscache import load_cached
+from lib.stream import load_streaming
+from lib.metrics import write_metrics
+from lib.icp import ICPOptions, ICPRegistration
+from lib.target import PreparedTarget
 
 output_path = 'output01'
 
-# 检查使用情况
-if (len(argv) != 3):
-    print("使用错误：icp.py需要两个额外的参数。\n"
-          "正确的用法是 \"icp.py file1.pts file2.pts\"")
-    quit()
-
-# 检查pts文件是否存在
-file1 = argv[1]
-file2 = argv[2]
-if (not os.path.isfile(file1)):
-    print("错误：找不到.pts文件：" + file1)
-    quit()
-if (not os.path.isfile(file2)):
-    print("错误：找不到.pts文件：" + file2)
-    quit()
-
-# 加载pts
-pts1 = load_pts(file1)
-pts2 = load_pts(file2)
-
-# 检查xf文件是否存在
-file1_xf = '.'.join(file1.split('.')[:-1]) + '.xf'
-file2_xf = '.'.join(file2.split('.')[:-1]) + '.xf'
-if (not os.path.isfile(file1_xf)):
-    print("警告：找不到.xf文件：" + file1_xf)
-    print("默认使用4x4单位矩阵...")
-    M1 = np.identity(4)
-else:
-    M1 = load_xf(file1_xf)
-
-# 注意，如果存在"output"file2.xf，则需要加载，否则会覆盖之前的工作
-output_file2_xf = './' + output_path + '/' + file2_xf.split('/')[-1]
-if (not os.path.isfile(output_file2_xf)):
-    if (not os.path.isfile(file2_xf)):
-        print("警告：找不到.xf文件：" + file2_xf)
-        print("默认使用4x4单位矩阵...")
-        M2 = np.identity(4)
-    else:
-        M2 = load_xf(file2_xf)
-else:
-    print("使用变换 {} 作为目标".format(output_file2_xf))
-    M2 = load_xf(output_file2_xf)
-
-# 从文件2中的点构建一个kd树
-print("正在从 {} 构建KdTree...".format(file2))
-kdtree = KdTree()
-for p in pts2:
-    kdtree.insert(p)
-
 # ICP迭代（直到正负改进小于设定比例）
-
 max_iterations = 50  # 设置最大迭代次数
-print("开始迭代...")
-ratio = 0.0
-M2_inverse = M2.I
-pts_index = [i for i in range(len(pts1))]
-count = 0
-while (1.0 - ratio > 0.0001 and count < max_iterations):
-    # 随机选择1000个点
-    shuffle(pts_index)
-    # 应用M1和M2的逆
-    p = [pts1[i].copy().transform(M1).transform(M2_inverse) for i in pts_index[:2000]]
-    q = [kdtree.nearest(point) for point in p]
-
-    # 计算点到平面的距离
-    point2plane = [abs(np.subtract(pi.s, qi.s).dot(qi.n)) for pi,qi in zip(p,q)]
-    median_3x = 0.75 * np.median(point2plane) # 数据集坐标值比较大时可设置为3倍，较小时根据实际情况调整
-
-    # 剔除异常值
-    point_pairs = []
-    dist_sum = 0.0
-    for i, pair in enumerate(zip(p,q)):
-        if (point2plane[i] <= median_3x):
-            point_pairs.append(pair)
-            dist_sum += point2plane[i]
-    if (len(point_pairs) > 0):
-        old_mean = dist_sum/len(point_pairs)
-    else:
-        print("错误：在计算距离平均值时出了问题")
-        quit()
-
-    # 构建C和d
-    C = np.zeros(shape=(6,6))
-    d = np.zeros(shape=(6,1))
-    for (p, q) in point_pairs:
-        Ai = np.matrix(np.append(np.cross(p.s, q.n),q.n))
-        AiT = Ai.T
-        bi = np.subtract(q.s, p.s).dot(q.n)
-
-        C += AiT*Ai
-        d += AiT*bi
-
-    # 解线性方程组并计算Micp
-    x = np.linalg.solve(C,d).flatten()
-    rx,ry,rz,tx,ty,tz = x
-    Micp = np.matrix([[1.0, ry*rx - rz, rz*rx + ry, tx],[rz, 1.0 + rz*ry*rx, rz*ry - rx, ty], [-ry, rx, 1.0, tz], [0, 0, 0, 1.0]])
-
-    # 计算新的平均点到平面距离
-    dist_sum = 0.0
-    for (p, q) in point_pairs:
-        # 应用Micp
-        p = p.transform(Micp)
-        dist_sum += abs(np.subtract(p.s, q.s).dot(q.n))
-    new_mean = dist_sum/len(point_pairs)
-    count += 1
-    ratio = new_mean / old_mean
-
-    # 如果我们改进了就更新M1（否则，将终止）
-    if (ratio < 1.0):
-        M1 = M2*Micp*M2_inverse*M1
-    else:
-        new_mean = old_mean
+sample_size = 2000  # 每次迭代采样的点数
+outlier_factor = 0.75  # 数据集坐标值比较大时可设置为3倍，较小时根据实际情况调整
+pyramid_levels = []  # 由粗到精的体素大小，例如[0.004, 0.002]；为空时只在全分辨率上迭代
+rotation_tolerance = None  # 增量旋转角度（弧度）小于此值时终止，例如1e-4；为None时不使用
+translation_tolerance = None  # 增量平移长度小于此值时终止，例如1e-5；为None时不使用
+plateau_window = None  # 最近这么多次迭代的平均距离总改进小于1%时终止，例如5；为None时不使用
+min_sample_size = None  # 自适应采样：从这么多点开始，收敛后逐步增大到sample_size，例如250；为None时固定采样点数
+robust_kernel = None  # 鲁棒核函数："trimmed"、"huber"、"tukey"或"geman_mcclure"，代替outlier_factor的硬阈值；为None时不使用
+kernel_parameter = None  # 核函数的参数（trimmed为保留的比例，其余为残差尺度的倍数）；为None时使用默认值
+solver = "gauss_newton"  # 增量变换的求解方法："small_angle"（原来的小角度近似）、"gauss_newton"或"levenberg_marquardt"
+objective = "point_to_plane"  # 目标函数："point_to_plane"或"symmetric"（对称点到平面，同时使用源和目标的法线）
+sampling = "uniform"  # 采样方法："uniform"、"normal_space"（按法线方向分桶）或"covariance"（按对线性方程组的约束加权）
+overlap_margin = None  # 只从与目标包围盒（向外扩大这么多）重叠的区域内采样，例如0.005；为None时不筛选
+max_normal_angle = None  # 剔除法线夹角（度）大于此值的对应点对，例如45；为None时不检查
+spatial_index = "kdtree"  # 对应点搜索的空间索引："kdtree"、"grid"（只查找max_distance以内）或"hybrid"（网格优先，找不到时用KdTree）
+max_distance = None  # 网格索引的最大查找距离；为None时取估计的点间距的4倍
+stream_voxel_size = None  # 超大扫描：分块读取并边读取边体素下采样到此大小（例如0.001），不需要把整个文件放入内存
+metrics_file = None  # 每次迭代的耗时和残差统计的输出文件，例如"metrics.jsonl"或"metrics.csv"；为None时不记录
+
+# 返回.pts文件对应的.xf文件路径
+def xf_path(file_name):
+    return os.path.splitext(file_name)[0] + '.xf'
+
+# 加载.xf文件；找不到时使用4x4单位矩阵
+def load_xf_or_identity(file_name):
+    if (not os.path.isfile(file_name)):
+        print("警告：找不到.xf文件：" + file_name)
+        print("默认使用4x4单位矩阵...")
+        return np.matrix(np.identity(4))
+    return load_xf(file_name)
 
-    print("完成了迭代 #{}，改进了 {:2.4%}".format(count, 1.0 - ratio))
+# 加载点云：设置了stream_voxel_size时流式读取并下采样，否则使用二进制缓存
+def load_cloud_file(file_name):
+    if (stream_voxel_size is not None):
+        return load_streaming(file_name, voxel_size=stream_voxel_size)
+    return load_cached(file_name)
 
-print("成功终止，采样的平均距离为 {}".format(new_mean))
 # 添加日志记录函数
 def log_to_file(message, log_file):
     with open(log_file, "a") as f:  # 使用追加模式'a'
         f.write(message + "\n")
-log_message = "成功终止，采样的平均距离为 {}".format(new_mean)
-log_to_file(log_message, "结果记录.txt")  # 将日志写入文件
-
-# 将结果写入文件
-output_file1_pts = output_path + file1.split('/')[-1]
-output_file1_xf = output_path + file1_xf.split('/')[-1]
-output_file2_pts = output_path + file2.split('/')[-1]
-output_file2_xf = output_path + file2_xf.split('/')[-1]
-write_pts(output_file1_pts, pts1)
-write_pts(output_file2_pts, pts2)
-write_xf(output_file1_xf, M1)
-write_xf(output_file2_xf, M2)
-
-# 将转移矩阵写入文件.txt，方便配合CloudCompare使用
-file1_txt = output_path + '.'.join(file1.split('/')[-1].split('.')[:-1]) + '.txt'
-file2_txt = output_path + '.'.join(file2.split('/')[-1].split('.')[:-1]) + '.txt'
-write_txt(file1_txt, M1)
-write_txt(file2_txt, M2)
-
-# 全部完成
-quit()
+
+def main(argv):
+    # 检查使用情况
+    if (len(argv) != 3):
+        print("使用错误：icp.py需要两个额外的参数。\n"
+              "正确的用法是 \"icp.py file1.pts file2.pts\"")
+        return
+
+    # 检查pts文件是否存在
+    file1 = argv[1]
+    file2 = argv[2]
+    if (not os.path.isfile(file1)):
+        print("错误：找不到点云文件：" + file1)
+        return
+    if (not os.path.isfile(file2)):
+        print("错误：找不到点云文件：" + file2)
+        return
+
+    # 加载pts；文件2为准备好的目标时直接加载点云、KdTree和变换
+    pts1 = load_cloud_file(file1)
+    name1 = os.path.splitext(os.path.basename(file1))[0]
+    if (file2.lower().endswith('.npz')):
+        print("正在加载准备好的目标 {}...".format(file2))
+        target = PreparedTarget.load(file2)
+        name2 = target.name if (target.name) else os.path.splitext(os.path.basename(file2))[0]
+        M2 = target.transform
+    else:
+        name2 = os.path.splitext(os.path.basename(file2))[0]
+        target = None
+        M2 = load_xf_or_identity(xf_path(file2))
+
+    # 检查xf文件是否存在
+    M1 = load_xf_or_identity(xf_path(file1))
+
+    # 注意，如果存在"output"file2.xf，则需要加载，否则会覆盖之前的工作
+    output_file2_xf = os.path.join(output_path, name2 + '.xf')
+    if (os.path.isfile(output_file2_xf)):
+        print("使用变换 {} 作为目标".format(output_file2_xf))
+        M2 = load_xf(output_file2_xf)
+
+    # 从文件2中的点构建一个kd树
+    if (target is None):
+        print("正在从 {} 构建KdTree...".format(file2))
+        target = PreparedTarget(load_cloud_file(file2), M2, name=name2)
+    pts2 = target.cloud
+    options = ICPOptions(sample_size, outlier_factor, max_iterations, pyramid=pyramid_levels, verbose=True,
+                         record_metrics=(metrics_file is not None), index=spatial_index, max_distance=max_distance,
+                         rotation_tolerance=rotation_tolerance, translation_tolerance=translation_tolerance,
+                         plateau_window=plateau_window, min_sample_size=min_sample_size,
+                         kernel=robust_kernel, kernel_parameter=kernel_parameter, solver=solver,
+                         objective=objective, overlap_margin=overlap_margin, max_normal_angle=max_normal_angle,
+                         sampling=sampling)
+    engine = ICPRegistration(target, options=options)
+
+    print("开始迭代...")
+    result = engine.register(pts1, M1, M2, label=os.path.basename(file1) + " -> " + os.path.basename(file2))
+    M1 = result.transform
+    if (result.metrics is not None):
+        print(result.metrics.format_summary())
+        write_metrics(metrics_file, [result.metrics])
+
+    log_message = "成功终止，采样的平均距离为 {}".format(result.mean_distance)
+    print(log_message)
+    log_to_file(log_message, "结果记录.txt")  # 将日志写入文件
+
+    # 将结果写入文件
+    write_cloud(os.path.join(output_path, name1 + '.pts'), pts1)
+    write_cloud(os.path.join(output_path, name2 + '.pts'), pts2)
+    write_xf(os.path.join(output_path, name1 + '.xf'), M1)
+    write_xf(os.path.join(output_path, name2 + '.xf'), M2)
+
+    # 将转移矩阵写入文件.txt，方便配合CloudCompare使用
+    write_txt(os.path.join(output_path, name1 + '.txt'), M1)
+    write_txt(os.path.join(output_path, name2 + '.txt'), M2)
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,102 @@
+# 文件：incremental_registration.py
+# 简介：增量配准：把新的扫描逐个配准到已对齐扫描的合并模型（lib/model.py）并插入模型，
+#       模型保存在一个.npz文件中，之后的运行直接加载并继续添加，不需要重新配准已有的扫描。
+#       第一个扫描作为基准；每个扫描的初始位置使用同名的.xf（或bun.conf中的位姿），
+#       配准结果写入输出目录。使用--watch时持续监视一个目录，新的扫描文件出现后自动配准。
+#       用法："incremental_registration.py model.npz 扫描文件或扫描列表... [--watch DIR]"
+
+import os
+import time
+import argparse
+from lib.ptscache import load_cached
+from lib.scanset import Scan, scan_name, load_scan_list, initial_pose
+from lib.icp import ICPOptions
+from lib.model import AlignedModel
+from lib.xfstore import write_transforms
+
+# 将命令行参数展开为扫描列表：.conf和.txt/.list按扫描列表读取，其他的作为单个扫描文件
+def expand_scans(paths):
+    scans = []
+    for path in paths:
+        if (os.path.splitext(path)[1].lower() in ('.conf', '.txt', '.list')):
+            scans.extend(load_scan_list(path))
+        else:
+            scans.append(Scan(scan_name(path), path))
+    return scans
+
+# 返回目录中还没有加入模型的扫描文件（.pts优先于同名的.ply）
+def new_scans(directory, model):
+    files = {}
+    for file_name in sorted(os.listdir(directory)):
+        name, ext = os.path.splitext(file_name)
+        if (ext.lower() in ('.pts', '.ply') and name not in model and (name not in files or ext.lower() == '.pts')):
+            files[name] = os.path.join(directory, file_name)
+    return [Scan(name, path) for name, path in files.items()]
+
+# 将一个扫描配准到模型并插入模型，然后保存模型和扫描的位姿
+def add_scan(model, scan, args):
+    if (scan.name in model):
+        print("跳过已在模型中的扫描 {}".format(scan.name))
+        return
+    if (not os.path.isfile(scan.path)):
+        print("错误：找不到点云文件：" + scan.path)
+        return
+
+    print("正在加载 {}...".format(scan.path))
+    cloud = load_cached(scan.path)
+    options = ICPOptions(args.sample_size, args.outlier_factor, args.max_iterations, index=args.index,
+                         max_distance=args.max_distance, min_sample_size=args.min_sample_size,
+                         rotation_tolerance=args.rotation_tolerance)
+    start = time.perf_counter()
+    result = model.register(scan.name, cloud, initial_pose(scan), options)
+    begin, end = model.ranges[scan.name]
+    if (result is None):
+        print("{} 作为基准加入模型（{} 个点）".format(scan.name, end - begin))
+    else:
+        print("{} -> 模型：经过 {} 次迭代成功终止，采样的平均距离为 {}".format(scan.name, result.iterations,
+                                                                        result.mean_distance))
+        print("插入了 {} 个新点，模型共 {} 个点，用时 {:.2f} 秒".format(end - begin, len(model),
+                                                                time.perf_counter() - start))
+    model.save(args.model)
+    write_transforms(args.output, {scan.name: model.transforms[scan.name]})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把新的扫描增量地配准到已对齐扫描的合并模型")
+    parser.add_argument("model", help="模型文件（.npz）；不存在时新建")
+    parser.add_argument("scans", nargs="*", help="扫描文件（.pts或.ply），或bun.conf格式的文件/扫描列表")
+    parser.add_argument("--watch", help="持续监视此目录，新的.pts/.ply文件出现后自动配准")
+    parser.add_argument("--interval", type=float, default=5.0, help="监视目录的间隔（秒）")
+    parser.add_argument("--output", default="output01", help="输出.xf和.txt文件的目录")
+    parser.add_argument("--merge-distance", type=float, default=None,
+                        help="新建模型时使用：与模型已有点的距离小于此值的新点不插入模型（去除重叠区域的重复点）")
+    parser.add_argument("--sample-size", type=int, default=2000, help="每次ICP迭代采样的点数")
+    parser.add_argument("--outlier-factor", type=float, default=0.75, help="剔除异常值的中位数倍数")
+    parser.add_argument("--max-iterations", type=int, default=50, help="ICP的最大迭代次数")
+    parser.add_argument("--min-sample-size", type=int, default=None,
+                        help="自适应采样：从这么多点开始，收敛后逐步增大到--sample-size")
+    parser.add_argument("--rotation-tolerance", type=float, default=None,
+                        help="增量旋转角度（弧度）小于此值时终止ICP，例如1e-4")
+    parser.add_argument("--index", default="kdtree", choices=["kdtree", "grid", "hybrid"],
+                        help="对应点搜索的空间索引（grid和hybrid在每次配准时在整个模型上构建网格）")
+    parser.add_argument("--max-distance", type=float, default=None, help="网格索引的最大查找距离")
+    args = parser.parse_args()
+
+    if (os.path.isfile(args.model)):
+        print("正在加载模型 {}...".format(args.model))
+        model = AlignedModel.load(args.model)
+        print("模型中有 {} 个扫描，共 {} 个点".format(len(model.names), len(model)))
+    else:
+        model = AlignedModel(args.merge_distance)
+
+    for scan in expand_scans(args.scans):
+        add_scan(model, scan, args)
+
+    if (args.watch is not None):
+        print("正在监视 {}（按Ctrl+C停止）...".format(args.watch))
+        try:
+            while (True):
+                for scan in new_scans(args.watch, model):
+                    add_scan(model, scan, args)
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            pass
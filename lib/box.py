@@ -4,6 +4,7 @@
 # 简介：实现了一个n维的盒子；改编自COS 226的RectHV
 
 from math import *
+import numpy as np
 from .point import Point
 
 # 一个n维的轴对齐盒子
@@ -96,11 +97,24 @@ class Box:
         for pval, min_val in zip(p.s, self.sMin):
             if (pval < min_val):
                 return False
-        for min_val, max_val in zip(self.sMin, that.sMax):  # 我认为原项目这里的that是多余的，但不影响结果，于是保留
-            if (max_val < min_val):
-                return False
         return True
 
+    # 返回(N,d)位置数组中每个点是否在盒子内（包括边界）的掩码，与contains相同但一次处理所有点
+    def contains_batch(self, positions):
+        positions = np.asarray(positions, dtype=np.float64)
+        return np.all((positions >= np.array(self.sMin)) & (positions <= np.array(self.sMax)), axis=1)
+
+    # 返回这个盒子与那个盒子的交集；不相交时返回None
+    def intersection(self, that):
+        if (not self.intersects(that)):
+            return None
+        return Box(Point([max(a, b) for a, b in zip(self.sMin, that.sMin)]),
+                   Point([min(a, b) for a, b in zip(self.sMax, that.sMax)]))
+
+    # 返回在每个维度上向两侧扩大margin的盒子
+    def expand(self, margin):
+        return Box(Point([v - margin for v in self.sMin]), Point([v + margin for v in self.sMax]))
+
     # 返回这个盒子和点之间的欧几里得距离
     def distTo(self, p):
         return sqrt(self.distSqdTo(p))
@@ -0,0 +1,76 @@
+# 项目：点云配准
+#
+# 文件：convergence.py
+# 简介：ICP迭代的收敛控制器：决定每次迭代的采样点数以及何时终止
+#       终止条件（任意一个满足即终止）：
+#         1. 达到最大迭代次数
+#         2. 平均距离的改进比例小于tolerance（或没有改进）
+#         3. 增量变换的旋转角度和平移长度都小于阈值（只给出一个阈值时只检查这一个）
+#         4. 最近plateau_window次迭代中平均距离的总改进比例小于plateau_tolerance
+#       自适应采样：从min_sample_size个点开始，条件2～4满足时不终止，而是把采样点数乘以growth，
+#       直到达到sample_size之后才真正终止；粗对齐时用少量点，接近收敛时再用全部采样点细化
+
+import numpy as np
+
+PLATEAU_TOLERANCE = 0.01  # 平台期内平均距离的最小总改进比例的默认值（所有入口共用）
+
+# 返回4x4刚体变换的旋转角度（弧度）和平移长度
+def transform_delta(M):
+    M = np.asarray(M, dtype=np.float64)
+    cos = (np.trace(M[:3, :3]) - 1.0) / 2.0
+    return float(np.arccos(np.clip(cos, -1.0, 1.0))), float(np.linalg.norm(M[:3, 3]))
+
+class ConvergenceController:
+    def __init__(self, max_iterations=50, tolerance=0.0001, rotation_tolerance=None, translation_tolerance=None,
+                 plateau_window=None, plateau_tolerance=PLATEAU_TOLERANCE, sample_size=2000, min_sample_size=None, growth=2.0):
+        self.max_iterations = max_iterations  # 最大迭代次数
+        self.tolerance = tolerance  # 每次迭代平均距离的最小改进比例
+        self.rotation_tolerance = rotation_tolerance  # 增量旋转角度的阈值（弧度）；为None时不使用
+        self.translation_tolerance = translation_tolerance  # 增量平移长度的阈值；为None时不使用
+        self.plateau_window = plateau_window  # 判断平台期的迭代次数；为None时不使用
+        self.plateau_tolerance = plateau_tolerance  # 平台期内平均距离的最小总改进比例
+        self.max_sample_size = sample_size  # 最终的采样点数
+        self.min_sample_size = sample_size if (min_sample_size is None) else min(min_sample_size, sample_size)
+        self.growth = growth  # 自适应采样时每次增大的倍数
+        self.reset()
+
+    # 开始新的一次配准（或金字塔的新一层）
+    def reset(self):
+        self.count = 0
+        self.sample_size = self.min_sample_size
+        self.history = []
+        self.running = (self.max_iterations > 0)
+        self.reason = None
+
+    # 记录一次迭代：delta为这次迭代的增量变换，old_mean和new_mean为变换前后的平均距离
+    # 返回是否继续迭代
+    def update(self, delta, old_mean, new_mean):
+        self.count += 1
+        ratio = new_mean / old_mean if (old_mean > 0) else 1.0
+        mean = min(old_mean, new_mean)
+        self.history.append(mean)
+
+        reason = None
+        if (1.0 - ratio <= self.tolerance):
+            reason = "改进小于{:.4%}".format(self.tolerance)
+        elif (self.rotation_tolerance is not None or self.translation_tolerance is not None):
+            angle, shift = transform_delta(delta)
+            if ((self.rotation_tolerance is None or angle < self.rotation_tolerance) and
+                    (self.translation_tolerance is None or shift < self.translation_tolerance)):
+                reason = "增量旋转{:.2e}弧度、平移{:.2e}小于阈值".format(angle, shift)
+        if (reason is None and self.plateau_window is not None and len(self.history) > self.plateau_window):
+            first = self.history[-self.plateau_window - 1]
+            if (first > 0 and (first - mean) / first < self.plateau_tolerance):
+                reason = "最近{}次迭代的改进小于{:.2%}".format(self.plateau_window, self.plateau_tolerance)
+
+        if (reason is not None and self.sample_size < self.max_sample_size):
+            # 在当前采样点数下已经收敛：增大采样点数继续细化
+            self.sample_size = min(int(self.sample_size * self.growth), self.max_sample_size)
+            self.history = []
+            reason = None
+        if (reason is None and self.count >= self.max_iterations):
+            reason = "达到最大迭代次数"
+
+        self.reason = reason
+        self.running = (reason is None)
+        return self.running
@@ -0,0 +1,89 @@
+# 项目：点云配准
+#
+# 文件：featurecache.py
+# 简介：下采样点云、法线和FPFH特征的磁盘缓存
+#       以输入文件内容的哈希值和预处理参数作为键，每个条目保存为一个.npz文件；
+#       总大小超过上限时按最近最少使用（LRU）的顺序淘汰条目
+
+import os
+import hashlib
+import numpy as np
+
+# 返回文件内容的SHA-1哈希值（分块读取）
+def file_hash(file_name, block_size=1 << 20):
+    h = hashlib.sha1()
+    with open(file_name, "rb") as f:
+        while (True):
+            block = f.read(block_size)
+            if (len(block) == 0):
+                break
+            h.update(block)
+    return h.hexdigest()
+
+# 由文件内容哈希值和参数构造缓存键；params为数值的元组，例如(voxel_size, radius_normal, ...)
+def cache_key(file_name, params):
+    text = ' '.join(repr(float(v)) for v in params)
+    return file_hash(file_name) + '-' + hashlib.sha1(text.encode()).hexdigest()[:16]
+
+# 磁盘缓存：cache_dir中的每个.npz文件是一个条目，文件的修改时间记录最近一次使用
+class FeatureCache:
+    def __init__(self, cache_dir='.fpfh_cache', max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    # 返回键对应的数组字典；不存在时返回None
+    def get(self, key):
+        file_name = self.path(key)
+        if (not os.path.isfile(file_name)):
+            return None
+        try:
+            with np.load(file_name) as data:
+                arrays = dict((name, data[name]) for name in data.files)
+        except (OSError, ValueError) as e:
+            print("警告：无法读取缓存条目{}：{}".format(file_name, e))
+            return None
+
+        # 更新使用时间，用于LRU淘汰
+        os.utime(file_name)
+        return arrays
+
+    # 保存键对应的数组字典，然后淘汰最久未使用的条目直到总大小不超过上限
+    def put(self, key, arrays):
+        if (not os.path.exists(self.cache_dir)):
+            os.makedirs(self.cache_dir)
+
+        # 先写入临时文件再原子地替换，避免并行的进程读到写了一半的条目
+        file_name = self.path(key)
+        tmp_name = "{}.{}.tmp.npz".format(file_name[:-4], os.getpid())
+        np.savez(tmp_name, **arrays)
+        os.replace(tmp_name, file_name)
+        self.evict(keep=file_name)
+
+    # 按最近使用时间从旧到新删除条目，直到总大小不超过上限（不删除刚写入的条目）
+    def evict(self, keep=None):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if (not name.endswith('.npz') or name.endswith('.tmp.npz')):
+                continue
+            file_name = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(file_name)
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, file_name))
+
+        total = sum(size for mtime, size, file_name in entries)
+        for mtime, size, file_name in sorted(entries):
+            if (total <= self.max_bytes):
+                break
+            if (file_name == keep):
+                continue
+            try:
+                os.remove(file_name)
+            except OSError:
+                continue
+            total -= size
+        return
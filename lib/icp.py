@@ -0,0 +1,321 @@
+# 项目：点云配准
+#
+# 文件：icp.py
+# 简介：点到平面ICP迭代中的批量数组运算（残差、异常值剔除、线性方程组的构建和求解），
+#       ICP迭代本身，由粗到精的多分辨率ICP，以及可以导入使用的ICP配准引擎（ICPRegistration）
+
+import time
+from math import inf
+import numpy as np
+from .kdtree import ArrayKdTree
+from .pointcloud import PointCloud
+from .metrics import ICPMetrics
+from .target import PreparedTarget
+from .spatialindex import build_index
+from .convergence import ConvergenceController, PLATEAU_TOLERANCE
+from .robust import RobustKernel
+from .overlap import OverlapFilter
+from .sampling import build_sampler, sample_masked
+from .se3 import IncrementSolver, orthonormalize
+
+# 返回内点掩码：距离不超过factor倍中位数的点对为内点
+def inlier_mask(point2plane, factor):
+    return point2plane <= factor * np.median(point2plane)
+
+# 在固定的对应点上求解增量变换Micp，返回(Micp, 变换后的平均点到平面距离, 重新评估的耗时)
+# robust给定时进行robust.iterations次重加权求解（weights为第一次的权重，平均距离为加权平均）；
+# 阻尼最小二乘时距离没有减小就增大阻尼重新求解，而不是终止
+# 重新评估的耗时为变换采样点和计算新的平均距离所用的时间（所有重试之和），其余为求解的时间
+def solve_increment(p, q, solver, robust, weights, old_mean):
+    reevaluate = 0.0
+    for attempt in range(solver.max_retries + 1):
+        Micp = np.identity(4)
+        positions, normals, w = p.positions, p.normals, weights
+        for i in range(1 if (robust is None) else robust.iterations):
+            if (i > 0):
+                w = robust.weights(solver.residuals(positions, normals, q.positions, q.normals))
+            step = solver.solve(positions, normals, q.positions, q.normals, w)
+            Micp = step @ Micp
+            start = time.perf_counter()
+            positions = positions @ step[:3, :3].T + step[:3, 3]
+            normals = normals @ step[:3, :3].T
+            reevaluate += time.perf_counter() - start
+        start = time.perf_counter()
+        point2plane = np.abs(solver.residuals(positions, normals, q.positions, q.normals))
+        new_mean = point2plane.mean() if (weights is None) else np.average(point2plane, weights=weights)
+        reevaluate += time.perf_counter() - start
+        if (new_mean < old_mean):
+            if (solver.damped()):
+                solver.accept()
+            break
+        if (not solver.damped()):
+            break
+        solver.reject()
+    return np.matrix(Micp), new_mean, reevaluate
+
+# 给定controller时检查另外传入的终止条件和采样点数：与controller的设置不同时给出警告（使用controller的设置）
+def check_controller(controller, settings):
+    current = {"max_iterations": controller.max_iterations, "tolerance": controller.tolerance,
+               "sample_size": controller.max_sample_size}
+    for name, value in settings.items():
+        if (value != current[name]):
+            print("警告：给定了收敛控制器，忽略{}={}，使用控制器的{}".format(name, value, current[name]))
+
+# 点到平面ICP：调整源点云的变换M1，使其与经M2变换后的目标点云对齐
+# kdtree为目标点云位置上的空间索引（ArrayKdTree或spatialindex.py中的其他后端）；迭代直到改进小于tolerance或达到max_iterations
+# rng为np.random.Generator，给定时采样可以复现；metrics为ICPMetrics，给定时记录每次迭代的耗时和残差
+# controller为ConvergenceController，给定时由它决定每次迭代的采样点数和何时终止；此时sample_size、max_iterations和
+# tolerance应为None（或与controller相同），否则给出警告并使用controller的设置；不给定时为None的参数使用控制器的默认值
+# robust为RobustKernel，给定时用鲁棒核的权重代替outlier_factor的硬阈值，平均距离为加权平均
+# solver为IncrementSolver（见se3.py），为None时使用精确指数映射的高斯-牛顿法
+# overlap为OverlapFilter（见overlap.py），给定时只从重叠区域内采样，并剔除法线方向不兼容的点对
+# sampling为采样方法："uniform"、"normal_space"或"covariance"（见sampling.py），采样器在开始迭代前构建一次
+# 返回(M1, 采样的平均距离, 迭代次数)
+def icp_align(source, target, kdtree, M1, M2, sample_size=None, outlier_factor=0.75,
+              max_iterations=None, tolerance=None, verbose=True, rng=None, metrics=None, controller=None,
+              robust=None, solver=None, overlap=None, sampling="uniform"):
+    if (rng is None):
+        rng = np.random.default_rng()
+    settings = {"max_iterations": max_iterations, "tolerance": tolerance, "sample_size": sample_size}
+    settings = dict((name, value) for name, value in settings.items() if (value is not None))
+    if (controller is None):
+        controller = ConvergenceController(**settings)
+    else:
+        check_controller(controller, settings)
+    if (solver is None):
+        solver = IncrementSolver()
+    controller.reset()
+    solver.reset()
+    M1 = np.matrix(M1)
+    M2 = np.matrix(M2)
+    ratio = 0.0
+    new_mean = inf
+    M2_inverse = M2.I
+    sampler = build_sampler(source, sampling, rng)
+    count = 0
+    while (controller.running):
+        t0 = time.perf_counter()
+        # 选择sample_size个点（给定overlap时只从重叠区域内的点中选择）
+        inside = None if (overlap is None) else overlap.mask(source.positions, M2_inverse * M1)
+        if (inside is None):
+            sample = sampler.sample(controller.sample_size)
+        else:
+            sample = sample_masked(sampler, controller.sample_size, inside)
+            if (len(sample) == 0):
+                print("错误：源点云与目标点云的包围盒没有重叠")
+                break
+        # 应用M1和M2的逆
+        p = source.subset(sample).transform(M2_inverse * M1)
+        t1 = time.perf_counter()
+        q_index, _ = kdtree.nearest_batch(p.positions)
+        # 空间索引在最大距离以内找不到对应点时返回-1，丢弃这些采样点
+        matched = q_index >= 0
+        if (not np.all(matched)):
+            p, q_index = p.subset(matched), q_index[matched]
+        if (len(q_index) == 0):
+            print("错误：最大距离以内没有找到任何对应点")
+            break
+        q = target.subset(q_index)
+        # 剔除法线方向不兼容的点对
+        if (overlap is not None):
+            compatible = overlap.compatible(p.normals, q.normals)
+            if (not np.any(compatible)):
+                print("错误：没有法线方向兼容的对应点")
+                break
+            if (not np.all(compatible)):
+                p, q = p.subset(compatible), q.subset(compatible)
+        t2 = time.perf_counter()
+
+        # 计算点到平面的距离（对称目标函数使用两个法线的平均方向）
+        point2plane = np.abs(solver.residuals(p.positions, p.normals, q.positions, q.normals))
+
+        if (robust is None):
+            # 剔除异常值
+            inliers = inlier_mask(point2plane, outlier_factor)
+            weights = None
+            if (not np.any(inliers)):
+                print("错误：在计算距离平均值时出了问题")
+                break
+            old_mean = point2plane[inliers].mean()
+            p, q = p.subset(inliers), q.subset(inliers)
+        else:
+            # 权重为零的点对（例如截尾核或Tukey核剔除的点对）不参与求解
+            weights = robust.weights(point2plane)
+            inliers = weights > 0
+            if (not np.any(inliers)):
+                print("错误：在计算距离平均值时出了问题")
+                break
+            old_mean = np.average(point2plane, weights=weights)
+        t3 = time.perf_counter()
+
+        # 解线性方程组得到Micp，并计算变换后的平均点到平面距离（两者在solve_increment中交替进行，分别计时）
+        Micp, new_mean, reevaluate = solve_increment(p, q, solver, robust, weights, old_mean)
+        t4 = time.perf_counter()
+        count += 1
+        ratio = new_mean / old_mean
+
+        if (metrics is not None):
+            times = {"sample": t1 - t0, "nn_search": t2 - t1, "cull": t3 - t2, "solve": t4 - t3 - reevaluate,
+                     "reevaluate": reevaluate}
+            metrics.record(times, len(inliers), point2plane[inliers], old_mean, new_mean, ratio < 1.0)
+
+        # 如果我们改进了就更新M1（否则，将终止）；每次更新后重新正交化，小角度近似的误差和舍入误差都不会累积
+        if (ratio < 1.0):
+            M1 = np.matrix(orthonormalize(M2*Micp*M2_inverse*M1))
+        else:
+            new_mean = old_mean
+
+        if (verbose):
+            print("完成了迭代 #{}，改进了 {:2.4%}".format(count, 1.0 - ratio))
+        controller.update(Micp, old_mean, new_mean)
+
+    if (verbose and controller.reason is not None):
+        print("终止：" + controller.reason)
+    return M1, new_mean, count
+
+# 由粗到精的多分辨率ICP：voxel_sizes为从粗到细的体素大小列表，每一层对两个点云进行体素下采样，
+# 使用该层自己的KdTree和异常值阈值收敛之后再进入下一层；最后在全分辨率上用kdtree（任意空间索引）细化
+# outlier_factor可以是一个数，也可以是每一层（包括最后的全分辨率层）各自的列表；controller在每一层重新开始
+# 返回(M1, 采样的平均距离, 总迭代次数)
+def icp_pyramid(source, target, kdtree, M1, M2, voxel_sizes, sample_size=None, outlier_factor=0.75,
+                max_iterations=None, tolerance=None, verbose=True, rng=None, metrics=None, controller=None,
+                robust=None, solver=None, overlap=None, sampling="uniform"):
+    voxel_sizes = sorted(voxel_sizes, reverse=True)
+    if (np.ndim(outlier_factor) == 0):
+        outlier_factor = [outlier_factor] * (len(voxel_sizes) + 1)
+    if (len(outlier_factor) != len(voxel_sizes) + 1):
+        print("错误：异常值阈值的个数与金字塔的层数不一致")
+        outlier_factor = [outlier_factor[-1]] * (len(voxel_sizes) + 1)
+
+    total = 0
+    for level, voxel_size in enumerate(voxel_sizes):
+        source_down = source.voxel_downsample(voxel_size)
+        target_down = target.voxel_downsample(voxel_size)
+        if (verbose):
+            print("金字塔层 {}：体素大小 {}，{} -> {} 个点".format(level, voxel_size, len(source_down), len(target_down)))
+        tree = ArrayKdTree(target_down.positions)
+        if (metrics is not None):
+            metrics.level = level
+        M1, mean, count = icp_align(source_down, target_down, tree, M1, M2, sample_size, outlier_factor[level],
+                                    max_iterations, tolerance, verbose, rng, metrics, controller, robust, solver,
+                                    overlap, sampling)
+        total += count
+
+    if (verbose and len(voxel_sizes) > 0):
+        print("金字塔层 {}：全分辨率".format(len(voxel_sizes)))
+    if (metrics is not None):
+        metrics.level = len(voxel_sizes)
+    M1, mean, count = icp_align(source, target, kdtree, M1, M2, sample_size, outlier_factor[-1],
+                                max_iterations, tolerance, verbose, rng, metrics, controller, robust, solver,
+                                overlap, sampling)
+    return M1, mean, total + count
+
+# ICP的选项
+class ICPOptions:
+    def __init__(self, sample_size=2000, outlier_factor=0.75, max_iterations=50, tolerance=0.0001,
+                 pyramid=(), seed=None, verbose=False, record_metrics=False, index="kdtree", max_distance=None,
+                 rotation_tolerance=None, translation_tolerance=None, plateau_window=None,
+                 plateau_tolerance=PLATEAU_TOLERANCE, min_sample_size=None, kernel=None, kernel_parameter=None,
+                 irls_iterations=3, solver="gauss_newton", objective="point_to_plane", damping=1e-4,
+                 overlap_margin=None, max_normal_angle=None, sampling="uniform"):
+        self.sample_size = sample_size  # 每次迭代采样的点数
+        self.outlier_factor = outlier_factor  # 剔除异常值的中位数倍数（金字塔模式下可以是每层的列表）
+        self.max_iterations = max_iterations  # 最大迭代次数（金字塔模式下为每层的最大迭代次数）
+        self.tolerance = tolerance  # 改进小于此比例时终止
+        self.pyramid = list(pyramid)  # 由粗到精的体素大小；为空时只在全分辨率上迭代
+        self.seed = seed  # 随机采样的种子；为None时每次配准使用不同的采样
+        self.verbose = verbose  # 是否打印每次迭代的信息
+        self.record_metrics = record_metrics  # 是否记录每次迭代的耗时和残差统计
+        self.index = index  # 全分辨率上对应点搜索的空间索引："kdtree"、"grid"或"hybrid"（见spatialindex.py）
+        self.max_distance = max_distance  # 网格索引的最大查找距离；为None时根据点间距估计
+        self.rotation_tolerance = rotation_tolerance  # 增量旋转角度（弧度）小于此值时终止；为None时不使用
+        self.translation_tolerance = translation_tolerance  # 增量平移长度小于此值时终止；为None时不使用
+        self.plateau_window = plateau_window  # 最近这么多次迭代的总改进小于plateau_tolerance时终止；为None时不使用
+        self.plateau_tolerance = plateau_tolerance
+        self.min_sample_size = min_sample_size  # 自适应采样的初始点数，逐步增大到sample_size；为None时固定采样点数
+        self.kernel = kernel  # 鲁棒核函数："trimmed"、"huber"、"tukey"或"geman_mcclure"（见robust.py）；为None时使用outlier_factor的硬阈值
+        self.kernel_parameter = kernel_parameter  # 核函数的参数（截尾核为保留的比例，其余为尺度的倍数）；为None时使用默认值
+        self.irls_iterations = irls_iterations  # 每次ICP迭代中重加权求解的次数
+        self.solver = solver  # 增量变换的求解方法："small_angle"、"gauss_newton"或"levenberg_marquardt"（见se3.py）
+        self.objective = objective  # 目标函数："point_to_plane"或"symmetric"
+        self.damping = damping  # levenberg_marquardt的初始阻尼
+        self.overlap_margin = overlap_margin  # 只从与目标包围盒（向外扩大这么多）重叠的区域内采样；为None时不筛选
+        self.max_normal_angle = max_normal_angle  # 对应点对法线之间的最大夹角（度）；为None时不检查
+        self.sampling = sampling  # 采样方法："uniform"、"normal_space"或"covariance"（见sampling.py）
+
+    # 返回按这些选项构造的收敛控制器
+    def controller(self):
+        return ConvergenceController(self.max_iterations, self.tolerance, self.rotation_tolerance,
+                                     self.translation_tolerance, self.plateau_window, self.plateau_tolerance,
+                                     self.sample_size, self.min_sample_size)
+
+    # 返回按这些选项构造的鲁棒核；没有选择核函数时返回None
+    def robust(self):
+        if (self.kernel is None):
+            return None
+        return RobustKernel(self.kernel, self.kernel_parameter, self.irls_iterations)
+
+    # 返回按这些选项构造的增量变换求解器
+    def increment_solver(self):
+        return IncrementSolver(self.solver, self.objective, self.damping)
+
+    # 返回按这些选项构造的重叠区域预筛选；两项都没有设置时返回None
+    def overlap(self, source, target):
+        if (self.overlap_margin is None and self.max_normal_angle is None):
+            return None
+        return OverlapFilter(source, target, self.overlap_margin, self.max_normal_angle)
+
+# ICP的结果：源点云的最终变换、采样的平均距离、迭代次数、耗时（秒）和指标（未记录时为None）
+class ICPResult:
+    def __init__(self, transform, mean_distance, iterations, time, metrics=None):
+        self.transform = transform
+        self.mean_distance = mean_distance
+        self.iterations = iterations
+        self.time = time
+        self.metrics = metrics
+
+# 返回点云：接受PointCloud，或(N,3)的位置数组和可选的法线数组
+def as_cloud(points, normals=None):
+    if (isinstance(points, PointCloud)):
+        return points
+    return PointCloud(points, normals)
+
+# ICP配准引擎：构造时准备好目标点云和它的KdTree（只构建一次），之后可以把任意多个源点云配准到它
+# 适合在长期运行的服务中常驻目标点云，不需要为每次配准启动新的进程
+class ICPRegistration:
+    # target为PreparedTarget、PointCloud或(N,3)的位置数组（此时需要给出target_normals）
+    def __init__(self, target, target_normals=None, options=None):
+        if (not isinstance(target, PreparedTarget)):
+            target = PreparedTarget(as_cloud(target, target_normals))
+        self.prepared = target
+        self.target = target.cloud
+        self.kdtree = target.kdtree
+        self.options = ICPOptions() if (options is None) else options
+        self.indexes = {("kdtree", None): self.kdtree}
+
+    # 返回选项对应的空间索引（每种索引只构建一次）
+    def index(self, options):
+        key = (options.index, None if (options.index == "kdtree") else options.max_distance)
+        if (key not in self.indexes):
+            self.indexes[key] = build_index(self.target.positions, options.index, options.max_distance,
+                                            kdtree=self.kdtree)
+        return self.indexes[key]
+
+    # 将源点云配准到目标点云：initial_transform为源的初始变换M1，
+    # target_transform为目标的变换M2（为None时使用准备好的目标中保存的变换）
+    # options为None时使用构造时的选项；返回ICPResult
+    def register(self, source, initial_transform=None, target_transform=None, options=None, label=""):
+        source = as_cloud(source)
+        options = self.options if (options is None) else options
+        M1 = np.identity(4) if (initial_transform is None) else initial_transform
+        M2 = self.prepared.transform if (target_transform is None) else target_transform
+        rng = np.random.default_rng(options.seed)
+        metrics = ICPMetrics(label) if (options.record_metrics) else None
+
+        start = time.perf_counter()
+        M1, mean, count = icp_pyramid(source, self.target, self.index(options), M1, M2, options.pyramid,
+                                      options.sample_size, options.outlier_factor, options.max_iterations,
+                                      options.tolerance, options.verbose, rng, metrics, options.controller(),
+                                      options.robust(), options.increment_solver(),
+                                      options.overlap(source, self.target), options.sampling)
+        return ICPResult(M1, mean, count, time.perf_counter() - start, metrics)
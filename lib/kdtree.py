@@ -1,9 +1,11 @@
 # 项目：点云配准
 #
 # 文件：kdtree.py
-# 简介：实现了一个点的k-d树
+# 简介：实现了一个点的k-d树，以及基于数组批量构建、支持批量查询的k-d树
 
 from math import *
+import heapq
+import numpy as np
 from .box import Box
 from .point import Point
 
@@ -130,4 +132,361 @@ class KdTree:
 
             go_left = not go_left
 
-        return candidate, dist
\ No newline at end of file
+        return candidate, dist
+
+    # 返回k-d树中距离点p最近的k个点（按距离从近到远排列）；点数少于k时返回全部点
+    def knn(self, p, k):
+        if (type(p) != Point):
+            print("错误：k近邻方法未提供有效点")
+            return []
+        if (p.d != self.k):
+            print("错误：点和KdTree必须具有相同的维度")
+            return []
+        if (k < 1 or self.size == 0):
+            return []
+
+        # 用最大堆保存到目前为止最近的k个点，堆顶是其中最远的一个，它的距离作为剪枝的界限
+        heap = []
+        self.find_knn(self.root, p, 0, k, heap)
+        return [q for negDist, i, q in sorted(heap, reverse=True)]
+
+    # 查找k近邻的内部方法；heap中的元素为(-平方距离, 节点id, 点)，距离相同时比较节点id而不是点
+    def find_knn(self, node, p, dim, k, heap):
+        # 基本情况
+        if (node == None):
+            return
+
+        # 与find_nearest相同的剪枝规则，只是界限换成了第k近的距离
+        if (len(heap) == k and -heap[0][0] < node.bounds.distSqdTo(p)):
+            return
+
+        newDist = p.distSqdTo(node.p)
+        if (len(heap) < k):
+            heapq.heappush(heap, (-newDist, id(node), node.p))
+        elif (newDist < -heap[0][0]):
+            heapq.heapreplace(heap, (-newDist, id(node), node.p))
+
+        # 先走查询点所在的一侧
+        if (p.s[dim] < node.key):
+            first, second = node.left, node.right
+        else:
+            first, second = node.right, node.left
+        self.find_knn(first, p, (dim + 1) % self.k, k, heap)
+        self.find_knn(second, p, (dim + 1) % self.k, k, heap)
+
+    # 返回k-d树中与点p的距离不超过r的所有点（按距离从近到远排列）
+    def radius(self, p, r):
+        if (type(p) != Point):
+            print("错误：半径查询方法未提供有效点")
+            return []
+        if (p.d != self.k):
+            print("错误：点和KdTree必须具有相同的维度")
+            return []
+
+        found = []
+        self.find_radius(self.root, p, 0, r * r, found)
+        found.sort(key=lambda item: item[0])
+        return [q for dist, q in found]
+
+    # 半径查询的内部方法：盒子与查询点的距离超过r的子树不需要探索
+    def find_radius(self, node, p, dim, rSqd, found):
+        if (node == None or node.bounds.distSqdTo(p) > rSqd):
+            return
+
+        dist = p.distSqdTo(node.p)
+        if (dist <= rSqd):
+            found.append((dist, node.p))
+        self.find_radius(node.left, p, (dim + 1) % self.k, rSqd, found)
+        self.find_radius(node.right, p, (dim + 1) % self.k, rSqd, found)
+
+# 基于数组的k-d树：一次性从(N,k)的np数组批量构建平衡的中位数划分树
+# 节点按隐式完全二叉树编号（节点i的子节点为2i+1和2i+2），所有叶子位于同一层，
+# 每个叶子保存不超过leaf_size个点的下标；每个节点保存紧致的包围盒用于剪枝
+class ArrayKdTree:
+    # 构造函数接受(N,k)的点数组和叶子容量leaf_size
+    def __init__(self, points, leaf_size=16):
+        points = np.asarray(points, dtype=np.float64)
+        if (points.ndim != 2 or points.shape[0] == 0):
+            print("错误：ArrayKdTree需要一个非空的(N,k)数组")
+            points = np.zeros((1, 3))
+        if (leaf_size < 1):
+            print("错误：叶子容量必须是正数")
+            leaf_size = 16
+
+        self.points = points
+        self.size, self.k = points.shape
+
+        # 树的深度：使每个叶子不超过leaf_size个点
+        depth = 0
+        while ((self.size >> depth) > leaf_size):
+            depth += 1
+        self.depth = depth
+        self.n_leaves = 1 << depth
+        self.n_nodes = 2 * self.n_leaves - 1
+
+        # 逐层进行中位数划分，每个节点在perm中占据连续的一段[start, end)
+        self.perm = np.arange(self.size)
+        self.split_dim = np.zeros(self.n_leaves - 1, dtype=np.intp)
+        self.split_val = np.zeros(self.n_leaves - 1)
+        bounds = [0, self.size]
+        for level in range(depth):
+            first = (1 << level) - 1
+            next_bounds = [0]
+            for j in range(1 << level):
+                start, end = bounds[j], bounds[j + 1]
+                mid = (start + end) // 2
+                node = first + j
+                if (end - start > 1):
+                    idx = self.perm[start:end]
+                    seg = points[idx]
+                    # 选择跨度最大的维度进行划分
+                    dim = int(np.argmax(seg.max(axis=0) - seg.min(axis=0)))
+                    order = np.argpartition(seg[:, dim], mid - start)
+                    self.perm[start:end] = idx[order]
+                    self.split_dim[node] = dim
+                    self.split_val[node] = points[self.perm[mid], dim]
+                else:
+                    # 空的或只有一个点的段：所有查询都走右边
+                    self.split_val[node] = -inf
+                next_bounds.append(mid)
+                next_bounds.append(end)
+            bounds = next_bounds
+        self.leaf_start = np.array(bounds, dtype=np.intp)
+
+        # 将每个叶子的点填充到固定宽度，空位用-1下标和无穷远坐标
+        counts = np.diff(self.leaf_start)
+        self.leaf_width = max(1, int(counts.max()))
+        slots = np.arange(self.leaf_width)
+        valid = slots[None, :] < counts[:, None]
+        self.leaf_index = np.full((self.n_leaves, self.leaf_width), -1, dtype=np.intp)
+        self.leaf_index[valid] = self.perm
+        self.leaf_points = np.full((self.n_leaves, self.leaf_width, self.k), inf)
+        self.leaf_points[valid] = points[self.perm]
+
+        # 自底向上计算每个节点的包围盒（空叶子的包围盒为空集）
+        self.box_min = np.full((self.n_nodes, self.k), inf)
+        self.box_max = np.full((self.n_nodes, self.k), -inf)
+        leaf_first = self.n_leaves - 1
+        padded_min = np.where(valid[:, :, None], self.leaf_points, inf)
+        padded_max = np.where(valid[:, :, None], self.leaf_points, -inf)
+        self.box_min[leaf_first:] = padded_min.min(axis=1)
+        self.box_max[leaf_first:] = padded_max.max(axis=1)
+        for level in range(depth - 1, -1, -1):
+            nodes = np.arange((1 << level) - 1, (1 << (level + 1)) - 1)
+            self.box_min[nodes] = np.minimum(self.box_min[2 * nodes + 1], self.box_min[2 * nodes + 2])
+            self.box_max[nodes] = np.maximum(self.box_max[2 * nodes + 1], self.box_max[2 * nodes + 2])
+
+    # 树的数组状态，用于保存到磁盘；from_arrays可以直接由它恢复而不需要重新构建
+    ARRAYS = ["points", "perm", "split_dim", "split_val", "leaf_start", "leaf_index", "leaf_points",
+              "box_min", "box_max"]
+
+    def to_arrays(self):
+        return dict((name, getattr(self, name)) for name in ArrayKdTree.ARRAYS)
+
+    @staticmethod
+    def from_arrays(arrays):
+        tree = ArrayKdTree.__new__(ArrayKdTree)
+        for name in ArrayKdTree.ARRAYS:
+            setattr(tree, name, np.asarray(arrays[name]))
+        tree.size, tree.k = tree.points.shape
+        tree.n_leaves = len(tree.leaf_start) - 1
+        tree.n_nodes = 2 * tree.n_leaves - 1
+        tree.depth = tree.n_leaves.bit_length() - 1
+        tree.leaf_width = tree.leaf_index.shape[1]
+        return tree
+
+    # 返回查询点所在的叶子编号（沿划分平面向下走）
+    def descend(self, queries):
+        node = np.zeros(len(queries), dtype=np.intp)
+        rows = np.arange(len(queries))
+        for level in range(self.depth):
+            go_right = queries[rows, self.split_dim[node]] >= self.split_val[node]
+            node = 2 * node + 1 + go_right
+        return node - (self.n_leaves - 1)
+
+    # 返回查询点与节点包围盒之间的平方距离
+    def box_dist_sqd(self, queries, nodes):
+        below = self.box_min[nodes] - queries
+        above = queries - self.box_max[nodes]
+        dv = np.maximum(np.maximum(below, above), 0.0)
+        return (dv * dv).sum(axis=1)
+
+    # 在一批(查询, 叶子)对中做暴力搜索，返回每一对的最近点下标和平方距离
+    def scan_leaves(self, queries, leaves):
+        diff = self.leaf_points[leaves] - queries[:, None, :]
+        dist = (diff * diff).sum(axis=2)
+        slot = dist.argmin(axis=1)
+        rows = np.arange(len(leaves))
+        return self.leaf_index[leaves, slot], dist[rows, slot]
+
+    # 将一批(查询, 叶子)对中的所有点展开为候选：返回(查询编号, 点下标, 平方距离)，不包括填充的空位
+    def leaf_candidates(self, queries, q, leaves):
+        diff = self.leaf_points[leaves] - queries[q][:, None, :]
+        dist = (diff * diff).sum(axis=2)
+        index = self.leaf_index[leaves]
+        valid = index >= 0
+        return np.broadcast_to(q[:, None], index.shape)[valid], index[valid], dist[valid]
+
+    # 对每个查询保留距离最近的k个候选；返回(m,k)的下标和平方距离，不足k个时用-1和inf填充
+    def select_k(self, q, index, dist, m, k):
+        order = np.lexsort((dist, q))
+        q, index, dist = q[order], index[order], dist[order]
+        starts = np.searchsorted(q, np.arange(m))
+        rank = np.arange(len(q)) - starts[q]
+        keep = rank < k
+        result_index = np.full((m, k), -1, dtype=np.intp)
+        result_dist = np.full((m, k), inf)
+        result_index[q[keep], rank[keep]] = index[keep]
+        result_dist[q[keep], rank[keep]] = dist[keep]
+        return result_index, result_dist
+
+    # 批量k近邻查询：接受(M,k)的查询数组，返回(M,n)的下标和平方距离，每行按距离从近到远排列
+    # 点数少于n时，多余的位置为-1和inf
+    def knn_batch(self, queries, n, chunk_size=8192):
+        queries = np.asarray(queries, dtype=np.float64)
+        if (queries.ndim != 2 or queries.shape[1] != self.k):
+            print("错误：查询数组和ArrayKdTree必须具有相同的维度")
+            return None, None
+        if (n < 1):
+            print("错误：近邻个数必须是正数")
+            return None, None
+
+        index = np.empty((len(queries), n), dtype=np.intp)
+        dist = np.empty((len(queries), n))
+        for start in range(0, len(queries), chunk_size):
+            end = min(start + chunk_size, len(queries))
+            index[start:end], dist[start:end] = self.knn_chunk(queries[start:end], n)
+        return index, dist
+
+    # 批量k近邻查询的内部方法
+    def knn_chunk(self, queries, n):
+        m = len(queries)
+
+        # 第一步：选择查询点所在的子树作为初始候选，这一层的每个子树至少包含n个点（点数足够时）
+        # 这样第n近的候选距离从一开始就是有限的，可以用于剪枝
+        level = self.depth
+        while (level > 0 and (self.size >> level) < n):
+            level -= 1
+        span = 1 << (self.depth - level)
+        home = self.descend(queries) // span
+        q = np.repeat(np.arange(m), span)
+        leaves = (home[:, None] * span + np.arange(span)).ravel()
+        home_q, home_index, home_dist = self.leaf_candidates(queries, q, leaves)
+        best_index, best_dist = self.select_k(home_q, home_index, home_dist, m, n)
+        bound = best_dist[:, -1]
+
+        # 第二步：逐层扩展(查询, 节点)对，包围盒比第n近的候选更远的节点不需要探索
+        q = np.arange(m)
+        nodes = np.zeros(m, dtype=np.intp)
+        for i in range(self.depth):
+            keep = self.box_dist_sqd(queries[q], nodes) < bound[q]
+            q = np.repeat(q[keep], 2)
+            nodes = np.repeat(2 * nodes[keep] + 1, 2)
+            nodes[1::2] += 1
+
+        # 在初始子树之外的剩余叶子中搜索，与初始候选合并后重新选择最近的n个
+        leaves = nodes - (self.n_leaves - 1)
+        keep = (leaves // span != home[q])
+        q, nodes, leaves = q[keep], nodes[keep], leaves[keep]
+        keep = self.box_dist_sqd(queries[q], nodes) < bound[q]
+        q, leaves = q[keep], leaves[keep]
+        if (len(q) == 0):
+            return best_index, best_dist
+        cand_q, cand_index, cand_dist = self.leaf_candidates(queries, q, leaves)
+        keep = cand_dist < bound[cand_q]
+        return self.select_k(np.concatenate((home_q, cand_q[keep])), np.concatenate((home_index, cand_index[keep])),
+                             np.concatenate((home_dist, cand_dist[keep])), m, n)
+
+    # 批量半径查询：接受(M,k)的查询数组和半径r，返回(下标, 平方距离, 偏移)，
+    # 第i个查询的近邻为下标[偏移[i]:偏移[i+1]]，按距离从近到远排列
+    def radius_batch(self, queries, r, chunk_size=8192):
+        queries = np.asarray(queries, dtype=np.float64)
+        if (queries.ndim != 2 or queries.shape[1] != self.k):
+            print("错误：查询数组和ArrayKdTree必须具有相同的维度")
+            return None, None, None
+
+        index = []
+        dist = []
+        counts = np.zeros(len(queries), dtype=np.intp)
+        for start in range(0, len(queries), chunk_size):
+            end = min(start + chunk_size, len(queries))
+            q, chunk_index, chunk_dist = self.radius_chunk(queries[start:end], r * r)
+            counts[start:end] = np.bincount(q, minlength=end - start)
+            index.append(chunk_index)
+            dist.append(chunk_dist)
+
+        offsets = np.zeros(len(queries) + 1, dtype=np.intp)
+        np.cumsum(counts, out=offsets[1:])
+        index = np.concatenate(index) if (len(index) > 0) else np.zeros(0, dtype=np.intp)
+        dist = np.concatenate(dist) if (len(dist) > 0) else np.zeros(0)
+        return index, dist, offsets
+
+    # 批量半径查询的内部方法：包围盒与查询点的距离超过r的节点不需要探索
+    def radius_chunk(self, queries, r_sqd):
+        q = np.arange(len(queries))
+        nodes = np.zeros(len(queries), dtype=np.intp)
+        for level in range(self.depth + 1):
+            keep = self.box_dist_sqd(queries[q], nodes) <= r_sqd
+            q, nodes = q[keep], nodes[keep]
+            if (level == self.depth):
+                break
+            q = np.repeat(q, 2)
+            nodes = np.repeat(2 * nodes + 1, 2)
+            nodes[1::2] += 1
+
+        q, index, dist = self.leaf_candidates(queries, q, nodes - (self.n_leaves - 1))
+        keep = dist <= r_sqd
+        q, index, dist = q[keep], index[keep], dist[keep]
+        order = np.lexsort((dist, q))
+        return q[order], index[order], dist[order]
+
+    # 批量最近邻查询：接受(M,k)的查询数组，返回最近点下标(M,)和平方距离(M,)
+    def nearest_batch(self, queries, chunk_size=65536):
+        queries = np.asarray(queries, dtype=np.float64)
+        if (queries.ndim != 2 or queries.shape[1] != self.k):
+            print("错误：查询数组和ArrayKdTree必须具有相同的维度")
+            return None, None
+
+        index = np.empty(len(queries), dtype=np.intp)
+        dist = np.empty(len(queries))
+        # 分块处理以限制中间数组的内存
+        for start in range(0, len(queries), chunk_size):
+            end = min(start + chunk_size, len(queries))
+            index[start:end], dist[start:end] = self.nearest_chunk(queries[start:end])
+        return index, dist
+
+    # 批量最近邻查询的内部方法
+    def nearest_chunk(self, queries):
+        # 第一步：沿划分平面走到所在叶子，在叶子内暴力搜索得到初始候选
+        home = self.descend(queries)
+        best_index, best_dist = self.scan_leaves(queries, home)
+
+        # 第二步：从根开始逐层扩展(查询, 节点)对；
+        # 如果候选点比节点包围盒更近，就没有必要探索该节点（与find_nearest相同的剪枝规则）
+        q = np.arange(len(queries))
+        nodes = np.zeros(len(queries), dtype=np.intp)
+        for level in range(self.depth):
+            keep = self.box_dist_sqd(queries[q], nodes) < best_dist[q]
+            q = np.repeat(q[keep], 2)
+            nodes = np.repeat(2 * nodes[keep] + 1, 2)
+            nodes[1::2] += 1
+
+        # 在剩余的叶子中搜索（所在叶子已经搜索过）
+        leaves = nodes - (self.n_leaves - 1)
+        keep = (leaves != home[q])
+        q, leaves = q[keep], leaves[keep]
+        keep = self.box_dist_sqd(queries[q], nodes[keep]) < best_dist[q]
+        q, leaves = q[keep], leaves[keep]
+        if (len(q) > 0):
+            cand_index, cand_dist = self.scan_leaves(queries[q], leaves)
+            # 对每个查询保留最近的候选
+            order = np.lexsort((cand_dist, q))
+            q, cand_index, cand_dist = q[order], cand_index[order], cand_dist[order]
+            first = np.ones(len(q), dtype=bool)
+            first[1:] = q[1:] != q[:-1]
+            q, cand_index, cand_dist = q[first], cand_index[first], cand_dist[first]
+            better = cand_dist < best_dist[q]
+            best_index[q[better]] = cand_index[better]
+            best_dist[q[better]] = cand_dist[better]
+
+        return best_index, best_dist
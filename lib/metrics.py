@@ -0,0 +1,95 @@
+# 项目：点云配准
+#
+# 文件：metrics.py
+# 简介：记录ICP每次迭代的各阶段耗时、内点数和残差统计，并以JSON Lines或CSV格式输出
+
+import os
+import csv
+import json
+import numpy as np
+
+# ICP迭代中计时的各个阶段
+PHASES = ["sample", "nn_search", "cull", "solve", "reevaluate"]
+
+# 一次配准的指标记录器；label用于在同一个文件中区分不同的扫描对
+class ICPMetrics:
+    def __init__(self, label=""):
+        self.label = label
+        self.level = 0
+        self.iterations = []
+
+    # 记录一次迭代：times为各阶段耗时（秒）的字典，residuals为内点的点到平面距离
+    def record(self, times, sample_count, residuals, old_mean, new_mean, accepted):
+        record = {"label": self.label, "level": self.level, "iteration": len(self.iterations) + 1}
+        for phase in PHASES:
+            record[phase] = times.get(phase, 0.0)
+        record["time"] = sum(record[phase] for phase in PHASES)
+        record["samples"] = int(sample_count)
+        record["inliers"] = int(len(residuals))
+        if (len(residuals) > 0):
+            record["residual_mean"] = float(np.mean(residuals))
+            record["residual_median"] = float(np.median(residuals))
+            record["residual_rms"] = float(np.sqrt(np.mean(np.square(residuals))))
+            record["residual_max"] = float(np.max(residuals))
+        else:
+            record["residual_mean"] = record["residual_median"] = record["residual_rms"] = record["residual_max"] = 0.0
+        record["old_mean"] = float(old_mean)
+        record["new_mean"] = float(new_mean)
+        record["improvement"] = float(1.0 - new_mean / old_mean) if (old_mean > 0) else 0.0
+        record["accepted"] = bool(accepted)
+        self.iterations.append(record)
+
+    # 返回汇总：总耗时、各阶段总耗时、迭代次数、首末平均距离和收敛速度
+    # 收敛速度为每次迭代平均距离的几何平均缩小比例（越小收敛越快）
+    def summary(self):
+        result = {"label": self.label, "iterations": len(self.iterations)}
+        for phase in PHASES:
+            result[phase] = sum(r[phase] for r in self.iterations)
+        result["total_time"] = sum(r["time"] for r in self.iterations)
+        if (len(self.iterations) > 0):
+            first = self.iterations[0]["old_mean"]
+            last = self.iterations[-1]["new_mean"] if (self.iterations[-1]["accepted"]) else self.iterations[-1]["old_mean"]
+            result["first_mean"] = first
+            result["final_mean"] = last
+            result["convergence_rate"] = (last / first) ** (1.0 / len(self.iterations)) if (first > 0) else 0.0
+            result["accepted"] = sum(1 for r in self.iterations if r["accepted"])
+        return result
+
+    # 返回可打印的汇总文本
+    def format_summary(self):
+        s = self.summary()
+        if (s["iterations"] == 0):
+            return "{}：没有迭代".format(self.label)
+        phases = "，".join("{} {:.3f}s".format(phase, s[phase]) for phase in PHASES)
+        return "{}：{} 次迭代（接受 {} 次），总耗时 {:.3f}s（{}），平均距离 {:.3e} -> {:.3e}，收敛速度 {:.4f}".format(
+            self.label, s["iterations"], s["accepted"], s["total_time"], phases, s["first_mean"], s["final_mean"],
+            s["convergence_rate"])
+
+# 将一组指标写入文件：扩展名为.csv时写入每次迭代的记录（汇总另存为同名的.summary.csv），
+# 否则写入JSON Lines（每次迭代一行，每次配准最后一行为汇总）
+def write_metrics(file_name, metrics_list):
+    dir = os.path.dirname(file_name)
+    if (dir and not os.path.exists(dir)):
+        os.makedirs(dir)
+
+    if (file_name.lower().endswith('.csv')):
+        rows = [r for m in metrics_list for r in m.iterations]
+        summaries = [m.summary() for m in metrics_list]
+        for name, data in ((file_name, rows), (file_name[:-4] + '.summary.csv', summaries)):
+            if (len(data) == 0):
+                continue
+            fields = list(data[0].keys())
+            for r in data:
+                fields += [k for k in r.keys() if k not in fields]
+            with open(name, "w", newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(data)
+        return
+
+    with open(file_name, "w") as f:
+        for m in metrics_list:
+            for r in m.iterations:
+                f.write(json.dumps(dict(type="iteration", **r)) + '\n')
+            f.write(json.dumps(dict(type="summary", **m.summary())) + '\n')
+    return
@@ -0,0 +1,131 @@
+# 项目：点云配准
+#
+# 文件：model.py
+# 简介：增量配准的合并模型：保存所有已对齐扫描在世界坐标系中的点，新的扫描配准到整个模型，
+#       然后只把新扫描中的点插入索引，不需要每次都重新配准整个扫描集合
+#       索引由若干个ArrayKdTree组成，每个KdTree覆盖模型中连续的一段点，点数从前往后递减；
+#       插入时新的一段与末尾点数不超过它的段合并后重新构建（对数方法），
+#       每个点平均只被重新构建O(log N)次，查询时在每个KdTree中查找后取最近的结果
+
+import os
+import numpy as np
+from .pointcloud import PointCloud
+from .kdtree import ArrayKdTree
+from .target import PreparedTarget
+from .icp import ICPRegistration
+
+class AlignedModel:
+    # merge_distance给定时，新扫描中与模型已有点的距离小于此值的点（重叠区域）不插入模型
+    def __init__(self, merge_distance=None):
+        self.merge_distance = merge_distance
+        self.cloud = PointCloud(np.zeros((0, 3)))
+        self.blocks = []  # 每一段的(起点, KdTree)
+        self.names = []  # 已对齐扫描的名称（按插入顺序）
+        self.transforms = {}  # 扫描名到它在世界坐标系中的位姿
+        self.ranges = {}  # 扫描名到它在模型中的点的范围(起点, 终点)
+
+    def __len__(self):
+        return len(self.cloud)
+
+    def __contains__(self, name):
+        return name in self.transforms
+
+    # 批量最近邻查询（与ArrayKdTree.nearest_batch相同的接口），返回模型中的最近点下标和平方距离
+    def nearest_batch(self, queries):
+        queries = np.asarray(queries, dtype=np.float64)
+        index = np.full(len(queries), -1, dtype=np.intp)
+        dist = np.full(len(queries), np.inf)
+        for start, tree in self.blocks:
+            block_index, block_dist = tree.nearest_batch(queries)
+            if (block_index is None):
+                return None, None
+            closer = block_dist < dist
+            index[closer] = block_index[closer] + start
+            dist[closer] = block_dist[closer]
+        return index, dist
+
+    # 将点（世界坐标系）插入索引：与末尾点数不超过新段的段合并后重新构建KdTree
+    def insert(self, positions, normals):
+        start = len(self.cloud)
+        self.cloud = PointCloud(np.concatenate((self.cloud.positions, positions)),
+                                np.concatenate((self.cloud.normals, normals)))
+        end = len(self.cloud)
+        while (len(self.blocks) > 0 and self.blocks[-1][1].size <= end - start):
+            start = self.blocks.pop()[0]
+        self.blocks.append((start, ArrayKdTree(self.cloud.positions[start:end])))
+        return
+
+    # 添加一个已对齐的扫描：cloud为扫描自己坐标系中的点云，transform为它在世界坐标系中的位姿
+    # 返回插入模型的点数
+    def add_scan(self, name, cloud, transform):
+        transform = np.matrix(transform, dtype=np.float64)
+        world = cloud.copy().transform(transform)
+        if (self.merge_distance is not None and len(self.cloud) > 0):
+            index, dist = self.nearest_batch(world.positions)
+            world = world.subset(dist >= self.merge_distance * self.merge_distance)
+
+        start = len(self.cloud)
+        if (len(world) > 0):
+            self.insert(world.positions, world.normals)
+        if (name not in self.transforms):
+            self.names.append(name)
+        self.transforms[name] = transform
+        self.ranges[name] = (start, len(self.cloud))
+        return len(world)
+
+    # 将新扫描配准到整个模型并插入模型；模型为空时新扫描作为基准，直接使用initial_transform
+    # 返回ICPResult（模型为空时为None）
+    def register(self, name, cloud, initial_transform=None, options=None):
+        M1 = np.identity(4) if (initial_transform is None) else initial_transform
+        result = None
+        if (len(self.cloud) > 0):
+            engine = ICPRegistration(PreparedTarget(self.cloud, kdtree=self, name="model"), options=options)
+            result = engine.register(cloud, M1, label="{} -> model".format(name))
+            M1 = result.transform
+        self.add_scan(name, cloud, M1)
+        return result
+
+    # 保存到磁盘（.npz）：模型的点和法线、每个扫描的位姿和点的范围，以及每一段KdTree的数组（点除外）
+    def save(self, file_name):
+        dir = os.path.dirname(file_name)
+        if (dir and not os.path.exists(dir)):
+            os.makedirs(dir)
+
+        arrays = {}
+        arrays["positions"] = self.cloud.positions
+        arrays["normals"] = self.cloud.normals
+        arrays["names"] = np.array(self.names, dtype=str)
+        arrays["transforms"] = np.array([np.asarray(self.transforms[n]) for n in self.names]).reshape(-1, 4, 4)
+        arrays["ranges"] = np.array([self.ranges[n] for n in self.names], dtype=np.int64).reshape(-1, 2)
+        arrays["block_start"] = np.array([start for start, tree in self.blocks], dtype=np.int64)
+        arrays["merge_distance"] = np.array(np.nan if (self.merge_distance is None) else self.merge_distance)
+        for i, (start, tree) in enumerate(self.blocks):
+            for k, v in tree.to_arrays().items():
+                if (k != "points"):
+                    arrays["block{}_{}".format(i, k)] = v
+
+        # 先写临时文件再原子地替换，扫描不断加入时读者不会看到写了一半的模型
+        tmp_name = "{}.{}.tmp".format(file_name, os.getpid())
+        with open(tmp_name, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_name, file_name)
+        return
+
+    # 从磁盘加载；KdTree直接由保存的数组恢复，不需要重新构建
+    @staticmethod
+    def load(file_name):
+        with np.load(file_name) as data:
+            merge_distance = float(data["merge_distance"])
+            model = AlignedModel(None if (np.isnan(merge_distance)) else merge_distance)
+            model.cloud = PointCloud(data["positions"], data["normals"])
+            for name, M, r in zip(data["names"], data["transforms"], data["ranges"]):
+                model.names.append(str(name))
+                model.transforms[str(name)] = np.matrix(M)
+                model.ranges[str(name)] = (int(r[0]), int(r[1]))
+            starts = list(data["block_start"]) + [len(model.cloud)]
+            for i in range(len(starts) - 1):
+                prefix = "block{}_".format(i)
+                arrays = dict((k[len(prefix):], data[k]) for k in data.files if k.startswith(prefix))
+                arrays["points"] = model.cloud.positions[starts[i]:starts[i + 1]]
+                model.blocks.append((int(starts[i]), ArrayKdTree.from_arrays(arrays)))
+        return model
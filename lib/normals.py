@@ -0,0 +1,47 @@
+# 项目：点云配准
+#
+# 文件：normals.py
+# 简介：批量估计点云法线：对每个点的k近邻（可选地限制在半径内）计算协方差矩阵，
+#       取最小特征值对应的特征向量作为法线
+
+import numpy as np
+from .kdtree import ArrayKdTree
+
+# 估计(N,3)位置数组的法线，返回(N,3)的单位法线
+# k为近邻个数，radius给定时只使用距离不超过radius的近邻（与Open3D的KDTreeSearchParamHybrid相同）
+# kdtree为已经在positions上构建的ArrayKdTree（可选，避免重复构建）；viewpoint给定时法线朝向该点
+def estimate_normals(positions, k=30, radius=None, kdtree=None, viewpoint=None, chunk_size=8192):
+    positions = np.asarray(positions, dtype=np.float64)
+    if (kdtree is None):
+        kdtree = ArrayKdTree(positions)
+
+    normals = np.empty_like(positions)
+    for start in range(0, len(positions), chunk_size):
+        end = min(start + chunk_size, len(positions))
+        index, dist = kdtree.knn_batch(positions[start:end], k, chunk_size)
+        normals[start:end] = normals_from_neighbors(positions, index, dist, radius)
+
+    if (viewpoint is not None):
+        flip = ((np.asarray(viewpoint, dtype=np.float64) - positions) * normals).sum(axis=1) < 0
+        normals[flip] *= -1.0
+    return normals
+
+# 由近邻下标(M,k)和平方距离(M,k)计算M个法线；有效近邻少于3个的点法线为(0,0,1)
+def normals_from_neighbors(positions, index, dist, radius=None):
+    valid = index >= 0
+    if (radius is not None):
+        valid &= dist <= radius * radius
+    weight = valid.astype(np.float64)
+    count = weight.sum(axis=1)
+
+    # 协方差矩阵：sum(w*(x-mean)(x-mean)^T)/n
+    neighbors = positions[np.where(valid, index, 0)]
+    mean = np.einsum('ij,ijk->ik', weight, neighbors) / np.maximum(count, 1.0)[:, None]
+    centered = (neighbors - mean[:, None, :]) * weight[:, :, None]
+    cov = np.einsum('ijk,ijl->ikl', centered, centered) / np.maximum(count, 1.0)[:, None, None]
+
+    # eigh的特征值按升序排列，第一列为最小特征值对应的特征向量
+    values, vectors = np.linalg.eigh(cov)
+    normals = vectors[:, :, 0]
+    normals[count < 3] = [0.0, 0.0, 1.0]
+    return normals
@@ -0,0 +1,49 @@
+# 项目：点云配准
+#
+# 文件：overlap.py
+# 简介：ICP的重叠区域预筛选：只从源点云与目标点云包围盒的重叠区域内采样，
+#       落在目标点云范围之外的源点不再进行最近邻查找；找到对应点后再剔除法线方向不兼容的点对，
+#       在进入线性方程组之前减少异常值，部分重叠的扫描可以使用更少的采样点和迭代次数
+#       重叠区域用轴对齐的包围盒（box.py）表示，变换回源坐标系后直接在源点云原来的坐标上比较，不需要变换所有点
+
+import numpy as np
+from itertools import product
+from .box import Box
+from .point import Point
+
+# 返回(N,3)位置数组的轴对齐包围盒
+def bounding_box(positions):
+    positions = np.asarray(positions, dtype=np.float64)
+    return Box(Point(positions.min(axis=0).tolist()), Point(positions.max(axis=0).tolist()))
+
+# 返回盒子经过4x4变换M之后的轴对齐包围盒（变换8个角点，结果包含变换后的整个盒子）
+def transform_box(box, M):
+    M = np.asarray(M, dtype=np.float64)
+    corners = np.array(list(product(*zip(box.sMin, box.sMax))), dtype=np.float64)
+    corners = corners @ M[:3, :3].T + M[:3, 3]
+    return Box(Point(corners.min(axis=0).tolist()), Point(corners.max(axis=0).tolist()))
+
+# 重叠区域预筛选：margin为目标包围盒向外扩大的距离（初始位置的误差较大时应相应增大），为None时不筛选采样点；
+# max_normal_angle为对应点对法线之间的最大夹角（度），为None时不检查法线；
+# 法线可能没有统一朝向，因此只比较夹角的绝对值
+class OverlapFilter:
+    def __init__(self, source, target, margin=0.0, max_normal_angle=None):
+        self.source_box = bounding_box(source.positions)
+        self.target_box = None if (margin is None) else bounding_box(target.positions).expand(margin)
+        self.min_cosine = None if (max_normal_angle is None) else np.cos(np.radians(max_normal_angle))
+
+    # 返回源点云(N,3)位置数组中位于重叠区域内的点的掩码；M为源坐标系到目标坐标系的变换
+    # 两个包围盒不相交时返回全False的掩码；不筛选采样点时返回None
+    def mask(self, positions, M):
+        if (self.target_box is None):
+            return None
+        overlap = transform_box(self.source_box, M).intersection(self.target_box)
+        if (overlap is None):
+            return np.zeros(len(positions), dtype=bool)
+        return transform_box(overlap, np.linalg.inv(M)).contains_batch(positions)
+
+    # 返回法线方向兼容的点对的掩码；没有设置最大夹角时全部兼容
+    def compatible(self, pn, qn):
+        if (self.min_cosine is None):
+            return np.ones(len(pn), dtype=bool)
+        return np.abs(np.einsum('ij,ij->i', pn, qn)) >= self.min_cosine
@@ -0,0 +1,140 @@
+# 项目：点云配准
+#
+# 文件：ply.py
+# 简介：不依赖Open3D直接读取PLY文件（ascii、binary_little_endian和binary_big_endian）的顶点数据，
+#       得到位置和法线的np数组；文件中没有法线时用normals.py估计
+
+import numpy as np
+from .pointcloud import PointCloud
+from .normals import estimate_normals
+
+# PLY属性类型对应的np类型（不含字节序）
+PLY_TYPES = {"char": "i1", "uchar": "u1", "short": "i2", "ushort": "u2", "int": "i4", "uint": "u4",
+             "float": "f4", "double": "f8", "int8": "i1", "uint8": "u1", "int16": "i2", "uint16": "u2",
+             "int32": "i4", "uint32": "u4", "float32": "f4", "float64": "f8"}
+
+# 文件中没有法线时估计法线的参数（k个近邻，半径），与原来PLY_PTS.py中Open3D的参数相同；
+# 直接读取.ply和先转换成.pts都使用这组参数，同一个扫描得到相同的法线
+NORMAL_NEIGHBORS = 30
+NORMAL_RADIUS = 0.1
+
+# 解析PLY文件头；返回(格式, 元素列表, 数据开始的字节偏移)
+# 元素为(名称, 数量, 属性列表)，属性为(名称, 类型)或(名称, (列表长度类型, 元素类型))
+def read_header(f):
+    line = f.readline()
+    if (line.strip() != b"ply"):
+        print("错误：不是PLY文件")
+        return None, None, None
+
+    format = None
+    elements = []
+    while (True):
+        line = f.readline()
+        if (len(line) == 0):
+            print("错误：PLY文件头没有结束")
+            return None, None, None
+        words = line.decode("ascii", "replace").split()
+        if (len(words) == 0 or words[0] in ("comment", "obj_info")):
+            continue
+        if (words[0] == "end_header"):
+            break
+        if (words[0] == "format"):
+            format = words[1]
+        elif (words[0] == "element"):
+            elements.append((words[1], int(words[2]), []))
+        elif (words[0] == "property" and len(elements) > 0):
+            if (words[1] == "list"):
+                elements[-1][2].append((words[4], (words[2], words[3])))
+            else:
+                elements[-1][2].append((words[2], words[1]))
+    return format, elements, f.tell()
+
+# 读取PLY文件中vertex元素的所有标量属性；返回属性名到np数组的字典，失败时返回None
+def read_ply_vertices(file_name):
+    with open(file_name, "rb") as f:
+        format, elements, offset = read_header(f)
+        if (format is None):
+            return None
+        if (format not in ("ascii", "binary_little_endian", "binary_big_endian")):
+            print("错误：不支持的PLY格式：" + format)
+            return None
+
+        for name, count, properties in elements:
+            if (name == "vertex"):
+                return read_element(f, format, count, properties)
+            # 跳过vertex之前的其他元素
+            if (not skip_element(f, format, count, properties)):
+                return None
+    print("错误：PLY文件中没有vertex元素：" + file_name)
+    return None
+
+# 读取一个元素的数据（只保留标量属性）
+def read_element(f, format, count, properties):
+    if (any(type(t) == tuple for name, t in properties)):
+        rows = read_rows(f, format, count, properties)
+        return dict((name, np.array([row[i] for row in rows]))
+                    for i, (name, t) in enumerate(properties) if (type(t) != tuple))
+
+    # 只有标量属性时整块读取
+    if (format == "ascii"):
+        lines = [f.readline() for i in range(count)]
+        data = np.array(b" ".join(lines).split(), dtype=np.float64).reshape(count, len(properties))
+        return dict((name, data[:, i]) for i, (name, t) in enumerate(properties))
+    order = "<" if (format == "binary_little_endian") else ">"
+    dtype = np.dtype([(name, order + PLY_TYPES[t]) for name, t in properties])
+    data = np.frombuffer(f.read(dtype.itemsize * count), dtype=dtype, count=count)
+    return dict((name, data[name]) for name, t in properties)
+
+# 跳过一个元素的数据；返回是否成功
+def skip_element(f, format, count, properties):
+    if (format == "ascii"):
+        for i in range(count):
+            f.readline()
+        return True
+    if (all(type(t) != tuple for name, t in properties)):
+        f.seek(sum(np.dtype(PLY_TYPES[t]).itemsize for name, t in properties) * count, 1)
+        return True
+    read_rows(f, format, count, properties)
+    return True
+
+# 逐行读取含有列表属性的元素；返回每行的值列表
+def read_rows(f, format, count, properties):
+    rows = []
+    order = "<" if (format == "binary_little_endian") else ">"
+    for i in range(count):
+        if (format == "ascii"):
+            words = f.readline().split()
+            row = []
+            for name, t in properties:
+                if (type(t) == tuple):
+                    n = int(words[0])
+                    row.append([float(v) for v in words[1:1 + n]])
+                    words = words[1 + n:]
+                else:
+                    row.append(float(words[0]))
+                    words = words[1:]
+        else:
+            row = []
+            for name, t in properties:
+                if (type(t) == tuple):
+                    n = int(np.frombuffer(f.read(np.dtype(PLY_TYPES[t[0]]).itemsize), order + PLY_TYPES[t[0]])[0])
+                    item = np.dtype(order + PLY_TYPES[t[1]])
+                    row.append(np.frombuffer(f.read(item.itemsize * n), item).tolist())
+                else:
+                    item = np.dtype(order + PLY_TYPES[t])
+                    row.append(np.frombuffer(f.read(item.itemsize), item)[0])
+        rows.append(row)
+    return rows
+
+# 加载PLY文件为PointCloud；文件中有nx、ny、nz属性时直接使用，否则用k近邻（半径radius以内）估计法线
+# viewpoint给定时法线朝向该点（例如扫描仪的位置）
+def load_ply(file_name, k=NORMAL_NEIGHBORS, radius=NORMAL_RADIUS, viewpoint=None):
+    vertices = read_ply_vertices(file_name)
+    if (vertices is None):
+        return None
+    positions = np.stack((vertices["x"], vertices["y"], vertices["z"]), axis=1).astype(np.float64)
+    if (all(name in vertices for name in ("nx", "ny", "nz"))):
+        normals = np.stack((vertices["nx"], vertices["ny"], vertices["nz"]), axis=1).astype(np.float64)
+    else:
+        normals = estimate_normals(positions, k, radius, viewpoint=viewpoint)
+    return PointCloud(positions, normals)
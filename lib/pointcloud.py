@@ -0,0 +1,104 @@
+# 项目：点云配准
+#
+# 文件：pointcloud.py
+# 简介：实现了一个以连续数组存储位置和法线的点云，替代逐点的Point对象列表
+
+import numpy as np
+from .point import Point
+
+# 点云：位置和法线分别保存在连续的(N,3)浮点数组中
+class PointCloud:
+    # 构造函数接受(N,3)的位置数组，可选地接受(N,3)的法线数组
+    def __init__(self, positions, normals=None):
+        positions = np.ascontiguousarray(positions, dtype=np.float64)
+        if (positions.ndim != 2):
+            print("错误：点云的位置必须是一个(N,d)数组")
+            positions = np.zeros((0, 3))
+        if (normals is None):
+            normals = np.zeros(positions.shape)
+        normals = np.ascontiguousarray(normals, dtype=np.float64)
+        if (normals.shape != positions.shape):
+            print("错误：点云的法线和位置数组形状不一致")
+            normals = np.zeros(positions.shape)
+
+        self.positions = positions
+        self.normals = normals
+        self.d = positions.shape[1]
+
+    # 从Point对象列表构建点云
+    @staticmethod
+    def from_points(pts):
+        positions = np.array([p.s for p in pts], dtype=np.float64)
+        if (len(pts) > 0 and all(len(p.n) == len(p.s) for p in pts)):
+            normals = np.array([p.n for p in pts], dtype=np.float64)
+        else:
+            normals = None
+        if (len(pts) == 0):
+            positions = np.zeros((0, 3))
+        return PointCloud(positions, normals)
+
+    # 转换为Point对象列表（用于兼容旧代码）
+    def to_points(self):
+        return [Point(s, n) for s, n in zip(self.positions.tolist(), self.normals.tolist())]
+
+    def __len__(self):
+        return self.positions.shape[0]
+
+    # 返回深拷贝
+    def copy(self):
+        return PointCloud(self.positions.copy(), self.normals.copy())
+
+    # 返回由给定下标（或布尔掩码）选出的点组成的新点云
+    def subset(self, indices):
+        return PointCloud(self.positions[indices], self.normals[indices])
+
+    # 对所有点应用(d+1)x(d+1)的齐次变换矩阵m（原地修改并返回自身）
+    # 法线使用线性部分的逆转置进行变换并重新归一化
+    def transform(self, m):
+        m = np.asarray(m, dtype=np.float64)
+        if (m.shape != (self.d + 1, self.d + 1)):
+            print("错误：变换方法接收到的矩阵维度不正确！")
+            return self
+
+        A = m[:self.d, :self.d]
+        t = m[:self.d, self.d]
+        new = self.positions @ A.T + t
+        w = self.positions @ m[self.d, :self.d] + m[self.d, self.d]
+        if (np.any(w != 1.0)):
+            new /= w[:, None]
+        self.positions = new
+
+        if (np.any(self.normals)):
+            try:
+                N = np.linalg.inv(A).T
+            except np.linalg.LinAlgError:
+                print("错误：变换矩阵的线性部分不可逆，法线未变换")
+                return self
+            normals = self.normals @ N.T
+            length = np.linalg.norm(normals, axis=1)
+            length[length == 0.0] = 1.0
+            self.normals = normals / length[:, None]
+
+        return self
+
+    # 体素下采样：将落在同一个边长为voxel_size的体素中的点合并为一个点，
+    # 位置取平均值，法线取平均值后重新归一化；返回新的点云
+    def voxel_downsample(self, voxel_size):
+        if (voxel_size <= 0):
+            print("错误：体素大小必须是正数")
+            return self.copy()
+        if (len(self) == 0):
+            return self.copy()
+
+        keys = np.floor(self.positions / voxel_size).astype(np.int64)
+        _, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        positions = np.zeros((len(counts), self.d))
+        normals = np.zeros((len(counts), self.d))
+        np.add.at(positions, inverse, self.positions)
+        np.add.at(normals, inverse, self.normals)
+        positions /= counts[:, None]
+        length = np.linalg.norm(normals, axis=1)
+        length[length == 0.0] = 1.0
+        normals /= length[:, None]
+        return PointCloud(positions, normals)
@@ -0,0 +1,136 @@
+# 项目：点云配准
+#
+# 文件：posegraph.py
+# 简介：多视角位姿图优化：每个扫描的位姿是一个节点，每个两两配准的结果（包括额外的闭环配准对）
+#       是一条带信息矩阵的边，所有位姿一起用高斯-牛顿法求解，消除沿配准链累积的误差
+#       位姿的增量和边的误差都用6维向量[旋转向量, 平移]表示，与ICP的线性方程组的未知数顺序一致
+#       法方程按边分块组装（每条边只影响两个6x6的块），扫描数通常只有几十个，用稠密的np.linalg.solve求解
+
+import numpy as np
+from .se3 import skew, rotation_matrix, rotation_vector
+
+# 6维向量[旋转向量, 平移]对应的4x4刚体变换
+def pose_from_vector(x):
+    M = np.identity(4)
+    M[:3, :3] = rotation_matrix(x[:3])
+    M[:3, 3] = x[3:6]
+    return M
+
+# 4x4刚体变换对应的6维向量[旋转向量, 平移]
+def pose_to_vector(M):
+    M = np.asarray(M, dtype=np.float64)
+    return np.concatenate((rotation_vector(M[:3, :3]), M[:3, 3]))
+
+# 伴随矩阵：使 M * exp(x) = exp(adjoint(M) x) * M（x = [旋转, 平移]）
+def adjoint(M):
+    M = np.asarray(M, dtype=np.float64)
+    R, t = M[:3, :3], M[:3, 3]
+    K = skew(t)
+    A = np.zeros((6, 6))
+    A[:3, :3] = R
+    A[3:, :3] = K @ R
+    A[3:, 3:] = R
+    return A
+
+# 配准对的信息矩阵：源点云经过相对变换Z（源在目标坐标系中的位姿）之后，
+# 对每个在最大距离以内、且不是异常值的对应点，累加点到平面残差对[旋转, 平移]的雅可比的外积，
+# 即ICP线性方程组中的C矩阵；对应点越多、几何约束越充分，信息矩阵越大
+def edge_information(source, target, kdtree, Z, outlier_factor=0.75, max_distance=None):
+    p = source.copy().transform(Z)
+    index, dist = kdtree.nearest_batch(p.positions)
+    matched = index >= 0
+    if (max_distance is not None):
+        matched &= dist <= max_distance * max_distance
+    if (not np.any(matched)):
+        return np.zeros((6, 6))
+    p, q = p.subset(matched), target.subset(index[matched])
+    point2plane = np.abs(np.einsum('ij,ij->i', p.positions - q.positions, q.normals))
+    inliers = point2plane <= outlier_factor * np.median(point2plane)
+    A = np.hstack((np.cross(p.positions[inliers], q.normals[inliers]), q.normals[inliers]))
+    return A.T @ A
+
+# 位姿图的一条边：source在target坐标系中的相对位姿transform（即 target位姿的逆 * source位姿），
+# 以及它的6x6信息矩阵（在目标坐标系中，与ICP的C矩阵相同）
+class PoseEdge:
+    def __init__(self, source, target, transform, information=None, loop_closure=False):
+        self.source = source
+        self.target = target
+        self.transform = np.matrix(transform, dtype=np.float64)
+        self.information = np.identity(6) if (information is None) else np.asarray(information, dtype=np.float64)
+        self.loop_closure = loop_closure
+
+class PoseGraph:
+    def __init__(self):
+        self.poses = {}  # 扫描名到它在世界坐标系中的位姿
+        self.fixed = set()  # 优化时保持不变的扫描（至少一个，通常是基准扫描）
+        self.edges = []
+
+    def add_node(self, name, pose, fixed=False):
+        self.poses[name] = np.matrix(pose, dtype=np.float64)
+        if (fixed):
+            self.fixed.add(name)
+
+    def add_edge(self, edge):
+        for name in (edge.source, edge.target):
+            if (name not in self.poses):
+                print("错误：位姿图的边引用了不存在的扫描{}".format(name))
+                return
+        self.edges.append(edge)
+
+    # 返回一条边在当前位姿下的误差（源坐标系中的6维向量）
+    def edge_error(self, edge):
+        E = edge.transform.I * self.poses[edge.target].I * self.poses[edge.source]
+        return pose_to_vector(E)
+
+    # 返回所有边的加权误差平方和
+    def cost(self):
+        total = 0.0
+        for edge in self.edges:
+            e = self.edge_error(edge)
+            A = adjoint(edge.transform)
+            total += float(e @ A.T @ edge.information @ A @ e)
+        return total
+
+    # 高斯-牛顿法优化所有未固定的位姿；增量右乘到位姿上：T <- T * exp(x)
+    # 对于边误差 e = log(Z^-1 Tj^-1 Ti)，一阶近似 e(xi, xj) = e0 + Ad(Z^-1 Tj^-1 Ti) xi - Ad(Z^-1) xj
+    # 信息矩阵在目标坐标系中给出，换算到源坐标系为 Ad(Z)^T Ω Ad(Z)
+    # 返回(迭代次数, 优化前的代价, 优化后的代价)
+    def optimize(self, max_iterations=20, tolerance=1e-10, verbose=True):
+        if (len(self.fixed) == 0 and len(self.poses) > 0):
+            self.fixed.add(next(iter(self.poses)))
+        free = [name for name in self.poses if (name not in self.fixed)]
+        slot = dict((name, i) for i, name in enumerate(free))
+        n = 6 * len(free)
+        initial = self.cost()
+        count = 0
+        while (count < max_iterations and n > 0):
+            H = np.zeros((n, n))
+            b = np.zeros(n)
+            for edge in self.edges:
+                Ti, Tj, Z = self.poses[edge.source], self.poses[edge.target], edge.transform
+                E = Z.I * Tj.I * Ti
+                e = pose_to_vector(E)
+                A = adjoint(Z)
+                W = A.T @ edge.information @ A
+                blocks = []
+                if (edge.source in slot):
+                    blocks.append((slot[edge.source], adjoint(E)))
+                if (edge.target in slot):
+                    blocks.append((slot[edge.target], -adjoint(Z.I)))
+                for i, Ji in blocks:
+                    b[6*i:6*i + 6] += Ji.T @ W @ e
+                    for j, Jj in blocks:
+                        H[6*i:6*i + 6, 6*j:6*j + 6] += Ji.T @ W @ Jj
+
+            # 没有约束的扫描（与其他扫描没有边）的块为零，加一个很小的阻尼使方程组可解
+            H += 1e-9 * (np.trace(H) / n + 1.0) * np.identity(n)
+            x = -np.linalg.solve(H, b)
+            for name, i in slot.items():
+                self.poses[name] = self.poses[name] * np.matrix(pose_from_vector(x[6*i:6*i + 6]))
+            count += 1
+            step = float(np.abs(x).max())
+            if (verbose):
+                print("完成了位姿图优化迭代 #{}，最大增量为 {:.3e}".format(count, step))
+            if (step < tolerance):
+                break
+        return count, initial, self.cost()
@@ -0,0 +1,106 @@
+# 项目：点云配准
+#
+# 文件：ptscache.py
+# 简介：点云的二进制缓存文件（.pcb），与源.pts/.ply文件放在一起，通过内存映射打开
+#
+# 文件格式：64字节的文件头，之后是位置块(N,3)和法线块(N,3)，按行优先连续存放
+#   0  8字节  魔数 b'PCBCACHE'
+#   8  uint32 版本号
+#   12 uint32 每个数值的字节数（4为float32，8为float64）
+#   16 uint64 点数N
+#   24 uint64 源文件大小（字节）
+#   32 int64  源文件修改时间（纳秒）
+#   40 填充至64字节
+
+import os
+import struct
+import numpy as np
+from .pointcloud import PointCloud
+from .utils import load_cloud
+from .ply import load_ply
+
+MAGIC = b'PCBCACHE'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQQq')
+HEADER_SIZE = 64
+CACHE_EXT = '.pcb'
+
+# 返回源文件对应的缓存文件路径
+def cache_path(source):
+    return source + CACHE_EXT
+
+# 返回源文件的(大小, 修改时间)，用于判断缓存是否过期
+def source_stamp(source):
+    st = os.stat(source)
+    return st.st_size, st.st_mtime_ns
+
+# 将点云写入缓存文件；先写入临时文件再原子地替换，避免其他进程读到写了一半的文件
+def write_cache(file_name, cloud, source, dtype=np.float64):
+    dtype = np.dtype(dtype)
+    if (dtype not in (np.dtype(np.float32), np.dtype(np.float64))):
+        print("错误：缓存只支持float32和float64")
+        return
+    size, mtime = source_stamp(source)
+    header = HEADER.pack(MAGIC, VERSION, dtype.itemsize, len(cloud), size, mtime)
+
+    tmp_name = "{}.{}.tmp".format(file_name, os.getpid())
+    with open(tmp_name, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        f.write(np.ascontiguousarray(cloud.positions, dtype=dtype).tobytes())
+        f.write(np.ascontiguousarray(cloud.normals, dtype=dtype).tobytes())
+    os.replace(tmp_name, file_name)
+    return
+
+# 通过内存映射打开缓存文件；文件不存在、格式不符或相对源文件已过期时返回None
+def open_cache(file_name, source=None):
+    if (not os.path.isfile(file_name)):
+        return None
+
+    with open(file_name, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if (len(header) < HEADER_SIZE):
+        return None
+    magic, version, itemsize, n, size, mtime = HEADER.unpack(header[:HEADER.size])
+    if (magic != MAGIC or version != VERSION or itemsize not in (4, 8)):
+        return None
+    if (source is not None and source_stamp(source) != (size, mtime)):
+        return None
+
+    dtype = np.float32 if (itemsize == 4) else np.float64
+    if (os.path.getsize(file_name) != HEADER_SIZE + 2 * n * 3 * itemsize):
+        print("错误：缓存文件{}的长度与文件头不符".format(file_name))
+        return None
+    if (n == 0):
+        return PointCloud(np.zeros((0, 3)), np.zeros((0, 3)))
+
+    # 只读映射：多个进程可以共享相同的页面；float64时PointCloud不会复制数据
+    data = np.memmap(file_name, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(2, n, 3))
+    return PointCloud(data[0], data[1])
+
+# 加载点云：缓存有效时直接映射，否则用loader解析源文件并写入缓存
+# loader默认按扩展名选择（.pts使用utils.load_cloud，.ply使用ply.load_ply直接读取并估计法线）
+def load_cached(source, loader=None, dtype=np.float64):
+    file_name = cache_path(source)
+    cloud = open_cache(file_name, source)
+    if (cloud is not None):
+        return cloud
+
+    if (loader is None):
+        if (source.lower().endswith('.pts')):
+            loader = load_cloud
+        elif (source.lower().endswith('.ply')):
+            loader = load_ply
+        else:
+            print("错误：无法为{}选择加载函数".format(source))
+            return None
+    cloud = loader(source)
+
+    try:
+        write_cache(file_name, cloud, source, dtype)
+    except OSError as e:
+        print("警告：无法写入缓存文件{}：{}".format(file_name, e))
+        return cloud
+
+    # 重新以映射方式打开，使本进程与之后的进程共享同一份页面
+    mapped = open_cache(file_name, source)
+    return mapped if (mapped is not None) else cloud
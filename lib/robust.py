@@ -0,0 +1,54 @@
+# 项目：点云配准
+#
+# 文件：robust.py
+# 简介：ICP的鲁棒估计：把残差换算为每个对应点对的权重，在线性方程组中加权（迭代重加权最小二乘），
+#       代替固定倍数中位数的硬阈值，不需要针对每个数据集调整阈值
+#       残差的尺度用中位数绝对偏差（MAD）估计：sigma = 1.4826 * median(|r|)，
+#       核函数的参数是sigma的倍数（截尾核的参数是保留的比例），因此与数据的坐标尺度无关
+
+import numpy as np
+
+KERNELS = ["trimmed", "huber", "tukey", "geman_mcclure"]
+
+# 各个核函数的默认参数：截尾核保留80%的点对，其余为sigma的倍数（Huber和Tukey取95%渐近效率的常用值）
+DEFAULT_PARAMETERS = {"trimmed": 0.8, "huber": 1.345, "tukey": 4.685, "geman_mcclure": 2.0}
+
+# 用中位数绝对偏差估计残差的尺度
+def robust_scale(residuals):
+    scale = 1.4826 * np.median(np.abs(residuals))
+    return scale if (scale > 0) else 1e-12
+
+# 返回每个残差的权重(N,)：kernel为KERNELS中的一个，parameter为None时使用默认参数
+def kernel_weights(residuals, kernel, parameter=None, scale=None):
+    r = np.abs(np.asarray(residuals, dtype=np.float64))
+    if (parameter is None):
+        parameter = DEFAULT_PARAMETERS[kernel]
+    if (kernel == "trimmed"):
+        # 只保留残差最小的parameter比例的点对
+        keep = max(1, int(np.ceil(parameter * len(r))))
+        weights = np.zeros(len(r))
+        if (len(r) > 0):
+            weights[np.argpartition(r, keep - 1)[:keep]] = 1.0
+        return weights
+
+    c = parameter * (robust_scale(r) if (scale is None) else scale)
+    u = r / c
+    if (kernel == "huber"):
+        return np.where(u <= 1.0, 1.0, 1.0 / np.maximum(u, 1e-300))
+    if (kernel == "tukey"):
+        return np.where(u < 1.0, (1.0 - u * u) ** 2, 0.0)
+    # geman_mcclure
+    return 1.0 / (1.0 + u * u) ** 2
+
+# 鲁棒核：ICP的每次迭代在固定的对应点上进行iterations次重加权求解
+class RobustKernel:
+    def __init__(self, kernel="huber", parameter=None, iterations=3):
+        if (kernel not in KERNELS):
+            print("错误：未知的鲁棒核函数：{}，使用huber".format(kernel))
+            kernel = "huber"
+        self.kernel = kernel
+        self.parameter = parameter
+        self.iterations = max(1, iterations)
+
+    def weights(self, residuals):
+        return kernel_weights(residuals, self.kernel, self.parameter)
@@ -0,0 +1,140 @@
+# 项目：点云配准
+#
+# 文件：sampling.py
+# 简介：ICP的采样策略：每个点云只预处理一次，之后每次迭代用sample(n)返回采样点的下标数组，
+#       不再每次迭代打乱整个下标数组（O(N)）只为了取前n个点
+#       "uniform"：预先生成一个随机排列，每次迭代取循环窗口中接下来的n个点，用完一轮后才重新排列
+#       "normal_space"：按法线方向分桶（Rusinkiewicz和Levoy 2001），每个桶分配相同数量的采样点，
+#                       平坦区域的大量点不会占满采样，小的特征（例如耳朵和边缘）也能约束位姿
+#       "covariance"：按每个点在ICP线性方程组中的杠杆值 h = A C^-1 A^T 加权随机采样（A = [p x n, n]，
+#                     C = sum(A^T A)），约束较弱的方向上的点更容易被选中，目标与Gelfand等人2003的稳定采样相同；
+#                     杠杆值与坐标系无关，因此在源点云原来的坐标上计算一次即可
+
+import numpy as np
+
+SAMPLERS = ["uniform", "normal_space", "covariance"]
+
+# 均匀采样：随机排列上的循环窗口
+class UniformSampler:
+    def __init__(self, count, rng):
+        self.count = count
+        self.rng = rng
+        self.order = rng.permutation(count)
+        self.cursor = 0
+
+    def sample(self, n):
+        n = min(n, self.count)
+        if (self.cursor + n > self.count):
+            self.rng.shuffle(self.order)
+            self.cursor = 0
+        index = self.order[self.cursor:self.cursor + n]
+        self.cursor += n
+        return index
+
+# 返回每个法线所在的桶(N,)：按绝对值最大的分量分为3个面，每个面上按另外两个分量的比值分为bins x bins个格子
+# 法线可能没有统一朝向，n和-n落入同一个桶；零法线（没有法线的点云）都落入第一个桶
+def normal_buckets(normals, bins=4):
+    normals = np.asarray(normals, dtype=np.float64)
+    rows = np.arange(len(normals))
+    axis = np.argmax(np.abs(normals), axis=1)
+    major = np.maximum(np.abs(normals[rows, axis]), 1e-12)
+    sign = np.where(normals[rows, axis] < 0, -1.0, 1.0)
+    u = sign * normals[rows, (axis + 1) % 3] / major
+    v = sign * normals[rows, (axis + 2) % 3] / major
+    iu = np.clip(np.floor((u + 1.0) / 2.0 * bins), 0, bins - 1).astype(np.int64)
+    iv = np.clip(np.floor((v + 1.0) / 2.0 * bins), 0, bins - 1).astype(np.int64)
+    return (axis * bins + iu) * bins + iv
+
+# 法线空间采样：每个非空的桶是一个随机排列的下标数组，各自有一个循环窗口
+class NormalSpaceSampler:
+    def __init__(self, normals, rng, bins=4):
+        self.rng = rng
+        bucket = normal_buckets(normals, bins)
+        self.count = len(bucket)
+        order = rng.permutation(self.count)
+        order = order[np.argsort(bucket[order], kind="stable")]
+        self.members = np.split(order, np.flatnonzero(np.diff(bucket[order])) + 1) if (self.count > 0) else []
+        self.sizes = np.array([len(m) for m in self.members], dtype=np.int64)
+        self.cursors = np.zeros(len(self.members), dtype=np.int64)
+
+    # 把n个采样点尽量平均地分配到各个桶：点数不足配额的桶全部选中，剩余的配额再平均分给其他桶
+    def quotas(self, n):
+        quota = np.zeros(len(self.sizes), dtype=np.int64)
+        remaining = min(n, self.count)
+        available = quota < self.sizes
+        while (remaining > 0 and np.any(available)):
+            share = remaining // np.count_nonzero(available)
+            if (share == 0):
+                quota[self.rng.choice(np.flatnonzero(available), remaining, replace=False)] += 1
+                break
+            add = np.where(available, np.minimum(share, self.sizes - quota), 0)
+            quota += add
+            remaining -= int(add.sum())
+            available = quota < self.sizes
+        return quota
+
+    def sample(self, n):
+        quota = self.quotas(n)
+        parts = [np.zeros(0, dtype=np.int64)]
+        for b in np.flatnonzero(quota):
+            members = self.members[b]
+            parts.append(members[(self.cursors[b] + np.arange(quota[b])) % len(members)])
+            self.cursors[b] = (self.cursors[b] + quota[b]) % len(members)
+        index = np.concatenate(parts)
+        self.rng.shuffle(index)
+        return index
+
+# 返回每个点在点到平面线性方程组中的杠杆值(N,)；位置先减去重心，避免远离原点的坐标使C矩阵病态
+def leverage(positions, normals):
+    positions = np.asarray(positions, dtype=np.float64)
+    normals = np.asarray(normals, dtype=np.float64)
+    A = np.hstack((np.cross(positions - positions.mean(axis=0), normals), normals))
+    return np.einsum('ij,jk,ik->i', A, np.linalg.pinv(A.T @ A), A)
+
+# 协方差（稳定）采样：按杠杆值的累积分布有放回地抽取，去掉重复的点后补足
+class CovarianceSampler:
+    def __init__(self, positions, normals, rng, max_draws=8):
+        self.rng = rng
+        self.count = len(positions)
+        self.max_draws = max_draws  # 去重后补足的最多次数
+        weights = np.maximum(leverage(positions, normals), 0.0) if (self.count > 0) else np.zeros(0)
+        if (not weights.sum() > 0):
+            weights = np.ones(self.count)
+        self.cdf = np.cumsum(weights)
+        if (self.count > 0):
+            self.cdf /= self.cdf[-1]
+
+    def draw(self, n):
+        return np.minimum(np.searchsorted(self.cdf, self.rng.random(n), side="right"), self.count - 1)
+
+    def sample(self, n):
+        n = min(n, self.count)
+        index = np.unique(self.draw(n))
+        for attempt in range(self.max_draws):
+            if (len(index) >= n):
+                break
+            # 按目前重复的比例多抽取一些，杠杆值集中在少数点上时也只需要很少几次
+            index = np.union1d(index, self.draw(2 * (n - len(index)) * n // max(len(index), 1) + 1))
+        self.rng.shuffle(index)
+        return index[:n]
+
+# 构建点云的采样器；rng为np.random.Generator，bins为法线空间采样每个面上每个方向的格子数
+def build_sampler(cloud, kind="uniform", rng=None, bins=4):
+    if (kind not in SAMPLERS):
+        print("错误：未知的采样方法：{}，使用uniform".format(kind))
+        kind = "uniform"
+    rng = np.random.default_rng() if (rng is None) else rng
+    if (kind == "normal_space"):
+        return NormalSpaceSampler(cloud.normals, rng, bins)
+    if (kind == "covariance"):
+        return CovarianceSampler(cloud.positions, cloud.normals, rng)
+    return UniformSampler(len(cloud), rng)
+
+# 只在掩码为True的点中采样n个点：按掩码中的点所占的比例多采样一些，再去掉掩码之外的点；
+# 掩码中的点很少时可能不足n个
+def sample_masked(sampler, n, mask):
+    inside = np.count_nonzero(mask)
+    if (inside == 0):
+        return np.zeros(0, dtype=np.int64)
+    index = sampler.sample(int(np.ceil(1.2 * n * len(mask) / inside)))
+    return index[mask[index]][:n]
@@ -0,0 +1,112 @@
+# 项目：点云配准
+#
+# 文件：scanset.py
+# 简介：读取扫描集合（bun.conf或扫描列表）和配准关系图，并计算配准的依赖顺序
+
+import os
+import numpy as np
+from .utils import load_xf
+
+# 一次扫描：名称（文件名去掉扩展名）、文件路径和初始位姿（4x4 np矩阵，可能为None）
+class Scan:
+    def __init__(self, name, path, pose=None):
+        self.name = name
+        self.path = path
+        self.pose = pose
+
+# 返回文件名去掉目录和扩展名后的部分，作为扫描的名称
+def scan_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+# 将四元数(x, y, z, w)和平移转换为4x4的np矩阵
+# bun.conf中的四元数与.xf文件中的旋转互为共轭，这里取共轭以与.xf保持一致
+def conf_pose(tx, ty, tz, qx, qy, qz, qw):
+    x, y, z, w = -qx, -qy, -qz, qw
+    M = np.identity(4)
+    M[:3, :3] = [[1 - 2*(y*y + z*z), 2*(x*y - z*w), 2*(x*z + y*w)],
+                 [2*(x*y + z*w), 1 - 2*(x*x + z*z), 2*(y*z - x*w)],
+                 [2*(x*z - y*w), 2*(y*z + x*w), 1 - 2*(x*x + y*y)]]
+    M[:3, 3] = [tx, ty, tz]
+    return np.matrix(M)
+
+# 读取bun.conf格式的文件："bmesh 文件名 tx ty tz qx qy qz qw"，其他行忽略
+def load_conf(file_name):
+    dir = os.path.dirname(file_name)
+    scans = []
+    with open(file_name) as f:
+        for r in f.read().split('\n'):
+            c = r.split()
+            if (len(c) == 0 or c[0] != 'bmesh'):
+                continue
+            if (len(c) != 9):
+                print("错误：在{}中检测到无效的bmesh行：{}".format(file_name, r))
+                continue
+            pose = conf_pose(*[float(v) for v in c[2:9]])
+            scans.append(Scan(scan_name(c[1]), os.path.join(dir, c[1]), pose))
+    return scans
+
+# 读取扫描列表：每行一个文件路径（相对于列表文件所在目录）；.conf文件按bun.conf格式读取
+def load_scan_list(file_name):
+    if (file_name.lower().endswith('.conf')):
+        return load_conf(file_name)
+
+    dir = os.path.dirname(file_name)
+    scans = []
+    with open(file_name) as f:
+        for r in f.read().split('\n'):
+            r = r.strip()
+            if (len(r) == 0 or r.startswith('#')):
+                continue
+            scans.append(Scan(scan_name(r), os.path.join(dir, r)))
+    return scans
+
+# 读取配准关系图：每行"源 目标"（扫描名称或文件名），表示将源配准到目标
+def load_pairs(file_name):
+    pairs = []
+    with open(file_name) as f:
+        for r in f.read().split('\n'):
+            c = r.split()
+            if (len(c) == 0 or c[0].startswith('#')):
+                continue
+            if (len(c) != 2):
+                print("错误：在{}中检测到无效的配准对：{}".format(file_name, r))
+                continue
+            pairs.append((scan_name(c[0]), scan_name(c[1])))
+    return pairs
+
+# 计算配准的依赖顺序：目标的位姿确定（作为基准，或已作为源完成配准）之后才能配准源
+# 返回按顺序排列的(源, 目标)列表；出错时返回None
+def registration_order(pairs, reference):
+    targets = {}
+    for source, target in pairs:
+        if (source == reference):
+            print("错误：基准扫描{}不能作为源".format(reference))
+            return None
+        if (source in targets):
+            print("错误：扫描{}被多次作为源".format(source))
+            return None
+        targets[source] = target
+
+    order = []
+    done = set([reference])
+    remaining = [source for source, target in pairs]
+    while (len(remaining) > 0):
+        ready = [s for s in remaining if targets[s] in done]
+        if (len(ready) == 0):
+            print("错误：以下扫描无法连接到基准扫描{}：{}".format(reference, ', '.join(remaining)))
+            return None
+        for s in ready:
+            order.append((s, targets[s]))
+            done.add(s)
+        remaining = [s for s in remaining if s not in done]
+    return order
+
+# 返回扫描的初始位姿：优先使用扫描文件旁边的.xf，其次是扫描列表中给出的位姿，否则为单位矩阵
+def initial_pose(scan, path=None):
+    path = scan.path if (path is None) else path
+    file_xf = os.path.splitext(path)[0] + '.xf'
+    if (os.path.isfile(file_xf)):
+        return load_xf(file_xf)
+    if (scan.pose is not None):
+        return scan.pose
+    return np.matrix(np.identity(4))
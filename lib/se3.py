@@ -0,0 +1,183 @@
+# 项目：点云配准
+#
+# 文件：se3.py
+# 简介：ICP每次迭代的增量变换求解：构建线性方程组，并把解换算为刚体变换
+#       "small_angle"：原来的小角度近似（手工展开的旋转矩阵，不是严格正交的）
+#       "gauss_newton"：解向量[旋转, 平移]作为李代数向量，用精确的指数映射得到正交的增量变换
+#       "levenberg_marquardt"：在高斯-牛顿的基础上加阻尼，距离没有减小时增大阻尼重新求解，而不是终止
+#       目标函数可以是点到平面（只用目标法线），也可以是对称的点到平面（源和目标法线之和，
+#       Rusinkiewicz 2019），后者在曲面上收敛更快
+
+import numpy as np
+
+SOLVERS = ["small_angle", "gauss_newton", "levenberg_marquardt"]
+OBJECTIVES = ["point_to_plane", "symmetric"]
+
+# 向量w的反对称矩阵（叉乘矩阵）
+def skew(w):
+    return np.array([[0.0, -w[2], w[1]], [w[2], 0.0, -w[0]], [-w[1], w[0], 0.0]])
+
+# 旋转向量（轴乘以角度）对应的旋转矩阵（罗德里格斯公式）
+def rotation_matrix(w):
+    w = np.asarray(w, dtype=np.float64)
+    angle = np.linalg.norm(w)
+    K = skew(w)
+    if (angle < 1e-12):
+        return np.identity(3) + K
+    return np.identity(3) + np.sin(angle) / angle * K + (1.0 - np.cos(angle)) / (angle * angle) * K @ K
+
+# 旋转矩阵对应的旋转向量
+def rotation_vector(R):
+    R = np.asarray(R, dtype=np.float64)
+    cos = np.clip((np.trace(R) - 1.0) / 2.0, -1.0, 1.0)
+    angle = np.arccos(cos)
+    axis = np.array([R[2, 1] - R[1, 2], R[0, 2] - R[2, 0], R[1, 0] - R[0, 1]])
+    if (angle < 1e-8):
+        return axis / 2.0
+    if (np.pi - angle < 1e-6):
+        # 接近180度时由R+I的最大列求旋转轴
+        B = (R + np.identity(3)) / 2.0
+        axis = B[:, np.argmax(np.diag(B))]
+        return angle * axis / np.linalg.norm(axis)
+    return angle / (2.0 * np.sin(angle)) * axis
+
+# 指数映射：6维向量[旋转ω, 平移v]对应的4x4刚体变换，平移部分为 V(ω) v
+def exp_map(x):
+    x = np.asarray(x, dtype=np.float64)
+    w, v = x[:3], x[3:6]
+    angle = np.linalg.norm(w)
+    K = skew(w)
+    if (angle < 1e-8):
+        V = np.identity(3) + K / 2.0
+    else:
+        V = (np.identity(3) + (1.0 - np.cos(angle)) / (angle * angle) * K +
+             (angle - np.sin(angle)) / (angle ** 3) * K @ K)
+    M = np.identity(4)
+    M[:3, :3] = rotation_matrix(w)
+    M[:3, 3] = V @ v
+    return M
+
+# 对数映射：exp_map的逆
+def log_map(M):
+    M = np.asarray(M, dtype=np.float64)
+    w = rotation_vector(M[:3, :3])
+    angle = np.linalg.norm(w)
+    K = skew(w)
+    if (angle < 1e-8):
+        V_inverse = np.identity(3) - K / 2.0
+    else:
+        V_inverse = (np.identity(3) - K / 2.0 +
+                     (1.0 - angle * np.sin(angle) / (2.0 * (1.0 - np.cos(angle)))) / (angle * angle) * K @ K)
+    return np.concatenate((w, V_inverse @ M[:3, 3]))
+
+# 把4x4变换的旋转部分投影到最近的正交矩阵（行列式为1），消除多次相乘累积的舍入误差
+def orthonormalize(M):
+    M = np.array(M, dtype=np.float64)
+    U, S, Vt = np.linalg.svd(M[:3, :3])
+    R = U @ Vt
+    if (np.linalg.det(R) < 0):
+        U[:, 2] = -U[:, 2]
+        R = U @ Vt
+    M[:3, :3] = R
+    return M
+
+# 小角度近似的增量变换（原来的做法）
+def small_angle_transform(x):
+    rx, ry, rz, tx, ty, tz = x
+    return np.array([[1.0, ry*rx - rz, rz*rx + ry, tx], [rz, 1.0 + rz*ry*rx, rz*ry - rx, ty],
+                     [-ry, rx, 1.0, tz], [0, 0, 0, 1.0]])
+
+# 对称目标函数的增量变换：解向量为[a, t~]，旋转角度为atan(|a|)，
+# 源点旋转一半、目标点反向旋转一半，合起来为 R * T(t~ cosθ) * R
+def symmetric_transform(x):
+    a, t = np.asarray(x[:3], dtype=np.float64), np.asarray(x[3:6], dtype=np.float64)
+    norm = np.linalg.norm(a)
+    angle = np.arctan(norm)
+    R = np.identity(4)
+    if (norm > 0):
+        R[:3, :3] = rotation_matrix(a / norm * angle)
+    T = np.identity(4)
+    T[:3, 3] = t * np.cos(angle)
+    return R @ T @ R
+
+# 对所有点对一次性构建6x6的C矩阵和6x1的d向量
+# 每一行 Ai = [p x n, n]，bi = (q - p)·n，C = sum(wi Ai^T Ai)，d = sum(wi Ai^T bi)；weights为None时wi = 1
+def build_system(p, q, qn, weights=None):
+    A = np.hstack((np.cross(p, qn), qn))
+    b = np.einsum('ij,ij->i', q - p, qn)
+    if (weights is None):
+        C = A.T @ A
+        d = (A.T @ b).reshape(6, 1)
+    else:
+        C = A.T @ (A * weights[:, None])
+        d = (A.T @ (b * weights)).reshape(6, 1)
+    return C, d
+
+# 对称点到平面的线性方程组：n = np + nq（源法线与目标法线方向相反时先翻转），
+# 每一行 Ai = [(p + q) x n, n]，bi = (q - p)·n
+def build_symmetric_system(p, pn, q, qn, weights=None):
+    flip = np.einsum('ij,ij->i', pn, qn) < 0
+    n = qn + np.where(flip[:, None], -pn, pn)
+    A = np.hstack((np.cross(p + q, n), n))
+    b = np.einsum('ij,ij->i', q - p, n)
+    if (weights is not None):
+        A, b = A * np.sqrt(weights)[:, None], b * np.sqrt(weights)
+    return A.T @ A, (A.T @ b).reshape(6, 1)
+
+# 增量变换的求解器；levenberg_marquardt的阻尼在一次配准中保持，接受时减小，拒绝时增大
+class IncrementSolver:
+    def __init__(self, method="gauss_newton", objective="point_to_plane", damping=1e-4, max_retries=8):
+        if (method not in SOLVERS):
+            print("错误：未知的求解方法：{}，使用gauss_newton".format(method))
+            method = "gauss_newton"
+        if (objective not in OBJECTIVES):
+            print("错误：未知的目标函数：{}，使用point_to_plane".format(objective))
+            objective = "point_to_plane"
+        self.method = method
+        self.objective = objective
+        self.initial_damping = damping
+        self.max_retries = max_retries  # 一次迭代中最多重新求解的次数
+        self.reset()
+
+    # 开始新的一次配准
+    def reset(self):
+        self.damping = self.initial_damping
+
+    # 是否在距离没有减小时增大阻尼重新求解
+    def damped(self):
+        return self.method == "levenberg_marquardt"
+
+    # 在固定的对应点上求解一步，返回4x4的增量变换（ndarray）；p、pn、q、qn均为(N,3)数组
+    def solve(self, p, pn, q, qn, weights=None):
+        if (self.objective == "symmetric"):
+            C, d = build_symmetric_system(p, pn, q, qn, weights)
+        else:
+            C, d = build_system(p, q, qn, weights)
+        if (self.damped()):
+            C = C + self.damping * np.diag(np.diag(C))
+        try:
+            x = np.linalg.solve(C, d).flatten()
+        except np.linalg.LinAlgError:
+            # 采样点不足以约束所有方向时（例如都落在同一个平面上）方程组奇异，取最小范数的最小二乘解
+            x = np.linalg.lstsq(C, d, rcond=None)[0].flatten()
+        if (self.objective == "symmetric"):
+            return symmetric_transform(x)
+        if (self.method == "small_angle"):
+            return small_angle_transform(x)
+        return exp_map(x)
+
+    # 与目标函数一致的有符号残差(N,)，用于剔除异常值、鲁棒权重和判断距离是否减小：
+    # 点到平面为(p - q)·nq；对称目标函数为(p - q)·n，n为两个法线之和的单位向量
+    def residuals(self, p, pn, q, qn):
+        if (self.objective == "symmetric"):
+            flip = np.einsum('ij,ij->i', pn, qn) < 0
+            n = qn + np.where(flip[:, None], -pn, pn)
+            n /= np.maximum(np.linalg.norm(n, axis=1), 1e-12)[:, None]
+            return np.einsum('ij,ij->i', p - q, n)
+        return np.einsum('ij,ij->i', p - q, qn)
+
+    def accept(self):
+        self.damping = max(self.damping / 10.0, 1e-12)
+
+    def reject(self):
+        self.damping *= 10.0
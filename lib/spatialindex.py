@@ -0,0 +1,63 @@
+# 项目：点云配准
+#
+# 文件：spatialindex.py
+# 简介：ICP对应点搜索的空间索引接口
+#       任何提供nearest_batch(queries)并返回(最近点下标, 平方距离)的对象都可以作为后端；
+#       在最大距离以内找不到对应点时，下标为-1，平方距离为inf（ICP会丢弃这些采样点）
+#       "kdtree"：ArrayKdTree，精确的最近邻
+#       "grid"：VoxelGrid，只查找max_distance以内的最近邻
+#       "hybrid"：先在网格中查找，max_distance以内没有点的查询再交给KdTree，结果与"kdtree"相同
+
+import numpy as np
+from .kdtree import ArrayKdTree
+from .voxelgrid import VoxelGrid
+
+INDEX_TYPES = ["kdtree", "grid", "hybrid"]
+
+# 网格优先、KdTree兜底的组合索引：接近收敛时几乎所有查询都在网格中得到结果
+class HybridIndex:
+    def __init__(self, grid, kdtree):
+        self.grid = grid
+        self.kdtree = kdtree
+
+    def nearest_batch(self, queries):
+        queries = np.asarray(queries, dtype=np.float64)
+        index, dist = self.grid.nearest_batch(queries)
+        if (index is None):
+            return None, None
+        missing = np.flatnonzero(index < 0)
+        if (len(missing) > 0):
+            index[missing], dist[missing] = self.kdtree.nearest_batch(queries[missing])
+        return index, dist
+
+# 估计点之间的典型间距：在最多sample个点的子集上求最近邻距离的中位数，
+# 再按曲面上的点密度（间距与点数的平方根成反比）换算到整个点云
+def estimate_spacing(points, sample=20000, rng=None):
+    points = np.asarray(points, dtype=np.float64)
+    if (len(points) < 2):
+        return 1.0
+    rng = np.random.default_rng(0) if (rng is None) else rng
+    m = min(sample, len(points))
+    subset = points[rng.choice(len(points), m, replace=False)] if (m < len(points)) else points
+    index, dist = ArrayKdTree(subset).knn_batch(subset, 2)
+    spacing = float(np.sqrt(np.median(dist[:, 1])))
+    spacing *= np.sqrt(m / len(points))
+    return spacing if (spacing > 0) else 1.0
+
+# 构建空间索引；kdtree为已经构建好的ArrayKdTree（可选）
+# max_distance为网格的最大查找距离，为None时取估计的点间距的4倍
+def build_index(points, kind="kdtree", max_distance=None, kdtree=None):
+    if (kind not in INDEX_TYPES):
+        print("错误：未知的空间索引类型：{}，使用kdtree".format(kind))
+        kind = "kdtree"
+    if (kind != "grid" and kdtree is None):
+        kdtree = ArrayKdTree(points)
+    if (kind == "kdtree"):
+        return kdtree
+
+    if (max_distance is None):
+        max_distance = 4.0 * estimate_spacing(points)
+    grid = VoxelGrid(points, max_distance)
+    if (kind == "grid"):
+        return grid
+    return HybridIndex(grid, kdtree)
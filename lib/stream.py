@@ -0,0 +1,200 @@
+# 项目：点云配准
+#
+# 文件：stream.py
+# 简介：分块流式读取.pts和.ply文件，每次只在内存中保留固定点数的一块；
+#       读取的同时可以进行体素下采样或蓄水池采样，用于无法一次性放入内存的超大扫描
+
+from itertools import islice
+import numpy as np
+from .pointcloud import PointCloud
+from .ply import PLY_TYPES, NORMAL_NEIGHBORS, NORMAL_RADIUS, read_header, read_element, skip_element
+from .normals import estimate_normals
+
+# 分块读取.pts文件，每次产生一个不超过chunk_size个点的PointCloud
+def stream_pts(file_name, chunk_size=1000000):
+    with open(file_name, "rb") as f:
+        while (True):
+            lines = list(islice(f, chunk_size))
+            if (len(lines) == 0):
+                break
+            values = b" ".join(lines).split()
+            if (len(values) % 6 == 0):
+                data = np.array(values, dtype=np.float64).reshape(-1, 6)
+            else:
+                data = parse_rows(file_name, lines)
+            yield PointCloud(data[:, 0:3], data[:, 3:6])
+
+# 逐行检查一块.pts数据（与utils.load_pts的错误处理一致）
+def parse_rows(file_name, lines):
+    result = []
+    for r in lines:
+        words = r.split()
+        if (len(words) == 0):
+            continue
+        if (len(words) != 6):
+            print("错误：在{}中为一个点提供的数据不足".format(file_name))
+            words = [0, 0, 0, 0, 0, 0]
+        result.append([float(v) for v in words])
+    return np.array(result, dtype=np.float64).reshape(-1, 6)
+
+# 分块读取.ply文件的顶点，每次产生一个不超过chunk_size个点的PointCloud
+# 文件中没有法线时产生的点云法线为零（在下采样之后再用estimate_normals估计）
+def stream_ply(file_name, chunk_size=1000000):
+    with open(file_name, "rb") as f:
+        format, elements, offset = read_header(f)
+        if (format is None):
+            return
+        if (format not in ("ascii", "binary_little_endian", "binary_big_endian")):
+            print("错误：不支持的PLY格式：" + format)
+            return
+
+        for name, count, properties in elements:
+            if (name != "vertex"):
+                if (not skip_element(f, format, count, properties)):
+                    return
+                continue
+
+            for start in range(0, count, chunk_size):
+                n = min(chunk_size, count - start)
+                if (format == "ascii" or any(type(t) == tuple for p, t in properties)):
+                    vertices = read_element(f, format, n, properties)
+                else:
+                    order = "<" if (format == "binary_little_endian") else ">"
+                    dtype = np.dtype([(p, order + PLY_TYPES[t]) for p, t in properties])
+                    data = np.frombuffer(f.read(dtype.itemsize * n), dtype=dtype, count=n)
+                    vertices = dict((p, data[p]) for p, t in properties)
+                positions = np.stack((vertices["x"], vertices["y"], vertices["z"]), axis=1)
+                normals = None
+                if (all(p in vertices for p in ("nx", "ny", "nz"))):
+                    normals = np.stack((vertices["nx"], vertices["ny"], vertices["nz"]), axis=1)
+                yield PointCloud(positions, normals)
+            return
+    print("错误：PLY文件中没有vertex元素：" + file_name)
+
+# 按扩展名选择分块读取函数
+def stream_cloud(file_name, chunk_size=1000000):
+    if (file_name.lower().endswith('.ply')):
+        return stream_ply(file_name, chunk_size)
+    return stream_pts(file_name, chunk_size)
+
+# 边读取边体素下采样：只保存每个体素的坐标、位置和法线之和以及点数，内存与体素数成正比
+# 每一块先在块内合并到自己的体素，再通过以体素坐标为键的字典合并到已有的体素中，
+# 每块的开销只与块的大小有关，不会随已有的体素数增长（不再每块都对全部体素重新排序）
+# 结果与对整个点云调用PointCloud.voxel_downsample相同（求和顺序不同，只有舍入误差的差别）
+class VoxelAccumulator:
+    def __init__(self, voxel_size):
+        if (voxel_size <= 0):
+            print("错误：体素大小必须是正数")
+            voxel_size = 1.0
+        self.voxel_size = voxel_size
+        self.slots = {}  # 体素坐标（3个int64的字节串）-> 在下面数组中的序号
+        self.size = 0  # 已有的体素数；数组的容量按需要成倍增大
+        self.keys = np.zeros((0, 3), dtype=np.int64)
+        self.positions = np.zeros((0, 3))
+        self.normals = np.zeros((0, 3))
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    # 保证数组至少能容纳n个体素
+    def reserve(self, n):
+        if (n <= len(self.counts)):
+            return
+        capacity = max(n, 2 * len(self.counts), 1024)
+        self.keys = np.concatenate((self.keys, np.zeros((capacity - len(self.keys), 3), dtype=np.int64)))
+        self.positions = np.concatenate((self.positions, np.zeros((capacity - len(self.positions), 3))))
+        self.normals = np.concatenate((self.normals, np.zeros((capacity - len(self.normals), 3))))
+        self.counts = np.concatenate((self.counts, np.zeros(capacity - len(self.counts), dtype=np.int64)))
+
+    # 将一块点合并到已有的体素中
+    def add(self, cloud):
+        if (len(cloud) == 0):
+            return
+        # 块内合并
+        keys = np.floor(cloud.positions / self.voxel_size).astype(np.int64)
+        keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        positions = np.zeros((len(keys), 3))
+        normals = np.zeros((len(keys), 3))
+        np.add.at(positions, inverse, cloud.positions)
+        np.add.at(normals, inverse, cloud.normals)
+        counts = np.bincount(inverse, minlength=len(keys))
+
+        # 查找每个体素的序号，新的体素排在已有的体素之后；块内的体素互不相同，可以直接按序号累加
+        slots = self.slots
+        ids = np.ascontiguousarray(keys).view("V24").ravel().tolist()
+        slot = np.array([slots.setdefault(k, len(slots)) for k in ids], dtype=np.int64)
+        self.reserve(len(slots))
+        self.keys[slot] = keys
+        self.positions[slot] += positions
+        self.normals[slot] += normals
+        self.counts[slot] += counts
+        self.size = len(slots)
+
+    # 返回下采样的点云：位置取平均值，法线取平均值后重新归一化；体素按坐标排序（与voxel_downsample的顺序相同）
+    def result(self):
+        keys = self.keys[:self.size]
+        order = np.lexsort((keys[:, 2], keys[:, 1], keys[:, 0]))
+        positions = self.positions[order] / np.maximum(self.counts[order], 1)[:, None]
+        normals = self.normals[order]
+        length = np.linalg.norm(normals, axis=1)
+        length[length == 0.0] = 1.0
+        return PointCloud(positions, normals / length[:, None])
+
+# 边读取边蓄水池采样：从未知总数的点流中等概率地保留size个点
+class ReservoirSampler:
+    def __init__(self, size, rng=None):
+        self.size = size
+        self.rng = np.random.default_rng() if (rng is None) else rng
+        self.positions = np.zeros((0, 3))
+        self.normals = np.zeros((0, 3))
+        self.seen = 0
+
+    def add(self, cloud):
+        # 蓄水池还没有满时直接放入
+        fill = min(len(cloud), self.size - len(self.positions))
+        if (fill > 0):
+            self.positions = np.concatenate((self.positions, cloud.positions[:fill]))
+            self.normals = np.concatenate((self.normals, cloud.normals[:fill]))
+        rest = np.arange(fill, len(cloud))
+
+        # 第i个点（从0开始计数）以size/(i+1)的概率替换蓄水池中随机的一个点
+        slots = self.rng.integers(0, self.seen + rest + 1)
+        keep = slots < self.size
+        rest, slots = rest[keep], slots[keep]
+
+        # 同一个位置被替换多次时只有最后一次有效
+        slots, last = np.unique(slots[::-1], return_index=True)
+        rest = rest[::-1][last]
+        self.positions[slots] = cloud.positions[rest]
+        self.normals[slots] = cloud.normals[rest]
+        self.seen += len(cloud)
+
+    def result(self):
+        return PointCloud(self.positions, self.normals)
+
+# 流式加载点云：voxel_size给定时边读取边体素下采样，sample_size给定时边读取边蓄水池采样，
+# 两者都没有给出时读取全部点；文件中没有法线时在最后的点云上估计法线
+def load_streaming(file_name, voxel_size=None, sample_size=None, chunk_size=1000000, rng=None):
+    if (voxel_size is not None):
+        reducer = VoxelAccumulator(voxel_size)
+    elif (sample_size is not None):
+        reducer = ReservoirSampler(sample_size, rng)
+    else:
+        reducer = None
+
+    chunks = []
+    for chunk in stream_cloud(file_name, chunk_size):
+        if (reducer is not None):
+            reducer.add(chunk)
+        else:
+            chunks.append(chunk)
+
+    if (reducer is not None):
+        cloud = reducer.result()
+    elif (len(chunks) > 0):
+        cloud = PointCloud(np.concatenate([c.positions for c in chunks]), np.concatenate([c.normals for c in chunks]))
+    else:
+        cloud = PointCloud(np.zeros((0, 3)))
+
+    if (len(cloud) > 0 and not np.any(cloud.normals)):
+        cloud.normals = estimate_normals(cloud.positions, NORMAL_NEIGHBORS, NORMAL_RADIUS)
+    return cloud
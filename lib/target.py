@@ -0,0 +1,54 @@
+# 项目：点云配准
+#
+# 文件：target.py
+# 简介：准备好的配准目标：目标点云、它的KdTree、法线以及变换M2和M2的逆
+#       构建一次之后可以在同一个进程中被多次配准复用，也可以保存到磁盘后重新加载
+
+import os
+import numpy as np
+from .pointcloud import PointCloud
+from .kdtree import ArrayKdTree
+
+# 准备好的配准目标
+class PreparedTarget:
+    # 构造函数接受目标点云、可选的4x4变换M2（默认为单位矩阵）和可选的已构建的KdTree
+    def __init__(self, cloud, transform=None, kdtree=None, name=""):
+        self.cloud = cloud
+        self.name = name
+        self.set_transform(np.identity(4) if (transform is None) else transform)
+        self.kdtree = ArrayKdTree(cloud.positions) if (kdtree is None) else kdtree
+
+    # 更新目标的变换M2（例如目标本身在链式配准中被重新对齐之后），同时更新它的逆
+    def set_transform(self, transform):
+        self.transform = np.matrix(transform, dtype=np.float64)
+        self.inverse = self.transform.I
+
+    # 保存到磁盘（.npz）：点云、法线、变换和KdTree的全部数组
+    def save(self, file_name):
+        dir = os.path.dirname(file_name)
+        if (dir and not os.path.exists(dir)):
+            os.makedirs(dir)
+
+        arrays = dict(("kdtree_" + k, v) for k, v in self.kdtree.to_arrays().items())
+        arrays["positions"] = self.cloud.positions
+        arrays["normals"] = self.cloud.normals
+        arrays["transform"] = np.asarray(self.transform)
+        arrays["name"] = np.array(self.name)
+
+        # 使用文件对象写入，避免np.savez自动追加扩展名；先写临时文件再原子地替换
+        tmp_name = "{}.{}.tmp".format(file_name, os.getpid())
+        with open(tmp_name, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_name, file_name)
+        return
+
+    # 从磁盘加载；KdTree直接由保存的数组恢复，不需要重新构建
+    @staticmethod
+    def load(file_name):
+        with np.load(file_name) as data:
+            cloud = PointCloud(data["positions"], data["normals"])
+            tree = ArrayKdTree.from_arrays(dict((k[len("kdtree_"):], data[k]) for k in data.files
+                                                if k.startswith("kdtree_")))
+            transform = data["transform"]
+            name = str(data["name"])
+        return PreparedTarget(cloud, transform, tree, name)
@@ -0,0 +1,50 @@
+# 项目：点云配准
+#
+# 文件：testconvergence.py
+# 简介：一个简单的脚本，用于测试convergence.py中的收敛控制器
+
+import numpy as np
+from .convergence import ConvergenceController, transform_delta
+
+# 绕z轴旋转angle弧度并平移shift的变换
+def motion(angle, shift):
+    c, s = np.cos(angle), np.sin(angle)
+    return np.matrix([[c, -s, 0.0, shift], [s, c, 0.0, 0.0], [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]])
+
+angle, shift = transform_delta(motion(0.01, 0.002))
+assert (abs(angle - 0.01) < 1e-9 and abs(shift - 0.002) < 1e-12)
+
+# 默认条件：与原来的循环相同，改进小于tolerance或达到最大迭代次数时终止
+c = ConvergenceController(max_iterations=3, tolerance=0.01)
+assert (c.update(motion(0.1, 0.1), 1.0, 0.5) and c.update(motion(0.1, 0.1), 0.5, 0.25))
+assert (not c.update(motion(0.1, 0.1), 0.25, 0.125) and c.reason == "达到最大迭代次数")
+c.reset()
+assert (c.running and not c.update(motion(0.1, 0.1), 1.0, 0.995))
+assert (not ConvergenceController().update(np.identity(4), 1.0, 1.5))  # 没有改进
+print("通过默认条件测试")
+
+# 增量变换的阈值：旋转和平移都小于阈值时终止
+c = ConvergenceController(rotation_tolerance=1e-3, translation_tolerance=1e-4)
+assert (c.update(motion(1e-2, 1e-5), 1.0, 0.5))
+assert (c.update(motion(1e-4, 1e-3), 0.5, 0.25))
+assert (not c.update(motion(1e-4, 1e-5), 0.25, 0.125))
+print("通过增量变换测试")
+
+# 平台期：最近3次迭代的总改进小于10%时终止（每次迭代的改进都大于tolerance）
+c = ConvergenceController(plateau_window=3, plateau_tolerance=0.1)
+assert (c.update(np.identity(4), 1.0, 0.5) and c.update(np.identity(4), 0.5, 0.49))
+assert (c.update(np.identity(4), 0.49, 0.48))
+assert (not c.update(np.identity(4), 0.48, 0.47))
+print("通过平台期测试")
+
+# 自适应采样：收敛之后先把采样点数翻倍，达到sample_size之后才终止
+c = ConvergenceController(tolerance=0.01, sample_size=1000, min_sample_size=300)
+assert (c.sample_size == 300)
+assert (c.update(np.identity(4), 1.0, 0.999) and c.sample_size == 600)
+assert (c.update(np.identity(4), 1.0, 0.999) and c.sample_size == 1000)
+assert (not c.update(np.identity(4), 1.0, 0.999))
+c.reset()
+assert (c.sample_size == 300)
+print("通过自适应采样测试")
+
+print("通过所有测试")
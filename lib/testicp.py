@@ -0,0 +1,94 @@
+# 项目：点云配准
+#
+# 文件：testicp.py
+# 简介：一个简单的脚本，用于测试icp.py中的ICP配准引擎
+
+import numpy as np
+from .pointcloud import PointCloud
+from .icp import *
+
+# 构建一个不对称的合成曲面 z = 0.02*sin(30x)*cos(20y)，并计算法线
+rng = np.random.default_rng(0)
+xy = rng.uniform(-0.1, 0.1, size=(20000, 2))
+x, y = xy[:, 0], xy[:, 1]
+z = 0.02 * np.sin(30 * x) * np.cos(20 * y)
+dzdx = 0.6 * np.cos(30 * x) * np.cos(20 * y)
+dzdy = -0.4 * np.sin(30 * x) * np.sin(20 * y)
+normals = np.stack((-dzdx, -dzdy, np.ones(len(x))), axis=1)
+normals /= np.linalg.norm(normals, axis=1)[:, None]
+target = PointCloud(np.stack((x, y, z), axis=1), normals)
+
+# 源点云为目标点云经过一个小的刚体变换T的逆得到，正确的M1即为T
+a = 0.05
+T = np.matrix([[np.cos(a), -np.sin(a), 0.0, 0.004], [np.sin(a), np.cos(a), 0.0, -0.003],
+               [0.0, 0.0, 1.0, 0.002], [0.0, 0.0, 0.0, 1.0]])
+source = target.copy().transform(T.I)
+
+# 从单位矩阵开始配准（增量变换使用精确的指数映射，没有噪声的数据上应该精确恢复）
+tol = 1e-6
+engine = ICPRegistration(target, options=ICPOptions(outlier_factor=3.0, seed=1))
+result = engine.register(source)
+assert (np.abs(result.transform - T).max() < tol)  # 测试恢复出正确的变换
+assert (result.iterations > 0 and result.mean_distance < 1e-4)
+print("通过基本测试")
+
+# 数组形式的输入，以及目标位姿M2：目标点云在M2下，源点云应对齐到M2变换后的目标
+M2 = np.matrix([[1.0, 0.0, 0.0, 0.5], [0.0, 1.0, 0.0, 0.0], [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]])
+engine = ICPRegistration(target.positions, target.normals, ICPOptions(outlier_factor=3.0, seed=1))
+result = engine.register(source.positions, M2, M2)
+assert (np.abs(result.transform - M2 * T).max() < tol)
+print("通过数组输入测试")
+
+# 多分辨率模式和指标记录
+options = ICPOptions(outlier_factor=3.0, pyramid=[0.02, 0.01], seed=1, record_metrics=True)
+result = engine.register(source, options=options, label="synthetic")
+assert (np.abs(result.transform - T).max() < tol)
+assert (len(result.metrics.iterations) == result.iterations)
+assert (result.metrics.summary()["label"] == "synthetic")
+print("通过多分辨率测试")
+
+# 网格和组合空间索引
+for index in ("grid", "hybrid"):
+    result = engine.register(source, options=ICPOptions(outlier_factor=3.0, seed=1, index=index))
+    assert (np.abs(result.transform - T).max() < tol)
+print("通过空间索引测试")
+
+# 收敛控制：增量变换阈值和自适应采样
+options = ICPOptions(outlier_factor=3.0, seed=1, rotation_tolerance=1e-5, translation_tolerance=1e-6, min_sample_size=250)
+result = engine.register(source, options=options)
+assert (np.abs(result.transform - T).max() < tol)
+assert (ICPOptions().controller().plateau_tolerance == ConvergenceController().plateau_tolerance)
+
+# 给定controller时由它决定迭代次数；不给定时为None的参数使用控制器的默认值
+tree = ArrayKdTree(target.positions)
+controller = ConvergenceController(max_iterations=2, tolerance=-np.inf)
+M1, mean, count = icp_align(source, target, tree, np.identity(4), np.identity(4), verbose=False,
+                            rng=np.random.default_rng(1), controller=controller)
+assert (count == 2)
+M1, mean, count = icp_align(source, target, tree, np.identity(4), np.identity(4), max_iterations=3,
+                            tolerance=-np.inf, verbose=False, rng=np.random.default_rng(1))
+assert (count == 3)
+print("通过收敛控制测试")
+
+# 鲁棒核：源点云中混入20%远离曲面的噪声点，每种核函数都应该恢复出正确的变换
+noise = PointCloud(rng.uniform(-0.1, 0.1, size=(5000, 3)), normals[:5000])
+noisy = PointCloud(np.concatenate((source.positions, noise.positions)), np.concatenate((source.normals, noise.normals)))
+for kernel in ("trimmed", "huber", "tukey", "geman_mcclure"):
+    result = engine.register(noisy, options=ICPOptions(seed=1, kernel=kernel))
+    assert (np.abs(result.transform - T).max() < tol)
+print("通过鲁棒核测试")
+
+# 求解器和目标函数：阻尼最小二乘和对称点到平面都精确恢复，更新后的旋转保持正交；
+# 原来的小角度近似的增量不是严格正交的，只要求约1e-3的精度，但累积的旋转同样重新正交化
+for solver in ("gauss_newton", "levenberg_marquardt"):
+    for objective in ("point_to_plane", "symmetric"):
+        options = ICPOptions(outlier_factor=3.0, seed=1, solver=solver, objective=objective)
+        result = engine.register(source, options=options)
+        R = np.asarray(result.transform)[:3, :3]
+        assert (np.abs(result.transform - T).max() < tol and np.abs(R @ R.T - np.identity(3)).max() < 1e-12)
+result = engine.register(source, options=ICPOptions(outlier_factor=3.0, seed=1, solver="small_angle"))
+R = np.asarray(result.transform)[:3, :3]
+assert (np.abs(result.transform - T).max() < 2e-3 and np.abs(R @ R.T - np.identity(3)).max() < 1e-12)
+print("通过求解器测试")
+
+print("通过所有测试")
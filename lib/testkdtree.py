@@ -3,7 +3,7 @@
 # 文件：testkdtree.py
 # 简介：一个简单的脚本，用于测试kdtree.py
 
-from .kdtree import KdTree
+from .kdtree import KdTree, ArrayKdTree
 from .point import Point
 from random import random
 
@@ -53,6 +53,64 @@ for d in range(1, 6):
 
 print("通过一致性测试")
 
+# 基于数组的k-d树：批量查询与暴力查找的一致性
+for d in range(1, 6):
+    coords = [[(random() * 2000.0 - 1000.0) for j in range(d)] for i in range(5000)]
+    t = ArrayKdTree(coords)
+    queries = [[(random() * 2000.0 - 1000.0) for j in range(d)] for i in range(1000)]
+    index, dist = t.nearest_batch(queries)
+    points = [Point(c) for c in coords]
+    for i, q in enumerate(queries):
+        p = Point(q)
+        b = bruteForce_nearest(p, points)
+        assert (abs(dist[i] - p.distSqdTo(b)) <= 1e-9 * max(1.0, dist[i]))  # 测试批量查询与暴力查找的一致性
+        assert (abs(p.distSqdTo(points[index[i]]) - dist[i]) <= 1e-9 * max(1.0, dist[i]))  # 测试返回的下标与距离相符
+
+# 少量点和重复点的情况
+t = ArrayKdTree([[1, 2, 3], [5, -4, 9], [1, 2, 3], [100, -29, 30]])
+index, dist = t.nearest_batch([[99, -28, 37], [1, 2, 3]])
+assert (index[0] == 3 and dist[0] == 51.0)
+assert (dist[1] == 0.0)
+
+print("通过批量查询测试")
+
+# k近邻和半径查询：与排序后的暴力查找结果比较距离
+for dim in range(1, 4):
+    coords = [[(random() * 2000.0 - 1000.0) for j in range(dim)] for i in range(2000)]
+    points = [Point(c) for c in coords]
+    t = KdTree(dim)
+    for p in points:
+        t.insert(p)
+    a = ArrayKdTree(coords)
+    queries = [[(random() * 2400.0 - 1200.0) for j in range(dim)] for i in range(200)]
+    for n in (1, 5, 40):
+        index, dist = a.knn_batch(queries, n)
+        for i, q in enumerate(queries):
+            p = Point(q)
+            b = sorted(p.distSqdTo(c) for c in points)[:n]
+            assert ([p.distSqdTo(c) for c in t.knn(p, n)] == b)  # 测试k近邻与暴力查找的一致性
+            assert (all(abs(x - y) <= 1e-9 * max(1.0, y) for x, y in zip(dist[i], b)))
+            assert (all(abs(p.distSqdTo(points[j]) - x) <= 1e-9 * max(1.0, x) for j, x in zip(index[i], dist[i])))
+    r = 100.0
+    index, dist, offsets = a.radius_batch(queries, r)
+    for i, q in enumerate(queries):
+        p = Point(q)
+        b = sorted(p.distSqdTo(c) for c in points if p.distSqdTo(c) <= r * r)
+        assert ([p.distSqdTo(c) for c in t.radius(p, r)] == b)  # 测试半径查询与暴力查找的一致性
+        assert (offsets[i + 1] - offsets[i] == len(b))
+        assert (sorted(index[offsets[i]:offsets[i + 1]]) == sorted(set(index[offsets[i]:offsets[i + 1]])))
+
+# 点数少于k的情况，以及重复点
+t = KdTree()
+for c in [[1, 2, 3], [5, -4, 9], [1, 2, 3]]:
+    t.insert(Point(c))
+assert (len(t.knn(Point([0, 0, 0]), 5)) == 3)
+index, dist = ArrayKdTree([[1, 2, 3], [5, -4, 9], [1, 2, 3]]).knn_batch([[0, 0, 0]], 5)
+assert (sorted(index[0][:3]) == [0, 1, 2] and list(index[0][3:]) == [-1, -1])
+assert (dist[0][0] == dist[0][1] == 14.0)
+
+print("通过k近邻和半径查询测试")
+
 # 压力测试
 t = KdTree(5)
 points = []
@@ -0,0 +1,74 @@
+# 项目：点云配准
+#
+# 文件：testmodel.py
+# 简介：一个简单的脚本，用于测试model.py中增量配准的合并模型
+
+import os
+import tempfile
+import numpy as np
+from .pointcloud import PointCloud
+from .model import AlignedModel
+from .icp import ICPOptions
+
+# 暴力搜索最近邻，作为对照
+def brute_nearest(points, queries):
+    dist = ((queries[:, None, :] - points[None, :, :]) ** 2).sum(axis=2)
+    return dist.argmin(axis=1), dist.min(axis=1)
+
+rng = np.random.default_rng(0)
+
+# 逐段插入后的索引与整个模型上的暴力搜索结果相同；各段的点数从前往后递减
+model = AlignedModel()
+for n in (1000, 300, 200, 500, 50, 3000):
+    positions = rng.uniform(-1, 1, size=(n, 3))
+    model.insert(positions, np.zeros((n, 3)))
+    sizes = [tree.size for start, tree in model.blocks]
+    assert (sizes == sorted(sizes, reverse=True) and sum(sizes) == len(model))
+    assert ([start for start, tree in model.blocks] == list(np.cumsum([0] + sizes[:-1])))
+queries = rng.uniform(-1.2, 1.2, size=(500, 3))
+index, dist = model.nearest_batch(queries)
+expected_index, expected_dist = brute_nearest(model.cloud.positions, queries)
+assert (np.allclose(dist, expected_dist))
+assert (np.allclose(model.cloud.positions[index], model.cloud.positions[expected_index]))
+
+# 与testicp.py相同的合成曲面，沿x方向分成重叠的三块，逐个配准到模型；
+# 去除重叠区域的重复点后模型的点数少于曲面的点数
+xy = rng.uniform(-0.1, 0.1, size=(20000, 2))
+x, y = xy[:, 0], xy[:, 1]
+z = 0.02 * np.sin(30 * x) * np.cos(20 * y)
+dzdx = 0.6 * np.cos(30 * x) * np.cos(20 * y)
+dzdy = -0.4 * np.sin(30 * x) * np.sin(20 * y)
+normals = np.stack((-dzdx, -dzdy, np.ones(len(x))), axis=1)
+normals /= np.linalg.norm(normals, axis=1)[:, None]
+surface = PointCloud(np.stack((x, y, z), axis=1), normals)
+parts = [x < 0.0, (x > -0.04) & (x < 0.06), x > 0.02]
+
+# 每一块在自己的坐标系中偏离真实位置一个小的刚体变换T的逆，正确的位姿即为T
+a = 0.05
+T = np.matrix([[np.cos(a), -np.sin(a), 0.0, 0.004], [np.sin(a), np.cos(a), 0.0, -0.003],
+               [0.0, 0.0, 1.0, 0.002], [0.0, 0.0, 0.0, 1.0]])
+
+model = AlignedModel(merge_distance=0.001)
+options = ICPOptions(outlier_factor=3.0, seed=1)
+assert (model.register("a", surface.subset(parts[0])) is None)
+for name, part in zip(("b", "c"), parts[1:]):
+    result = model.register(name, surface.subset(part).transform(T.I), options=options)
+    assert (np.abs(model.transforms[name] - T).max() < 2e-3)
+    assert (np.array_equal(model.transforms[name], result.transform))
+assert (model.names == ["a", "b", "c"] and "b" in model and "d" not in model)
+assert (len(model) < len(surface))
+begin, end = model.ranges["b"]
+assert (0 < end - begin < np.count_nonzero(parts[1]))
+
+# 保存后加载，点、位姿和索引的查询结果都应该相同，而且不残留临时文件
+with tempfile.TemporaryDirectory() as tmp_dir:
+    file_name = os.path.join(tmp_dir, "model.npz")
+    model.save(file_name)
+    assert (os.listdir(tmp_dir) == ["model.npz"])
+    loaded = AlignedModel.load(file_name)
+assert (loaded.names == model.names and loaded.ranges == model.ranges and loaded.merge_distance == 0.001)
+assert (all(np.array_equal(loaded.transforms[n], model.transforms[n]) for n in model.names))
+assert (np.array_equal(loaded.cloud.positions, model.cloud.positions))
+assert (np.array_equal(loaded.nearest_batch(queries)[0], model.nearest_batch(queries)[0]))
+
+print("通过所有测试")
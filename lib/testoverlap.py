@@ -0,0 +1,67 @@
+# 项目：点云配准
+#
+# 文件：testoverlap.py
+# 简介：一个简单的脚本，用于测试overlap.py中的重叠区域预筛选和box.py中的批量操作
+
+import numpy as np
+from .point import Point
+from .box import Box
+from .pointcloud import PointCloud
+from .overlap import *
+from .icp import ICPRegistration, ICPOptions
+
+# 盒子的包含、交集和扩大
+box = Box(Point([0.0, 0.0, 0.0]), Point([1.0, 2.0, 3.0]))
+assert (box.contains(Point([0.5, 1.0, 3.0])) and not box.contains(Point([0.5, 2.5, 1.0])))
+rng = np.random.default_rng(0)
+positions = rng.uniform(-1, 4, size=(1000, 3))
+assert (np.array_equal(box.contains_batch(positions), [box.contains(Point(list(p))) for p in positions]))
+overlap = box.intersection(Box(Point([0.5, -1.0, 1.0]), Point([2.0, 1.0, 2.0])))
+assert (overlap.sMin == [0.5, 0.0, 1.0] and overlap.sMax == [1.0, 1.0, 2.0])
+assert (box.intersection(Box(Point([2.0, 0.0, 0.0]), Point([3.0, 1.0, 1.0]))) is None)
+assert (box.expand(0.5).sMin == [-0.5, -0.5, -0.5] and box.expand(0.5).sMax == [1.5, 2.5, 3.5])
+print("通过盒子测试")
+
+# 变换后的包围盒包含所有变换后的点
+a = 0.3
+M = np.array([[np.cos(a), -np.sin(a), 0.0, 1.0], [np.sin(a), np.cos(a), 0.0, -2.0],
+              [0.0, 0.0, 1.0, 0.5], [0.0, 0.0, 0.0, 1.0]])
+moved = positions @ M[:3, :3].T + M[:3, 3]
+assert (np.all(transform_box(bounding_box(positions), M).contains_batch(moved)))
+
+# 掩码：源点云中落在目标包围盒内的点都被保留，远离目标的点都被剔除
+source = PointCloud(positions, np.tile([0.0, 0.0, 1.0], (len(positions), 1)))
+target = PointCloud(rng.uniform(0, 1, size=(500, 3)) @ M[:3, :3].T + M[:3, 3])
+mask = OverlapFilter(source, target, margin=0.0).mask(source.positions, M)
+assert (np.all(mask[bounding_box(target.positions).contains_batch(moved)]))
+assert (not np.any(mask[np.any(positions < -0.5, axis=1) | np.any(positions > 1.5, axis=1)]))
+far = np.identity(4)
+far[0, 3] = 100.0
+assert (not np.any(OverlapFilter(source, target).mask(source.positions, far)))
+assert (OverlapFilter(source, target, margin=None).mask(source.positions, M) is None)
+
+# 法线兼容：夹角的绝对值不超过最大夹角（朝向相反的法线视为兼容）
+pn = np.array([[0.0, 0.0, 1.0], [0.0, 0.0, 1.0], [0.0, 0.0, 1.0]])
+qn = np.array([[0.0, 0.6, 0.8], [0.0, 0.0, -1.0], [1.0, 0.0, 0.0]])
+assert (list(OverlapFilter(source, target, max_normal_angle=45).compatible(pn, qn)) == [True, True, False])
+assert (np.all(OverlapFilter(source, target).compatible(pn, qn)))
+print("通过重叠区域测试")
+
+# 部分重叠的配准：源点云在目标范围之外多出一块曲面，预筛选后不再对它们查找对应点
+xy = rng.uniform(-0.1, 0.2, size=(30000, 2))
+x, y = xy[:, 0], xy[:, 1]
+z = 0.02 * np.sin(30 * x) * np.cos(20 * y)
+normals = np.stack((-0.6 * np.cos(30 * x) * np.cos(20 * y), 0.4 * np.sin(30 * x) * np.sin(20 * y), np.ones(len(x))), axis=1)
+normals /= np.linalg.norm(normals, axis=1)[:, None]
+surface = PointCloud(np.stack((x, y, z), axis=1), normals)
+target = surface.subset(np.all(xy < 0.1, axis=1))
+a = 0.05
+T = np.matrix([[np.cos(a), -np.sin(a), 0.0, 0.004], [np.sin(a), np.cos(a), 0.0, -0.003],
+               [0.0, 0.0, 1.0, 0.002], [0.0, 0.0, 0.0, 1.0]])
+source = surface.copy().transform(T.I)
+inside = OverlapFilter(source, target, margin=0.01).mask(source.positions, T)
+assert (inside.sum() < 0.6 * len(source))
+engine = ICPRegistration(target)
+result = engine.register(source, options=ICPOptions(outlier_factor=3.0, seed=1, overlap_margin=0.01, max_normal_angle=45))
+assert (np.abs(result.transform - T).max() < 1e-6)
+print("通过所有测试")
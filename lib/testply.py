@@ -0,0 +1,70 @@
+# 项目：点云配准
+#
+# 文件：testply.py
+# 简介：一个简单的脚本，用于测试ply.py中的PLY读取和normals.py中的法线估计
+
+import os
+import tempfile
+import numpy as np
+from .ply import read_ply_vertices, load_ply, NORMAL_NEIGHBORS, NORMAL_RADIUS
+from .normals import estimate_normals
+from .ptscache import load_cached
+
+rng = np.random.default_rng(0)
+positions = rng.uniform(-1, 1, size=(500, 3)).astype(np.float32)
+
+# 写入一个PLY文件：vertex元素之前有一个含列表属性的元素，用于测试跳过
+def write_ply(file_name, format):
+    header = ("ply\nformat {} 1.0\ncomment test\nelement face 2\nproperty list uchar int vertex_indices\n"
+              "element vertex {}\nproperty float x\nproperty float y\nproperty float z\nproperty uchar flag\n"
+              "end_header\n").format(format, len(positions))
+    with open(file_name, "wb") as f:
+        f.write(header.encode("ascii"))
+        if (format == "ascii"):
+            f.write(b"3 0 1 2\n4 0 1 2 3\n")
+            for p in positions:
+                f.write("{} {} {} 1\n".format(*[repr(float(v)) for v in p]).encode("ascii"))
+            return
+        order = "<" if (format == "binary_little_endian") else ">"
+        for face in ([0, 1, 2], [0, 1, 2, 3]):
+            f.write(np.array([len(face)], dtype="u1").tobytes() + np.array(face, dtype=order + "i4").tobytes())
+        data = np.zeros(len(positions), dtype=[("x", order + "f4"), ("y", order + "f4"), ("z", order + "f4"),
+                                               ("flag", "u1")])
+        data["x"], data["y"], data["z"] = positions.T
+        data["flag"] = 1
+        f.write(data.tobytes())
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    for format in ("ascii", "binary_little_endian", "binary_big_endian"):
+        file_name = os.path.join(tmp_dir, format + ".ply")
+        write_ply(file_name, format)
+        vertices = read_ply_vertices(file_name)
+        assert (np.array_equal(np.stack((vertices["x"], vertices["y"], vertices["z"]), axis=1), positions))
+        assert (np.all(vertices["flag"] == 1))
+        cloud = load_ply(file_name)
+        assert (len(cloud) == len(positions))
+        assert (np.allclose(np.linalg.norm(cloud.normals, axis=1), 1.0))
+
+    # 直接加载和通过缓存加载.ply文件使用相同的法线估计参数（与PLY_PTS.py转换时相同）
+    expected = estimate_normals(positions.astype(np.float64), NORMAL_NEIGHBORS, NORMAL_RADIUS)
+    assert (np.allclose(load_ply(file_name).normals, expected))
+    assert (np.allclose(load_cached(file_name).normals, expected))
+
+print("通过PLY读取测试")
+
+# 平面z=0.1x-0.2y上的点：法线应该与平面的法线平行，并朝向给定的视点
+xy = rng.uniform(-1, 1, size=(2000, 2))
+plane = np.stack((xy[:, 0], xy[:, 1], 0.1 * xy[:, 0] - 0.2 * xy[:, 1]), axis=1)
+expected = np.array([-0.1, 0.2, 1.0]) / np.linalg.norm([-0.1, 0.2, 1.0])
+normals = estimate_normals(plane, k=10, viewpoint=[0.0, 0.0, 10.0])
+assert (np.allclose(normals, expected))
+
+# 球面上的点：法线应该沿径向（朝向球心时取反）
+sphere = rng.normal(size=(5000, 3))
+sphere /= np.linalg.norm(sphere, axis=1)[:, None]
+normals = estimate_normals(sphere, k=10, radius=0.2, viewpoint=[0.0, 0.0, 0.0])
+assert (np.all((normals * -sphere).sum(axis=1) > 0.99))
+
+print("通过法线估计测试")
+
+print("通过所有测试")
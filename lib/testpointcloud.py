@@ -0,0 +1,37 @@
+# 项目：点云配准
+#
+# 文件：testpointcloud.py
+# 简介：一个简单的脚本，用于测试pointcloud.py
+
+import numpy as np
+from .pointcloud import PointCloud
+from .point import Point
+from random import random
+
+# 构建随机点云和随机刚体变换
+points = [Point([random() for j in range(3)], [0.0, 0.0, 1.0]) for i in range(100)]
+cloud = PointCloud.from_points(points)
+assert (len(cloud) == 100)
+
+c, s = np.cos(0.3), np.sin(0.3)
+M = np.matrix([[c, -s, 0.0, 0.1], [s, c, 0.0, -0.2], [0.0, 0.0, 1.0, 0.3], [0.0, 0.0, 0.0, 1.0]])
+
+# 批量变换与逐点变换的一致性
+moved = cloud.copy().transform(M)
+for i in range(len(points)):
+    p = points[i].copy().transform(M)
+    assert (np.allclose(moved.positions[i], p.s))  # 测试位置与Point.transform一致
+assert (np.allclose(moved.normals, [0.0, 0.0, 1.0]))  # 绕z轴旋转不改变法线
+assert (np.allclose(cloud.positions, [p.s for p in points]))  # copy之后原点云不变
+
+# 子集
+sub = cloud.subset([3, 1, 4])
+assert (len(sub) == 3)
+assert (np.allclose(sub.positions[1], points[1].s))
+assert (np.allclose(cloud.subset(np.arange(100) < 10).positions, cloud.positions[:10]))
+
+# 往返转换
+back = cloud.to_points()
+assert (back[7].s == cloud.positions[7].tolist())
+
+print("通过所有测试")
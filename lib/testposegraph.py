@@ -0,0 +1,64 @@
+# 项目：点云配准
+#
+# 文件：testposegraph.py
+# 简介：一个简单的脚本，用于测试posegraph.py中的位姿图优化
+
+import numpy as np
+from .pointcloud import PointCloud
+from .kdtree import ArrayKdTree
+from .posegraph import *
+
+rng = np.random.default_rng(0)
+
+# 旋转向量与旋转矩阵、6维向量与4x4变换互为逆运算（包括接近0度和180度的情况）
+for w in (np.array([0.3, -0.2, 0.5]), np.array([1e-10, 0.0, 0.0]), np.array([0.0, np.pi - 1e-7, 0.0])):
+    assert (np.allclose(rotation_vector(rotation_matrix(w)), w, atol=1e-6))
+x = np.array([0.1, 0.2, -0.3, 1.0, -2.0, 0.5])
+assert (np.allclose(pose_to_vector(pose_from_vector(x)), x))
+
+# 伴随矩阵：M * exp(x) * M^-1 与 exp(adjoint(M) x) 在一阶上相同
+M = pose_from_vector(np.array([0.4, -0.1, 0.2, 0.3, 0.1, -0.2]))
+x = 1e-6 * np.array([1.0, -2.0, 0.5, 3.0, 1.0, -1.0])
+assert (np.allclose(pose_to_vector(M @ pose_from_vector(x) @ np.linalg.inv(M)), adjoint(M) @ x, atol=1e-11))
+
+# 一圈5个扫描，真实位姿已知；两两配准的结果带有噪声，沿链累积的误差由闭环边消除
+truth = [np.matrix(pose_from_vector(np.array([0.0, 0.0, 2 * np.pi * i / 5, np.cos(2 * np.pi * i / 5),
+                                              np.sin(2 * np.pi * i / 5), 0.0]))) for i in range(5)]
+names = ["s{}".format(i) for i in range(5)]
+edges = [(i, i - 1) for i in range(1, 5)] + [(0, 4)]
+noise = [np.matrix(pose_from_vector(rng.normal(scale=0.01, size=6))) for e in edges]
+
+# 没有噪声时，从链式位姿出发应该精确恢复真实位姿
+graph = PoseGraph()
+for i, name in enumerate(names):
+    graph.add_node(name, truth[i] * np.matrix(pose_from_vector(rng.normal(scale=0.05, size=6))), fixed=(i == 0))
+graph.poses["s0"] = truth[0]
+for i, j in edges:
+    graph.add_edge(PoseEdge(names[i], names[j], truth[j].I * truth[i], loop_closure=(i == 0)))
+count, initial, final = graph.optimize(verbose=False)
+assert (final < 1e-16 and final < initial)
+assert (all(np.allclose(graph.poses[name], truth[i], atol=1e-8) for i, name in enumerate(names)))
+
+# 有噪声时，联合优化后的最大位姿误差小于沿链累积的误差
+graph = PoseGraph()
+chain = [truth[0]]
+for k, (i, j) in enumerate(edges[:4]):
+    chain.append(chain[-1] * noise[k] * truth[j].I * truth[i])
+for i, name in enumerate(names):
+    graph.add_node(name, chain[i], fixed=(i == 0))
+for k, (i, j) in enumerate(edges):
+    graph.add_edge(PoseEdge(names[i], names[j], noise[k] * truth[j].I * truth[i]))
+before = max(np.abs(graph.poses[name] - truth[i]).max() for i, name in enumerate(names))
+count, initial, final = graph.optimize(verbose=False)
+after = max(np.abs(graph.poses[name] - truth[i]).max() for i, name in enumerate(names))
+assert (final < initial and after < before)
+print("通过位姿图测试")
+
+# 信息矩阵：平面只约束法线方向的平移和两个倾斜方向的旋转，其余方向的信息为零
+xy = rng.uniform(-1, 1, size=(2000, 2))
+plane = PointCloud(np.column_stack((xy, np.zeros(len(xy)))), np.tile([0.0, 0.0, 1.0], (len(xy), 1)))
+information = edge_information(plane, plane, ArrayKdTree(plane.positions), np.identity(4))
+eigen = np.linalg.eigvalsh(information)
+assert (np.count_nonzero(eigen > 1e-6 * eigen.max()) == 3)
+assert (information[5, 5] > 0 and information[3, 3] == 0 and information[2, 2] == 0)
+print("通过信息矩阵测试")
@@ -0,0 +1,44 @@
+# 项目：点云配准
+#
+# 文件：testptscache.py
+# 简介：一个简单的脚本，用于测试ptscache.py
+
+import os
+import tempfile
+import numpy as np
+from .ptscache import *
+from .utils import load_cloud
+
+# 写入一个小的.pts文件
+tmp_dir = tempfile.mkdtemp()
+source = os.path.join(tmp_dir, "scan.pts")
+data = np.random.rand(500, 6)
+with open(source, "w") as f:
+    for row in data:
+        f.write(' '.join(map(repr, row.tolist())) + '\n')
+
+# 第一次加载：解析文本并写入缓存
+assert (open_cache(cache_path(source), source) is None)
+cloud = load_cached(source)
+assert (os.path.isfile(cache_path(source)))
+assert (np.array_equal(cloud.positions, data[:, 0:3]))
+assert (np.array_equal(cloud.normals, data[:, 3:6]))
+assert (not cloud.positions.flags.owndata and not cloud.positions.flags.writeable)  # 测试缓存以只读内存映射方式打开
+
+# 第二次加载：直接使用缓存
+cloud = open_cache(cache_path(source), source)
+assert (cloud is not None and np.array_equal(cloud.positions, load_cloud(source).positions))
+
+# 修改源文件后缓存应视为过期
+with open(source, "a") as f:
+    f.write(' '.join(map(repr, np.random.rand(6).tolist())) + '\n')
+assert (open_cache(cache_path(source), source) is None)
+cloud = load_cached(source)
+assert (len(cloud) == 501)
+
+# float32缓存
+write_cache(cache_path(source), cloud, source, np.float32)
+cloud32 = open_cache(cache_path(source), source)
+assert (np.allclose(cloud32.positions, cloud.positions, atol=1e-6))
+
+print("通过所有测试")
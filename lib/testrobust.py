@@ -0,0 +1,31 @@
+# 项目：点云配准
+#
+# 文件：testrobust.py
+# 简介：一个简单的脚本，用于测试robust.py中鲁棒核函数的权重
+
+import numpy as np
+from .robust import *
+
+rng = np.random.default_rng(0)
+r = np.concatenate((rng.normal(scale=1e-4, size=900), rng.uniform(-0.01, 0.01, size=100)))
+scale = robust_scale(r)
+assert (5e-5 < scale < 2e-4)  # MAD只由内点决定，不受10%的离群点影响
+
+for kernel in KERNELS:
+    w = kernel_weights(r, kernel)
+    assert (w.shape == r.shape and np.all(w >= 0) and np.all(w <= 1))
+    # 权重随残差的绝对值单调不增
+    order = np.argsort(np.abs(r))
+    assert (np.all(np.diff(w[order]) <= 1e-12))
+    # 残差的尺度不影响权重
+    assert (np.allclose(kernel_weights(r * 1000, kernel), w))
+
+# 截尾核保留给定比例的点对；Tukey核完全剔除远处的点对；Huber核在阈值以内权重为1
+assert (np.count_nonzero(kernel_weights(r, "trimmed", 0.9)) == 900)
+assert (np.all(kernel_weights(r, "tukey")[np.abs(r) > 4.685 * scale] == 0))
+assert (np.all(kernel_weights(r, "huber")[np.abs(r) <= 1.345 * scale] == 1))
+assert (kernel_weights(np.array([0.0]), "geman_mcclure")[0] == 1.0)
+
+# 未知的核函数使用huber
+assert (RobustKernel("unknown").kernel == "huber")
+print("通过所有测试")
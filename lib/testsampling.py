@@ -0,0 +1,73 @@
+# 项目：点云配准
+#
+# 文件：testsampling.py
+# 简介：一个简单的脚本，用于测试sampling.py中的采样策略
+
+import numpy as np
+from .pointcloud import PointCloud
+from .sampling import *
+from .icp import ICPRegistration, ICPOptions
+
+# 一个以平面为主的合成曲面：两个小的高斯凸起只占约3%的点，平面内的平移和绕z轴的旋转只由凸起约束
+rng = np.random.default_rng(0)
+xy = rng.uniform(-0.1, 0.1, size=(40000, 2))
+x, y = xy[:, 0], xy[:, 1]
+z = np.zeros(len(x))
+gradient = np.zeros((len(x), 2))
+for cx, cy in ((0.03, 0.02), (-0.05, -0.04)):
+    bump = 0.01 * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2 * 0.005 ** 2))
+    z += bump
+    gradient -= bump[:, None] * np.stack((x - cx, y - cy), axis=1) / 0.005 ** 2
+normals = np.hstack((-gradient, np.ones((len(x), 1))))
+normals /= np.linalg.norm(normals, axis=1)[:, None]
+cloud = PointCloud(np.stack((x, y, z), axis=1), normals)
+bumps = normals[:, 2] < 0.99
+
+# 均匀采样：每次返回n个不同的点，连续的采样在一轮之内互不重复
+sampler = build_sampler(cloud, "uniform", np.random.default_rng(1))
+first, second = sampler.sample(1000), sampler.sample(1000)
+assert (len(np.unique(first)) == 1000 and len(np.intersect1d(first, second)) == 0)
+assert (len(sampler.sample(10 ** 6)) == len(cloud))
+print("通过均匀采样测试")
+
+# 法线分桶：n和-n在同一个桶中；采样点在各个桶之间平均分配，凸起上的点所占比例远高于它们在点云中的比例
+assert (np.array_equal(normal_buckets(normals), normal_buckets(-normals)))
+sampler = build_sampler(cloud, "normal_space", np.random.default_rng(1))
+quota = sampler.quotas(1000)
+assert (quota.sum() == 1000 and np.all(quota <= sampler.sizes))
+assert (quota.max() - quota[quota < sampler.sizes].min() <= 1)
+index = sampler.sample(1000)
+assert (len(np.unique(index)) == 1000 and bumps[index].mean() > 10 * bumps.mean())
+print("通过法线空间采样测试")
+
+# 协方差采样：杠杆值之和等于未知数的个数，采样得到的线性方程组在最弱的方向上的约束比均匀采样强
+h = leverage(cloud.positions, cloud.normals)
+assert (abs(h.sum() - 6.0) < 1e-6)
+def weakest(index):
+    p, n = cloud.positions[index], cloud.normals[index]
+    A = np.hstack((np.cross(p - cloud.positions.mean(axis=0), n), n))
+    return np.linalg.eigvalsh(A.T @ A)[0] / len(index)
+uniform = build_sampler(cloud, "uniform", np.random.default_rng(1)).sample(300)
+stable = build_sampler(cloud, "covariance", np.random.default_rng(1)).sample(300)
+assert (len(np.unique(stable)) == 300 and weakest(stable) > 5 * weakest(uniform))
+print("通过协方差采样测试")
+
+# 掩码：只返回掩码中的点；未知的采样方法使用uniform
+mask = cloud.positions[:, 0] < -0.05
+for kind in SAMPLERS:
+    index = sample_masked(build_sampler(cloud, kind, np.random.default_rng(1)), 500, mask)
+    assert (len(index) == 500 and np.all(mask[index]))
+assert (isinstance(build_sampler(cloud, "random"), UniformSampler))
+
+# 配准：只用300个采样点时，均匀采样常常只采到平面上的点而停在错误的位置，
+# 法线空间采样和协方差采样都能精确恢复变换
+a = 0.01
+T = np.matrix([[np.cos(a), -np.sin(a), 0.0, 0.002], [np.sin(a), np.cos(a), 0.0, -0.0015],
+               [0.0, 0.0, 1.0, 0.001], [0.0, 0.0, 0.0, 1.0]])
+source = cloud.copy().transform(T.I)
+engine = ICPRegistration(cloud)
+for kind in ("normal_space", "covariance"):
+    for seed in range(4):
+        result = engine.register(source, options=ICPOptions(300, outlier_factor=3.0, seed=seed, sampling=kind))
+        assert (np.abs(result.transform - T).max() < 1e-6)
+print("通过所有测试")
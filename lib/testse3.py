@@ -0,0 +1,64 @@
+# 项目：点云配准
+#
+# 文件：testse3.py
+# 简介：一个简单的脚本，用于测试se3.py中的指数映射、正交化和增量变换求解器
+
+import numpy as np
+from .se3 import *
+
+rng = np.random.default_rng(0)
+
+# 指数映射和对数映射互为逆运算，得到的旋转是严格正交的
+for x in (np.array([0.3, -0.2, 0.5, 1.0, -2.0, 0.5]), np.array([1e-10, 0.0, 0.0, 0.1, 0.2, 0.3]), np.zeros(6)):
+    M = exp_map(x)
+    assert (np.allclose(log_map(M), x, atol=1e-9))
+    assert (np.abs(M[:3, :3] @ M[:3, :3].T - np.identity(3)).max() < 1e-14)
+
+# 指数映射与矩阵指数一致（用泰勒级数计算）
+x = np.array([0.2, 0.1, -0.3, 0.5, -0.1, 0.2])
+X = np.zeros((4, 4))
+X[:3, :3] = skew(x[:3])
+X[:3, 3] = x[3:]
+expected, term = np.identity(4), np.identity(4)
+for k in range(1, 30):
+    term = term @ X / k
+    expected += term
+assert (np.allclose(exp_map(x), expected, atol=1e-12))
+
+# 正交化：扰动后的旋转投影回正交矩阵，平移不变
+M = exp_map(x)
+noisy = M + np.pad(rng.normal(scale=1e-4, size=(3, 3)), ((0, 1), (0, 1)))
+fixed = orthonormalize(noisy)
+assert (np.abs(fixed[:3, :3] @ fixed[:3, :3].T - np.identity(3)).max() < 1e-14 and np.linalg.det(fixed[:3, :3]) > 0)
+assert (np.abs(fixed - M).max() < 1e-3 and np.array_equal(fixed[:3, 3], noisy[:3, 3]))
+
+# 对称目标函数的增量变换：a = tan(θ)·轴，结果是转角为2θ的刚体变换
+M = symmetric_transform(np.array([0.0, 0.0, np.tan(0.1), 0.0, 0.0, 0.0]))
+assert (np.allclose(rotation_vector(M[:3, :3]), [0.0, 0.0, 0.2]))
+
+# 求解器：三个互相垂直的平面上（约束所有6个自由度）没有噪声的对应点，一步恢复出平移
+p, n = [], []
+for axis in range(3):
+    points = rng.uniform(0.1, 1, size=(100, 3))
+    points[:, axis] = 0.0
+    p.append(points)
+    n.append(np.tile(np.identity(3)[axis], (100, 1)))
+p, n = np.vstack(p), np.vstack(n)
+t = np.array([0.01, -0.02, 0.005])
+for method in SOLVERS:
+    for objective in OBJECTIVES:
+        # 阻尼使一步的解略微偏小（约为阻尼系数的比例），因此levenberg_marquardt的精度要求放宽
+        atol = 1e-3 if (method == "levenberg_marquardt") else 1e-12
+        step = IncrementSolver(method, objective).solve(p, n, p + t, n)
+        assert (np.allclose(step[:3, 3], t, atol=atol) and np.allclose(step[:3, :3], np.identity(3), atol=atol))
+
+# 阻尼：拒绝时增大，接受时减小，reset恢复初始值
+solver = IncrementSolver("levenberg_marquardt", damping=1e-3)
+solver.reject()
+assert (np.isclose(solver.damping, 1e-2))
+solver.accept()
+solver.accept()
+assert (np.isclose(solver.damping, 1e-4))
+solver.reset()
+assert (solver.damping == 1e-3 and solver.damped() and not IncrementSolver().damped())
+print("通过所有测试")
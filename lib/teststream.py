@@ -0,0 +1,67 @@
+# 项目：点云配准
+#
+# 文件：teststream.py
+# 简介：一个简单的脚本，用于测试stream.py中的分块读取、体素下采样和蓄水池采样
+
+import os
+import tempfile
+import numpy as np
+from .pointcloud import PointCloud
+from .utils import write_cloud
+from .stream import *
+
+rng = np.random.default_rng(0)
+positions = rng.uniform(-1, 1, size=(10000, 3))
+normals = rng.normal(size=(10000, 3))
+normals /= np.linalg.norm(normals, axis=1)[:, None]
+cloud = PointCloud(positions, normals)
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    file_name = os.path.join(tmp_dir, "test.pts")
+    write_cloud(file_name, cloud)
+
+    # 分块读取的结果拼接起来与原点云相同
+    chunks = list(stream_pts(file_name, chunk_size=3000))
+    assert ([len(c) for c in chunks] == [3000, 3000, 3000, 1000])
+    assert (np.array_equal(np.concatenate([c.positions for c in chunks]), positions))
+    assert (np.array_equal(load_streaming(file_name, chunk_size=3000).normals, normals))
+    print("通过分块读取测试")
+
+    # 边读取边体素下采样与一次性下采样相同
+    streamed = load_streaming(file_name, voxel_size=0.25, chunk_size=777)
+    expected = cloud.voxel_downsample(0.25)
+    assert (len(streamed) == len(expected))
+    assert (np.allclose(streamed.positions, expected.positions) and np.allclose(streamed.normals, expected.normals))
+    print("通过体素下采样测试")
+
+    # 蓄水池采样：保留的点都来自原点云且互不相同
+    sample = load_streaming(file_name, sample_size=500, chunk_size=1234, rng=np.random.default_rng(1))
+    rows = set(map(tuple, positions))
+    assert (len(sample) == 500 and all(tuple(p) in rows for p in sample.positions))
+    assert (len(set(map(tuple, sample.positions))) == 500)
+
+# 许多小块与一整块的体素下采样结果相同（包括点数不是块大小整数倍的最后一块和空块）
+whole = VoxelAccumulator(0.1)
+whole.add(cloud)
+pieces = VoxelAccumulator(0.1)
+for start in range(0, len(cloud), 97):
+    pieces.add(cloud.subset(np.arange(start, min(start + 97, len(cloud)))))
+pieces.add(PointCloud(np.zeros((0, 3))))
+a, b = whole.result(), pieces.result()
+assert (len(a) == len(b) == len(cloud.voxel_downsample(0.1)) and pieces.counts[:pieces.size].sum() == len(cloud))
+assert (np.allclose(a.positions, b.positions) and np.allclose(a.normals, b.normals))
+print("通过分块合并测试")
+
+# 蓄水池采样是等概率的：每个点被保留的频率约为size/N
+counts = np.zeros(100)
+sampler_rng = np.random.default_rng(2)
+for trial in range(2000):
+    sampler = ReservoirSampler(10, sampler_rng)
+    for start in range(0, 100, 30):
+        ids = np.arange(start, min(start + 30, 100), dtype=np.float64)
+        sampler.add(PointCloud(np.stack((ids, ids, ids), axis=1)))
+    counts[sampler.result().positions[:, 0].astype(int)] += 1
+assert (np.abs(counts / 2000 - 0.1).max() < 0.03)
+print("通过蓄水池采样测试")
+
+print("通过所有测试")
@@ -0,0 +1,45 @@
+# 项目：点云配准
+#
+# 文件：testtarget.py
+# 简介：一个简单的脚本，用于测试target.py中准备好的目标的保存和加载
+
+import os
+import tempfile
+import numpy as np
+from .pointcloud import PointCloud
+from .target import PreparedTarget
+from .icp import ICPOptions, ICPRegistration
+
+rng = np.random.default_rng(0)
+positions = rng.uniform(-1, 1, size=(5000, 3))
+normals = rng.normal(size=(5000, 3))
+normals /= np.linalg.norm(normals, axis=1)[:, None]
+M2 = np.matrix([[1.0, 0.0, 0.0, 0.5], [0.0, 1.0, 0.0, 0.0], [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]])
+target = PreparedTarget(PointCloud(positions, normals), M2, name="test")
+assert (np.allclose(target.transform * target.inverse, np.identity(4)))
+
+# 保存后加载，点云、变换和KdTree的查询结果都应该相同
+with tempfile.TemporaryDirectory() as tmp_dir:
+    file_name = os.path.join(tmp_dir, "test.npz")
+    target.save(file_name)
+    assert (os.listdir(tmp_dir) == ["test.npz"])  # 没有残留的临时文件
+    loaded = PreparedTarget.load(file_name)
+
+assert (loaded.name == "test")
+assert (np.array_equal(loaded.cloud.positions, positions) and np.array_equal(loaded.cloud.normals, normals))
+assert (np.array_equal(loaded.transform, M2) and np.allclose(loaded.inverse, M2.I))
+queries = rng.uniform(-1.2, 1.2, size=(1000, 3))
+index, dist = target.kdtree.nearest_batch(queries)
+loaded_index, loaded_dist = loaded.kdtree.nearest_batch(queries)
+assert (np.array_equal(index, loaded_index) and np.array_equal(dist, loaded_dist))
+print("通过保存和加载测试")
+
+# 引擎默认使用准备好的目标中的变换M2
+engine = ICPRegistration(loaded, options=ICPOptions(max_iterations=1, seed=1))
+assert (engine.target is loaded.cloud and engine.kdtree is loaded.kdtree)
+source = PointCloud(positions + 0.001, normals)
+result = engine.register(source, M2)
+assert (np.array_equal(result.transform, engine.register(source, M2, M2).transform))
+print("通过引擎测试")
+
+print("通过所有测试")
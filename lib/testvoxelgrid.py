@@ -0,0 +1,38 @@
+# 项目：点云配准
+#
+# 文件：testvoxelgrid.py
+# 简介：一个简单的脚本，用于测试voxelgrid.py中的体素哈希网格和spatialindex.py中的空间索引
+
+import numpy as np
+from .kdtree import ArrayKdTree
+from .voxelgrid import VoxelGrid
+from .spatialindex import build_index, estimate_spacing
+
+rng = np.random.default_rng(0)
+for d in range(1, 4):
+    points = rng.uniform(-1, 1, size=(5000, d))
+    queries = rng.uniform(-1.2, 1.2, size=(2000, d))
+    tree = ArrayKdTree(points)
+    tree_index, tree_dist = tree.nearest_batch(queries)
+
+    # 网格：最大距离以内的查询与KdTree相同，其余的返回-1和inf
+    r = 0.05
+    index, dist = VoxelGrid(points, r).nearest_batch(queries)
+    inside = tree_dist <= r * r
+    assert (np.array_equal(index >= 0, inside))  # 测试最大距离的截断
+    assert (np.array_equal(dist[inside], tree_dist[inside]))  # 测试网格与KdTree的一致性
+    assert (np.all(np.isinf(dist[~inside])))
+
+    # 组合索引：与KdTree完全相同
+    index, dist = build_index(points, "hybrid", r, kdtree=tree).nearest_batch(queries)
+    assert (np.array_equal(dist, tree_dist))
+
+print("通过一致性测试")
+
+# 点间距的估计：规则网格上的点间距为0.01
+xy = np.stack(np.meshgrid(np.arange(200), np.arange(200)), axis=-1).reshape(-1, 2) * 0.01
+plane = np.concatenate((xy, np.zeros((len(xy), 1))), axis=1)
+assert (abs(estimate_spacing(plane) - 0.01) < 0.003)
+assert (build_index(plane, "kdtree").nearest_batch(plane[:10])[1].max() == 0.0)
+
+print("通过所有测试")
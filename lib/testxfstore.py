@@ -0,0 +1,64 @@
+# 项目：点云配准
+#
+# 文件：testxfstore.py
+# 简介：一个简单的脚本，用于测试xfstore.py中变换矩阵的读写
+
+import os
+import tempfile
+import multiprocessing
+import numpy as np
+from .xfstore import *
+
+M = np.matrix([[0.5, -0.25, 0.0, 1.0], [0.25, 0.5, 0.0, -2.5], [0.0, 0.0, 1.0, 1e-7], [0.0, 0.0, 0.0, 1.0]])
+
+# 文本格式：.xf每个值后跟一个空格，.txt值之间用空格分隔
+assert (format_transform(M, "xf").split('\n')[0] == "0.5 -0.25 0.0 1.0 ")
+assert (format_transform(M, "txt").split('\n')[0] == "0.5 -0.25 0.0 1.0")
+assert (np.array_equal(parse_transform(format_transform(M, "xf")), M))
+assert (np.array_equal(parse_transform(format_transform(M, "txt")), M))
+
+# 无效的行数得到全零矩阵
+assert (np.array_equal(parse_transform("1 0 0 0\n0 1 0 0\n"), np.zeros((4, 4))))
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    # 单个文件和批量文件的读写，格式按扩展名选择
+    write_transform(os.path.join(tmp_dir, "a.xf"), M)
+    assert (np.array_equal(read_transform(os.path.join(tmp_dir, "a.xf")), M))
+    write_transforms(os.path.join(tmp_dir, "out"), {"bun000": M, "bun045": M.I})
+    assert (sorted(os.listdir(os.path.join(tmp_dir, "out"))) == ["bun000.txt", "bun000.xf", "bun045.txt", "bun045.xf"])
+    loaded = read_transforms([os.path.join(tmp_dir, "out", name) for name in ("bun045.xf", "missing.xf")])
+    assert (list(loaded.keys()) == [os.path.join(tmp_dir, "out", "bun045.xf")])
+    assert (np.allclose(list(loaded.values())[0], M.I))
+
+    # 变换存储：两次更新应该合并，而且不残留临时文件
+    file_name = os.path.join(tmp_dir, "poses.npz")
+    TransformStore(file_name).update({"bun000": np.identity(4), "bun045": M})
+    TransformStore(file_name).update({"bun045": M.I, "bun090": M})
+    assert (sorted(os.listdir(tmp_dir)) == ["a.xf", "out", "poses.npz"])
+    store = TransformStore(file_name)
+    assert (len(store) == 3 and "bun090" in store and "bun180" not in store)
+    assert (store.names() == ["bun000", "bun045", "bun090"])
+    assert (np.array_equal(store.get("bun000"), np.identity(4)))
+    assert (np.allclose(store.get("bun045"), M.I) and np.array_equal(store.get("bun090"), M))
+    assert (store.get("bun180") is None)
+
+    # 导出为.xf文件后读回，结果应该相同
+    store.export(os.path.join(tmp_dir, "export"), formats=("xf",))
+    assert (np.array_equal(read_transform(os.path.join(tmp_dir, "export", "bun090.xf")), M))
+
+# 多个进程同时更新同一个文件：每个进程写入不同的扫描，最后所有条目都在文件中，锁文件已经删除
+def update_many(file_name, worker):
+    for i in range(10):
+        TransformStore(file_name).update({"w{}_{}".format(worker, i): np.identity(4) * (i + 1)})
+
+if (__name__ == "__main__"):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, "poses.npz")
+        processes = [multiprocessing.Process(target=update_many, args=(file_name, w)) for w in range(4)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+        assert (len(TransformStore(file_name)) == 40 and os.listdir(tmp_dir) == ["poses.npz"])
+
+print("通过变换读写测试")
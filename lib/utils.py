@@ -1,38 +1,17 @@
 # 项目：点云配准
 #
 # 文件：utils.py
-# 简介：提供用于读写.pts和.xf文件的实用函数
+# 简介：提供用于读写.pts和.xf文件的实用函数（变换矩阵的读写在xfstore.py中）
 
 import os
 import numpy as np
 from .point import Point
+from .pointcloud import PointCloud
+from .xfstore import read_transform, write_transform
 
-# 从给定的.xf文件加载数据到4x4的np矩阵
+# 从给定的.xf文件加载数据到4x4的np矩阵（实现在xfstore.py中）
 def load_xf(file_name):
-    with open(file_name) as f:
-        data = f.read()
-        rows = []
-        for r in data.split('\n'):
-            if (len(r) > 0):
-                rows.append(r)
-
-        if (len(rows) != 4):
-            print("错误：在.xf文件中检测到的行数无效")
-            rows = ["0 0 0 0" for i in range(4)]
-
-        # 可以用一行代码完成，但这样有错误检查
-        result = []
-        for r in rows:
-            c = []
-            for v in r.split(' '):
-                if (len(v) > 0):
-                    c.append(float(v))
-            if (len(c) != 4):
-                print("错误：在{}中检测到的列数无效".format(file_name))
-                c = [0, 0, 0, 0]
-            result.append(c)
-
-    return np.matrix(result)
+    return read_transform(file_name)
 
 # 从给定的.pts文件加载数据到点的列表
 def load_pts(file_name):
@@ -52,21 +31,22 @@ def load_pts(file_name):
 
     return result
 
+# 从给定的.pts文件加载数据到点云（位置和法线为连续数组）
+def load_cloud(file_name):
+    with open(file_name) as f:
+        values = f.read().split()
+
+    # 快速路径：整个文件一次性转换为数组
+    if (len(values) % 6 == 0):
+        data = np.array(values, dtype=np.float64).reshape(-1, 6)
+        return PointCloud(data[:, 0:3], data[:, 3:6])
+
+    # 否则逐行检查（与load_pts的错误处理一致）
+    return PointCloud.from_points(load_pts(file_name))
+
 # 将提供的矩阵M写入指定的.xf文件
 def write_xf(file_name, M):
-    # 如果需要，创建目录
-    dir = os.path.dirname(file_name)
-    if (not os.path.exists(dir)):
-        os.makedirs(dir)
-
-    # 写入文件
-    with open(file_name, "w") as f:
-        for row in M.A:
-            for val in row:
-                f.write(str(val))
-                f.write(' ')
-            f.write('\n')
-    return
+    write_transform(file_name, M, "xf")
 
 # 将提供的点列表写入指定的.pts文件
 def write_pts(file_name, pts):
@@ -84,15 +64,19 @@ def write_pts(file_name, pts):
             f.write('\n')
     return
 
-# 将提供的矩阵 M 写入指定的 .txt 文件
-def write_txt(file_name, M):
+# 将提供的点云写入指定的.pts文件
+def write_cloud(file_name, cloud):
     # 如果需要，创建目录
     dir = os.path.dirname(file_name)
-    if not os.path.exists(dir):
+    if (dir and not os.path.exists(dir)):
         os.makedirs(dir)
 
     # 写入文件
+    data = np.hstack((cloud.positions, cloud.normals)).tolist()
     with open(file_name, "w") as f:
-        for row in M.A:
-            f.write(' '.join(map(str, row)) + '\n')
-    return
\ No newline at end of file
+        f.write(''.join(' '.join(map(repr, row)) + '\n' for row in data))
+    return
+
+# 将提供的矩阵 M 写入指定的 .txt 文件
+def write_txt(file_name, M):
+    write_transform(file_name, M, "txt")
@@ -0,0 +1,132 @@
+# 项目：点云配准
+#
+# 文件：voxelgrid.py
+# 简介：基于体素哈希的均匀网格，用于在最大距离以内批量查找最近邻
+#       ICP接近收敛时对应点都在很小的范围内，网格只需要检查查询点周围的几个体素，
+#       不需要从根开始逐层下降
+
+import numpy as np
+
+# 体素哈希网格：点按所在体素的编号排序，每个非空体素保存在排序后数组中的起点和点数
+# 体素的边长等于最大距离，因此最大距离以内的最近点只可能在所在体素或相邻的体素中
+class VoxelGrid:
+    # 构造函数接受(N,3)的点数组和最大距离max_distance
+    def __init__(self, points, max_distance):
+        points = np.asarray(points, dtype=np.float64)
+        if (points.ndim != 2 or points.shape[0] == 0):
+            print("错误：VoxelGrid需要一个非空的(N,k)数组")
+            points = np.zeros((1, 3))
+        if (max_distance <= 0):
+            print("错误：最大距离必须是正数")
+            max_distance = 1.0
+
+        self.points = points
+        self.size, self.k = points.shape
+        self.max_distance = max_distance
+        self.cell_size = max_distance
+
+        keys = np.floor(points / self.cell_size).astype(np.int64)
+        self.key_min = keys.min(axis=0)
+        self.extent = keys.max(axis=0) - self.key_min + 1
+        ids = self.cell_ids(keys - self.key_min)
+        self.order = np.argsort(ids, kind='stable')
+        self.cells, self.cell_start, self.cell_count = np.unique(ids[self.order], return_index=True,
+                                                                 return_counts=True)
+
+        # 体素总数不太大时用稠密的查找表（体素编号直接映射到非空体素的序号，空体素为-1），
+        # 否则在排序的非空体素编号中二分查找
+        self.table = None
+        if (np.prod(self.extent.astype(np.float64)) <= max(8 * self.size, 1 << 22)):
+            self.table = np.full(int(np.prod(self.extent)), -1, dtype=np.int64)
+            self.table[self.cells] = np.arange(len(self.cells))
+
+        # 相邻体素的偏移（不包括全零的所在体素），以及每个偏移在哪些维度上越过下边界和上边界
+        r = np.arange(-1, 2)
+        offsets = np.stack(np.meshgrid(*([r] * self.k), indexing='ij'), axis=-1).reshape(-1, self.k)
+        self.offsets = offsets[np.any(offsets != 0, axis=1)]
+        self.cross_low = (self.offsets < 0).astype(np.float64)
+        self.cross_high = (self.offsets > 0).astype(np.float64)
+
+    # 将体素坐标（相对于key_min）编码为一个整数
+    def cell_ids(self, keys):
+        ids = np.zeros(len(keys), dtype=np.int64)
+        for dim in range(self.k):
+            ids = ids * self.extent[dim] + keys[:, dim]
+        return ids
+
+    # 批量最近邻查询：返回最近点下标(M,)和平方距离(M,)；max_distance以内没有点时下标为-1，平方距离为inf
+    def nearest_batch(self, queries, chunk_size=16384):
+        queries = np.asarray(queries, dtype=np.float64)
+        if (queries.ndim != 2 or queries.shape[1] != self.k):
+            print("错误：查询数组和VoxelGrid必须具有相同的维度")
+            return None, None
+
+        index = np.empty(len(queries), dtype=np.intp)
+        dist = np.empty(len(queries))
+        for start in range(0, len(queries), chunk_size):
+            end = min(start + chunk_size, len(queries))
+            index[start:end], dist[start:end] = self.nearest_chunk(queries[start:end])
+        return index, dist
+
+    # 批量最近邻查询的内部方法
+    def nearest_chunk(self, queries):
+        m = len(queries)
+        best_index = np.full(m, -1, dtype=np.intp)
+        best_dist = np.full(m, self.max_distance * self.max_distance)
+
+        # 第一步：搜索查询点所在的体素
+        home = np.floor(queries / self.cell_size).astype(np.int64) - self.key_min
+        q = np.arange(m)
+        self.scan_cells(queries, q, home, best_index, best_dist)
+
+        # 第二步：只搜索包围盒比当前候选更近（因此也在最大距离以内）的相邻体素；
+        # 相邻体素的包围盒距离等于越过的各个边界距离的平方和
+        below = queries - (home + self.key_min) * self.cell_size
+        above = self.cell_size - below
+        box = (below * below) @ self.cross_low.T + (above * above) @ self.cross_high.T
+        q, j = np.nonzero(box < best_dist[:, None])
+        self.scan_cells(queries, q, home[q] + self.offsets[j], best_index, best_dist)
+
+        best_dist[best_index < 0] = np.inf
+        return best_index, best_dist
+
+    # 搜索一批(查询, 体素)对中的所有点，就地更新每个查询的最近点下标和平方距离（q必须是非递减的）
+    def scan_cells(self, queries, q, keys, best_index, best_dist):
+        # 超出网格范围的体素一定是空的；其余的在排序的非空体素编号中查找
+        inside = np.all((keys >= 0) & (keys < self.extent), axis=1)
+        q, keys = q[inside], keys[inside]
+        ids = self.cell_ids(keys)
+        if (self.table is not None):
+            slot = self.table[ids]
+            found = slot >= 0
+        else:
+            slot = np.searchsorted(self.cells, ids)
+            slot[slot == len(self.cells)] = 0
+            found = self.cells[slot] == ids
+        q, slot = q[found], slot[found]
+        if (len(q) == 0):
+            return
+
+        # 展开每个(查询, 体素)对中的所有点
+        counts = self.cell_count[slot]
+        pair = np.repeat(np.arange(len(q)), counts)
+        within = np.arange(len(pair)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cand_index = self.order[self.cell_start[slot][pair] + within]
+        cand_q = q[pair]
+        diff = self.points[cand_index] - queries[cand_q]
+        cand_dist = (diff * diff).sum(axis=1)
+
+        # 对每个查询保留比当前候选更近的最近候选；q是非递减的，因此候选已经按查询分组，
+        # 不需要排序，用reduceat求每组的最小值
+        keep = cand_dist <= best_dist[cand_q]
+        cand_q, cand_index, cand_dist = cand_q[keep], cand_index[keep], cand_dist[keep]
+        if (len(cand_q) == 0):
+            return
+        first = np.ones(len(cand_q), dtype=bool)
+        first[1:] = cand_q[1:] != cand_q[:-1]
+        starts = np.flatnonzero(first)
+        group = np.cumsum(first) - 1
+        hit = np.flatnonzero(cand_dist == np.minimum.reduceat(cand_dist, starts)[group])
+        hit = hit[np.unique(group[hit], return_index=True)[1]]
+        best_index[cand_q[hit]] = cand_index[hit]
+        best_dist[cand_q[hit]] = cand_dist[hit]
@@ -0,0 +1,149 @@
+# 项目：点云配准
+#
+# 文件：xfstore.py
+# 简介：变换矩阵的读写：.xf和.txt文本文件的批量读写，以及把一个扫描集合的所有变换
+#       保存在一个带索引的.npz文件中（按扫描名查找，原子地更新；多个进程同时更新时用锁文件互斥）
+#       .xf格式：4行，每个值后跟一个空格；.txt格式（用于CloudCompare）：4行，值之间用空格分隔
+
+import os
+import time
+import numpy as np
+from contextlib import contextmanager
+
+# 将文本解析为4x4的np矩阵；行数或列数无效时打印错误并使用全零矩阵（与原来的load_xf一致）
+def parse_transform(text, file_name=""):
+    rows = [r.split() for r in text.split('\n') if (len(r) > 0)]
+    if (len(rows) != 4):
+        print("错误：在.xf文件中检测到的行数无效")
+        return np.matrix(np.zeros((4, 4)))
+    if (any(len(r) != 4 for r in rows)):
+        print("错误：在{}中检测到的列数无效".format(file_name))
+        rows = [r if (len(r) == 4) else ["0"] * 4 for r in rows]
+    return np.matrix(np.array(rows, dtype=np.float64))
+
+# 返回矩阵的文本：format为"xf"或"txt"
+def format_transform(M, format="xf"):
+    rows = np.asarray(M, dtype=np.float64).tolist()
+    if (format == "txt"):
+        return ''.join(' '.join(map(str, row)) + '\n' for row in rows)
+    return ''.join(''.join(str(val) + ' ' for val in row) + '\n' for row in rows)
+
+# 从.xf（或.txt）文件加载4x4的np矩阵
+def read_transform(file_name):
+    with open(file_name) as f:
+        return parse_transform(f.read(), file_name)
+
+# 将矩阵写入.xf或.txt文件（format为None时按扩展名选择格式）；先写临时文件再原子地替换
+def write_transform(file_name, M, format=None):
+    dir = os.path.dirname(file_name)
+    if (dir and not os.path.exists(dir)):
+        os.makedirs(dir)
+    if (format is None):
+        format = "txt" if (file_name.lower().endswith('.txt')) else "xf"
+    tmp_name = "{}.{}.tmp".format(file_name, os.getpid())
+    with open(tmp_name, "w") as f:
+        f.write(format_transform(M, format))
+    os.replace(tmp_name, file_name)
+
+# 批量读取：返回文件名到矩阵的字典，不存在的文件不包括在内
+def read_transforms(file_names):
+    result = {}
+    for file_name in file_names:
+        if (os.path.isfile(file_name)):
+            result[file_name] = read_transform(file_name)
+    return result
+
+# 批量写入：transforms为扫描名到矩阵的字典，每个扫描按formats中的每种格式写入directory/<扫描名>.<格式>
+def write_transforms(directory, transforms, formats=("xf", "txt")):
+    if (directory and not os.path.exists(directory)):
+        os.makedirs(directory)
+    for name, M in transforms.items():
+        for format in formats:
+            write_transform(os.path.join(directory, name + '.' + format), M, format)
+
+# 一个扫描集合的所有变换保存在一个.npz文件中：names为扫描名数组，transforms为(N,4,4)数组
+# 每次更新都重新读取文件、合并后写入临时文件再原子地替换，读者不会看到写了一半的文件
+# 锁文件：用O_CREAT|O_EXCL创建file_name.lock，创建成功的进程持有锁，退出时删除
+# 锁文件存在超过stale秒时视为持有者已经崩溃，将其删除；等待超过timeout秒时打印错误后不加锁继续
+@contextmanager
+def file_lock(file_name, timeout=60.0, stale=120.0, interval=0.05):
+    lock_name = file_name + ".lock"
+    dir = os.path.dirname(lock_name)
+    if (dir and not os.path.exists(dir)):
+        os.makedirs(dir, exist_ok=True)
+    start = time.monotonic()
+    locked = False
+    while (not locked):
+        try:
+            os.close(os.open(lock_name, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            locked = True
+        except FileExistsError:
+            try:
+                if (time.time() - os.path.getmtime(lock_name) > stale):
+                    os.remove(lock_name)
+                    continue
+            except OSError:
+                continue
+            if (time.monotonic() - start > timeout):
+                print("错误：等待锁文件{}超时，不加锁继续".format(lock_name))
+                break
+            time.sleep(interval)
+    try:
+        yield
+    finally:
+        if (locked):
+            os.remove(lock_name)
+
+class TransformStore:
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.transforms = {}
+        if (os.path.isfile(file_name)):
+            self.transforms = self.read()
+
+    # 读取文件中的所有变换
+    def read(self):
+        try:
+            with np.load(self.file_name) as data:
+                return dict((str(name), np.matrix(M)) for name, M in zip(data["names"], data["transforms"]))
+        except (OSError, ValueError, KeyError) as e:
+            print("警告：无法读取变换文件{}：{}".format(self.file_name, e))
+            return {}
+
+    def __contains__(self, name):
+        return name in self.transforms
+
+    def __len__(self):
+        return len(self.transforms)
+
+    def names(self):
+        return sorted(self.transforms.keys())
+
+    # 返回扫描的变换；不存在时返回default
+    def get(self, name, default=None):
+        return self.transforms.get(name, default)
+
+    # 合并一组变换（扫描名到矩阵的字典）并写入文件
+    # 读取、合并和写入在锁文件内完成，多个进程（例如并行的批量配准和增量配准）同时更新时不会丢失对方的条目
+    def update(self, transforms):
+        with file_lock(self.file_name):
+            if (os.path.isfile(self.file_name)):
+                self.transforms = self.read()
+            for name, M in transforms.items():
+                self.transforms[name] = np.matrix(M, dtype=np.float64)
+            self.save()
+
+    def save(self):
+        dir = os.path.dirname(self.file_name)
+        if (dir and not os.path.exists(dir)):
+            os.makedirs(dir)
+        names = self.names()
+        transforms = np.array([np.asarray(self.transforms[name]) for name in names]).reshape(-1, 4, 4)
+        tmp_name = "{}.{}.tmp".format(self.file_name, os.getpid())
+        with open(tmp_name, "wb") as f:
+            np.savez(f, names=np.array(names, dtype=str), transforms=transforms)
+        os.replace(tmp_name, self.file_name)
+
+    # 将所有变换导出为.xf/.txt文件
+    def export(self, directory, formats=("xf", "txt")):
+        write_transforms(directory, self.transforms, formats)
@@ -0,0 +1,99 @@
+# 文件：pose_graph.py
+# 简介：两两配准之后的全局位姿图优化。读取扫描集合、配准关系图（以及额外的闭环配准对）和
+#       已有的位姿（例如batch_registration.py的输出），每一对的相对位姿和信息矩阵作为位姿图的边
+#       （闭环配准对从当前位姿出发运行ICP得到相对位姿），然后联合求解所有扫描的位姿并写出优化后的.xf文件。
+#       用法："pose_graph.py bun.conf --pairs bun.pairs --loops loops.pairs --poses output01 --output output01"
+
+import os
+import zlib
+import argparse
+import numpy as np
+from lib.scanset import load_scan_list, load_pairs
+from lib.icp import ICPOptions
+from lib.posegraph import PoseEdge, PoseGraph, edge_information
+from lib.xfstore import read_transform, write_transforms, TransformStore
+from batch_registration import ScanStore
+
+# 返回每个扫描的初始位姿：优先使用poses_dir中的.xf（两两配准的结果），其次是扫描自己的初始位姿
+def load_poses(store, poses_dir):
+    poses = {}
+    for name in store.scans:
+        file_xf = None if (poses_dir is None) else os.path.join(poses_dir, name + '.xf')
+        if (file_xf is not None and os.path.isfile(file_xf)):
+            poses[name] = read_transform(file_xf)
+        else:
+            poses[name] = store.pose(name)
+    return poses
+
+# 返回一对扫描的位姿图的边：register为True时从当前位姿出发重新配准这一对（闭环配准对总是重新配准），
+# 否则直接使用两两配准得到的相对位姿；信息矩阵在得到的相对位姿下计算
+def build_edge(store, source, target, poses, options, loop_closure, register):
+    engine = store.engine(target)
+    Z = poses[target].I * poses[source]
+    if (register or loop_closure):
+        options.seed = zlib.crc32("{} {}".format(source, target).encode())
+        result = engine.register(store.cloud(source), poses[source], poses[target], options)
+        Z = poses[target].I * result.transform
+        print("{} -> {}：经过 {} 次迭代，采样的平均距离为 {}".format(source, target, result.iterations,
+                                                             result.mean_distance))
+    information = edge_information(store.cloud(source), engine.target, engine.kdtree, Z, options.outlier_factor)
+    return PoseEdge(source, target, Z, information, loop_closure)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="两两配准之后的全局位姿图优化")
+    parser.add_argument("scans", help="bun.conf格式的文件或扫描列表（每行一个文件）")
+    parser.add_argument("--pairs", help="配准关系图（每行\"源 目标\"）；默认全部配准到第一个扫描")
+    parser.add_argument("--loops", help="额外的闭环配准对（每行\"源 目标\"），例如首尾相接的扫描")
+    parser.add_argument("--poses", default="output01", help="两两配准得到的.xf文件所在的目录")
+    parser.add_argument("--pts-dir", default="PLY_PTS", help="查找带法线的.pts文件的目录")
+    parser.add_argument("--output", default="output01", help="输出优化后的.xf和.txt文件的目录")
+    parser.add_argument("--transform-store", help="同时将优化后的变换合并写入此.npz文件")
+    parser.add_argument("--reregister", action="store_true",
+                        help="从已有的位姿出发重新配准配准关系图中的每一对；默认直接使用已有位姿之间的相对位姿")
+    parser.add_argument("--sample-size", type=int, default=2000, help="每次ICP迭代采样的点数")
+    parser.add_argument("--outlier-factor", type=float, default=0.75, help="剔除异常值的中位数倍数")
+    parser.add_argument("--max-iterations", type=int, default=50, help="每一对ICP的最大迭代次数")
+    parser.add_argument("--rotation-tolerance", type=float, default=None,
+                        help="增量旋转角度（弧度）小于此值时终止ICP，例如1e-4")
+    parser.add_argument("--translation-tolerance", type=float, default=None,
+                        help="增量平移长度小于此值时终止ICP，例如1e-5")
+    parser.add_argument("--min-sample-size", type=int, default=None,
+                        help="自适应采样：从这么多点开始，收敛后逐步增大到--sample-size")
+    parser.add_argument("--graph-iterations", type=int, default=20, help="位姿图优化的最大迭代次数")
+    args = parser.parse_args()
+
+    scans = load_scan_list(args.scans)
+    if (len(scans) == 0):
+        print("错误：在{}中没有找到扫描".format(args.scans))
+        quit()
+    reference = scans[0].name
+    pairs = load_pairs(args.pairs) if (args.pairs is not None) else [(scan.name, reference) for scan in scans[1:]]
+    loops = load_pairs(args.loops) if (args.loops is not None) else []
+
+    store = ScanStore(scans, pts_dir=args.pts_dir)
+    poses = load_poses(store, args.poses)
+    graph = PoseGraph()
+    for name, pose in poses.items():
+        graph.add_node(name, pose, fixed=(name == reference))
+
+    options = ICPOptions(args.sample_size, args.outlier_factor, args.max_iterations,
+                         rotation_tolerance=args.rotation_tolerance, translation_tolerance=args.translation_tolerance,
+                         min_sample_size=args.min_sample_size)
+    for (source, target), loop_closure in [(pair, False) for pair in pairs] + [(pair, True) for pair in loops]:
+        if (source not in poses or target not in poses):
+            print("错误：配准对{} -> {}中的扫描不在扫描列表中".format(source, target))
+            continue
+        graph.add_edge(build_edge(store, source, target, poses, options, loop_closure, args.reregister))
+
+    count, initial, final = graph.optimize(args.graph_iterations)
+    print("位姿图优化：经过 {} 次迭代，代价从 {:.4e} 降低到 {:.4e}".format(count, initial, final))
+    for edge in graph.edges:
+        e = graph.edge_error(edge)
+        print("{} -> {}{}：残余旋转 {:.2e} 弧度，平移 {:.2e}".format(edge.source, edge.target,
+                                                            "（闭环）" if (edge.loop_closure) else "",
+                                                            np.linalg.norm(e[:3]), np.linalg.norm(e[3:])))
+
+    write_transforms(args.output, graph.poses)
+    print("已将 {} 个优化后的变换写入 {}".format(len(graph.poses), args.output))
+    if (args.transform_store is not None):
+        TransformStore(args.transform_store).update(graph.poses)
@@ -0,0 +1,27 @@
+# 文件：prepare_target.py
+# 简介：为一个目标扫描准备好ICP配准所需的数据（点云、法线、KdTree以及变换M2），并保存为*.npz文件。
+#       之后可以把它作为icp_ply_pts.py的第二个参数，多次配准不同的源点云时不需要重复加载和构建KdTree。
+#       用法："prepare_target.py file.pts [output.npz]"，默认输出到file.pts同目录下的file.npz
+
+import os
+import sys
+from lib.ptscache import load_cached
+from lib.target import PreparedTarget
+from icp_ply_pts import xf_path, load_xf_or_identity
+
+if __name__ == "__main__":
+    if (len(sys.argv) not in (2, 3)):
+        print("使用错误：正确的用法是 \"prepare_target.py file.pts [output.npz]\"")
+        quit()
+
+    file_name = sys.argv[1]
+    if (not os.path.isfile(file_name)):
+        print("错误：找不到.pts文件：" + file_name)
+        quit()
+    output_file = sys.argv[2] if (len(sys.argv) == 3) else os.path.splitext(file_name)[0] + '.npz'
+
+    name = os.path.splitext(os.path.basename(file_name))[0]
+    print("正在从 {} 构建KdTree...".format(file_name))
+    target = PreparedTarget(load_cached(file_name), load_xf_or_identity(xf_path(file_name)), name=name)
+    target.save(output_file)
+    print("已将准备好的目标写入 {}".format(output_file))
@@ -1,68 +1,64 @@
-import open3d as o3d
+# 文件：registration.py
+# 简介：基于FPFH特征的快速全局配准（需要Open3D），为ICP提供较好的初始位置
+#       Open3D只在需要它的阶段才导入：批量配准等导入本模块时，不使用快速全局配准就不会加载Open3D。
+#       --headless不打开可视化窗口（没有图形界面的节点上会阻塞或失败），--save-aligned把对齐后的
+#       点云写入文件以便之后查看；--pairs在一个进程中依次配准多对，不需要为每一对启动新的进程。
+
 import numpy as np
 import time
-import sys
-import copy
 import os
+import sys
+import argparse
+from lib.featurecache import FeatureCache, cache_key
+from lib.utils import load_xf, write_xf
 
-# 将提供的矩阵M写入指定的.xf文件
-def write_xf(file_name, M):
-    dir = os.path.dirname(file_name)
-    if (not os.path.exists(dir)):
-        os.makedirs(dir)
-
-    with open(file_name, "w") as f:
-        for row in M:
-            for val in row:
-                f.write(str(val))
-                f.write(' ')
-            f.write('\n')
-    return
-
-# 从给定的.xf文件加载数据到4x4的np矩阵
-def load_xf(file_name):
-    with open(file_name) as f:
-        data = f.read()
-        rows = []
-        for r in data.split('\n'):
-            if (len(r) > 0):
-                rows.append(r)
-
-        if (len(rows) != 4):
-            print("错误：在.xf文件中检测到的行数无效")
-            rows = ["0 0 0 0" for i in range(4)]
-
-        # 读取文件中的矩阵数据
-        result = []
-        for r in rows:
-            c = []
-            for v in r.split(' '):
-                if (len(v) > 0):
-                    c.append(float(v))
-            if (len(c) != 4):
-                print("错误：在{}中检测到的列数无效".format(file_name))
-                c = [0, 0, 0, 0]
-            result.append(c)
-
-    return np.matrix(result)
+# 预处理参数：法线估计的搜索半径和最大邻居数，FPFH特征的搜索半径和最大邻居数
+def preprocess_params(voxel_size):
+    return voxel_size * 3, 50, voxel_size * 6, 100
 
 def preprocess_point_cloud(pcd, voxel_size):
+    import open3d as o3d
+    radius_normal, max_nn_normal, radius_feature, max_nn_feature = preprocess_params(voxel_size)
+
     print(":: 正在将点云下采样至体素大小为 %.3f." % voxel_size)
     pcd_down = pcd.voxel_down_sample(voxel_size)
 
-    radius_normal = voxel_size * 3
     print(":: 使用搜索半径 %.3f 估计法线." % radius_normal)
     pcd_down.estimate_normals(
-        o3d.geometry.KDTreeSearchParamHybrid(radius=radius_normal, max_nn=50))
+        o3d.geometry.KDTreeSearchParamHybrid(radius=radius_normal, max_nn=max_nn_normal))
 
-    radius_feature = voxel_size * 6
     print(":: 使用搜索半径 %.3f 计算 FPFH 特征." % radius_feature)
     pcd_fpfh = o3d.pipelines.registration.compute_fpfh_feature(
         pcd_down,
-        o3d.geometry.KDTreeSearchParamHybrid(radius=radius_feature, max_nn=100))
+        o3d.geometry.KDTreeSearchParamHybrid(radius=radius_feature, max_nn=max_nn_feature))
+    return pcd_down, pcd_fpfh
+
+# 带缓存的预处理：以文件内容和预处理参数为键，命中时由缓存的数组直接重建下采样点云、法线和FPFH特征，
+# 否则用read_point_cloud读取点云（默认o3d.io.read_point_cloud），计算后写入缓存
+# read_point_cloud对文件内容做了额外处理时（例如流式下采样），把它的参数放入extra_params，使它们属于不同的条目
+def preprocess_point_cloud_cached(file_name, voxel_size, cache, read_point_cloud=None, extra_params=()):
+    import open3d as o3d
+    key = cache_key(file_name, (voxel_size,) + preprocess_params(voxel_size) + tuple(extra_params))
+    arrays = cache.get(key)
+    if arrays is not None:
+        print(":: 使用缓存的下采样点云和 FPFH 特征：%s" % file_name)
+        pcd_down = o3d.geometry.PointCloud()
+        pcd_down.points = o3d.utility.Vector3dVector(arrays["points"])
+        pcd_down.normals = o3d.utility.Vector3dVector(arrays["normals"])
+        pcd_fpfh = o3d.pipelines.registration.Feature()
+        pcd_fpfh.data = arrays["fpfh"]
+        return pcd_down, pcd_fpfh
+
+    if read_point_cloud is None:
+        read_point_cloud = o3d.io.read_point_cloud
+    pcd_down, pcd_fpfh = preprocess_point_cloud(read_point_cloud(file_name), voxel_size)
+    cache.put(key, {"points": np.asarray(pcd_down.points),
+                    "normals": np.asarray(pcd_down.normals),
+                    "fpfh": np.asarray(pcd_fpfh.data)})
     return pcd_down, pcd_fpfh
 
 def execute_fast_global_registration(source_down, target_down, source_fpfh, target_fpfh, voxel_size):
+    import open3d as o3d
     distance_threshold = voxel_size * 1.5
     print(":: 正在应用快速全局配准，距离阈值为 %.3f" % distance_threshold)
     result = o3d.pipelines.registration.registration_fgr_based_on_feature_matching(
@@ -71,36 +67,55 @@ def execute_fast_global_registration(source_down, target_down, source_fpfh, targ
             maximum_correspondence_distance=distance_threshold))
     return result
 
-def draw_registration_result(source, target, transformation):
-    source_temp = copy.deepcopy(source)
-    target_temp = copy.deepcopy(target)
-    source_temp.paint_uniform_color([1, 0.706, 0])
-    target_temp.paint_uniform_color([0, 0.651, 0.929])
-    source_temp.transform(transformation)
-    o3d.visualization.draw_geometries([source_temp, target_temp])
-
-if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("用法: python registration.py 源点云路径 目标点云路径")
-        sys.exit()
+# 给源点云和目标点云着色，并把源点云变换到对齐后的位置
+# 直接修改传入的点云（不做深拷贝），只在这一对配准完成、下采样点云不再使用之后调用
+def color_aligned(source, target, transformation):
+    source.paint_uniform_color([1, 0.706, 0])
+    target.paint_uniform_color([0, 0.651, 0.929])
+    source.transform(transformation)
+    return source, target
 
-    source_path = sys.argv[1]
-    target_path = sys.argv[2]
+def draw_registration_result(source, target, transformation):
+    import open3d as o3d
+    o3d.visualization.draw_geometries(list(color_aligned(source, target, transformation)))
 
-    # 加载源点云和目标点云
-    source = o3d.io.read_point_cloud(source_path)
-    target = o3d.io.read_point_cloud(target_path)
+# 将对齐后的两个点云（着色后合并为一个）写入文件，用于之后查看（例如在CloudCompare中打开）
+def save_registration_result(file_name, source, target, transformation):
+    import open3d as o3d
+    dir = os.path.dirname(file_name)
+    if (dir and not os.path.exists(dir)):
+        os.makedirs(dir)
+    source, target = color_aligned(source, target, transformation)
+    o3d.io.write_point_cloud(file_name, source + target)
 
-    # 设置体素大小
-    voxel_size = 0.003  # 根据点云数据坐标值大小调整体素大小
+# 返回是否有图形界面可以打开可视化窗口
+def has_display():
+    if (os.name == "nt" or sys.platform == "darwin"):
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
 
-    # 对源点云和目标点云进行预处理
-    source_down, source_fpfh = preprocess_point_cloud(source, voxel_size)
-    target_down, target_fpfh = preprocess_point_cloud(target, voxel_size)
+# 读取配准对文件：每行"源点云路径 目标点云路径"（相对于文件所在目录），#开头的行忽略
+def load_pair_paths(file_name):
+    dir = os.path.dirname(file_name)
+    pairs = []
+    with open(file_name) as f:
+        for r in f.read().split('\n'):
+            c = r.split()
+            if (len(c) == 0 or c[0].startswith('#')):
+                continue
+            if (len(c) != 2):
+                print("错误：在{}中检测到无效的配准对：{}".format(file_name, r))
+                continue
+            pairs.append((os.path.join(dir, c[0]), os.path.join(dir, c[1])))
+    return pairs
+
+# 配准一对点云：以目标点云的.xf为基准，将源点云的转移矩阵写入transformation_dir
+def register_pair(source_path, target_path, voxel_size, cache, transformation_dir, headless, save_aligned):
+    # 加载源点云和目标点云并进行预处理（未改变的点云直接使用缓存）
+    source_down, source_fpfh = preprocess_point_cloud_cached(source_path, voxel_size, cache)
+    target_down, target_fpfh = preprocess_point_cloud_cached(target_path, voxel_size, cache)
 
     # 加载目标点云的转移矩阵（作为基准）
-    # transformation_dir = "transformation"
-    transformation_dir = "PLY_PTS"
     target_transformation_file = os.path.join(transformation_dir, os.path.splitext(os.path.basename(target_path))[0] + ".xf")
     if os.path.exists(target_transformation_file):
         target_transformation = load_xf(target_transformation_file)
@@ -113,9 +128,47 @@ if __name__ == "__main__":
     print(result_fast)
 
     # 保存源点云的转移矩阵
-    source_transformation_file = os.path.join(transformation_dir, os.path.splitext(os.path.basename(source_path))[0] + ".xf")
+    source_name = os.path.splitext(os.path.basename(source_path))[0]
+    source_transformation_file = os.path.join(transformation_dir, source_name + ".xf")
     write_xf(source_transformation_file, result_fast.transformation)
     print(f"转移矩阵已保存到：{source_transformation_file}")
 
-    # 绘制配准后的点云图像
-    draw_registration_result(source_down, target_down, result_fast.transformation)
+    # 保存或绘制配准后的点云（两者都会直接修改下采样点云，因此放在最后）
+    if (save_aligned is not None):
+        aligned_file = os.path.join(save_aligned, source_name + "_aligned.ply")
+        save_registration_result(aligned_file, source_down, target_down, result_fast.transformation)
+        print(f"对齐后的点云已保存到：{aligned_file}")
+    elif (not headless):
+        draw_registration_result(source_down, target_down, result_fast.transformation)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="基于FPFH特征的快速全局配准")
+    parser.add_argument("paths", nargs="*", help="源点云路径 目标点云路径")
+    parser.add_argument("--pairs", help="配准对文件（每行\"源点云路径 目标点云路径\"），在一个进程中依次配准")
+    parser.add_argument("--voxel-size", type=float, default=0.003, help="体素大小（根据点云数据坐标值大小调整）")
+    parser.add_argument("--headless", action="store_true", help="不打开可视化窗口（没有图形界面时自动启用）")
+    parser.add_argument("--save-aligned", help="把对齐后的点云（着色后合并）写入此目录的<源点云>_aligned.ply，代替可视化窗口")
+    args = parser.parse_args()
+
+    pairs = load_pair_paths(args.pairs) if (args.pairs is not None) else []
+    if (len(args.paths) == 2):
+        pairs.insert(0, (args.paths[0], args.paths[1]))
+    if (len(pairs) == 0 or len(args.paths) not in (0, 2)):
+        print("用法: python registration.py 源点云路径 目标点云路径 [--headless] [--save-aligned 目录]")
+        print("      python registration.py --pairs 配准对文件 [--headless] [--save-aligned 目录]")
+        sys.exit()
+
+    # 有多对时不逐个打开阻塞的窗口
+    headless = args.headless or not has_display() or len(pairs) > 1
+    if (headless and not args.headless and args.save_aligned is None):
+        print("提示：不打开可视化窗口，可以用--save-aligned保存对齐后的点云")
+
+    # 预处理结果的缓存目录和大小上限（字节）
+    cache = FeatureCache(".fpfh_cache", 512 * 1024 * 1024)
+
+    # transformation_dir = "transformation"
+    transformation_dir = "PLY_PTS"
+    for source_path, target_path in pairs:
+        print("正在配准 {} -> {}".format(source_path, target_path))
+        register_pair(source_path, target_path, args.voxel_size, cache, transformation_dir, headless,
+                      args.save_aligned)